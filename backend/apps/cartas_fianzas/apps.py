@@ -6,5 +6,8 @@ class CartasFianzasConfig(AppConfig):
     name = 'apps.cartas_fianzas'
     verbose_name = 'Cartas Fianzas'
 
-
-
+    def ready(self):
+        # Registra el contador de conexiones usado por /api/sistema/conexiones/
+        import config.db_pool  # noqa: F401
+        # Señales de la bitácora de auditoría
+        from . import auditoria  # noqa: F401
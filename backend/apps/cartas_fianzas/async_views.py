@@ -0,0 +1,416 @@
+"""
+Versiones asíncronas de los reportes de larga duración (despliegue ASGI).
+
+Con ASYNC_REPORTS=True (perfil uvicorn, ver docs/DESPLIEGUE_ASGI.md) estas
+vistas reemplazan a las acciones equivalentes de los ViewSets, en las mismas
+rutas y con la misma respuesta:
+
+- GET /api/financial-entities/{id}/reporte-cartas/
+- GET /api/contractors/{id}/reporte-cartas/
+- GET /api/warranty-objects/{id}/reporte-cartas/
+- GET /api/warranties/certificacion/
+- GET /api/warranties/devueltas-por-periodo/
+- GET /api/warranties/ejecutadas-por-periodo/
+
+También sirve el feed de cambios GET /api/events/ (Server-Sent Events), que
+solo funciona bajo ASGI (ver eventos.py).
+
+Mientras esperan a PostgreSQL no ocupan un hilo del worker, por lo que
+varios reportes lentos en paralelo no bloquean al resto de la API.
+Los procedimientos almacenados se ejecutan con una conexión asíncrona de
+psycopg3 cuando está instalado; con psycopg2 se ejecutan en un hilo aparte.
+"""
+import asyncio
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from config.db_pool import parametros_conexion
+from config.db_router import alias_lectura, leer_de_replica
+from .models import (
+    FinancialEntity,
+    Contractor,
+    WarrantyObject,
+    WarrantyHistory,
+)
+from .eventos import canal_eventos, usuario_de_ticket
+from .renderers import a_json
+from .views import fila_con_historial_original
+
+if is_psycopg3:
+    import psycopg
+
+# IDs de estado de los reportes por período
+DEVOLUCION_STATUS_ID = 3
+EJECUCION_STATUS_ID = 6
+
+# Segundos entre comentarios de latido del feed de eventos (mantienen viva
+# la conexión a través de nginx)
+INTERVALO_LATIDO = 15
+
+# Milisegundos que espera EventSource antes de reconectarse
+RECONEXION_MS = 3000
+
+
+def respuesta(data, status=200):
+    """Respuesta JSON con el mismo formato que ORJSONRenderer"""
+    return HttpResponse(a_json(data), status=status, content_type='application/json')
+
+
+def autenticar(request, ticket_en_url=False):
+    """
+    Autentica la petición con las mismas clases que el resto de la API.
+
+    Con ticket_en_url se acepta además ?ticket=<ticket> (ver
+    eventos.emitir_ticket), para clientes que no pueden enviar cabeceras
+    (EventSource del navegador). El token de la API nunca va en la URL.
+    """
+    ticket = request.GET.get('ticket') if ticket_en_url else None
+    if ticket:
+        user = usuario_de_ticket(ticket)
+        if user is None:
+            raise exceptions.AuthenticationFailed('Ticket no válido o vencido.')
+        return user
+
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    return drf_request.user
+
+
+async def verificar_peticion(request, ticket_en_url=False):
+    """
+    Solo GET y usuario autenticado (equivale a IsAuthenticated).
+
+    Returns:
+        HttpResponse | None: Respuesta de error, o None si la petición es válida
+    """
+    if request.method != 'GET':
+        return respuesta(
+            {'detail': f'Método "{request.method}" no permitido.'},
+            status=405
+        )
+    try:
+        user = await sync_to_async(autenticar)(request, ticket_en_url)
+    except exceptions.APIException as exc:
+        return respuesta({'detail': exc.detail}, status=exc.status_code)
+
+    if not user or not user.is_authenticated:
+        return respuesta(
+            {'detail': exceptions.NotAuthenticated.default_detail},
+            status=401
+        )
+    return None
+
+
+def reporte_async(view):
+    """
+    Decorador de las vistas asíncronas de reportes: verificar_peticion y
+    lecturas desde la réplica si existe.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        error = await verificar_peticion(request)
+        if error is not None:
+            return error
+
+        with leer_de_replica(request):
+            return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def filas_a_dict(columns, rows):
+    """Convierte las filas a diccionarios (a_json serializa Decimal y fechas)"""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _ejecutar_funcion_sync(alias, sql, params):
+    """Ejecuta la consulta en un hilo propio y cierra su conexión al terminar"""
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            return filas_a_dict(columns, cursor.fetchall())
+    finally:
+        connections[alias].close()
+
+
+async def ejecutar_funcion(sql, params):
+    """
+    Ejecuta un procedimiento almacenado sin bloquear el ciclo de eventos.
+
+    Returns:
+        list: Filas como diccionarios
+    """
+    alias = alias_lectura()
+
+    if not is_psycopg3:
+        return await sync_to_async(_ejecutar_funcion_sync, thread_sensitive=False)(alias, sql, params)
+
+    async with await psycopg.AsyncConnection.connect(
+        **parametros_conexion(alias),
+        autocommit=True
+    ) as conexion:
+        async with conexion.cursor() as cursor:
+            await cursor.execute(sql, params)
+            columns = [col.name for col in cursor.description]
+            return filas_a_dict(columns, await cursor.fetchall())
+
+
+async def ejecutar_reporte(sql, params, cabecera):
+    """Ejecuta el procedimiento y arma la respuesta con la cabecera del reporte"""
+    try:
+        results = await ejecutar_funcion(sql, params)
+    except Exception as e:
+        return respuesta(
+            {'error': f'Error al ejecutar el procedimiento almacenado: {str(e)}'},
+            status=500
+        )
+
+    return respuesta({
+        **cabecera,
+        'count': len(results),
+        'results': results
+    })
+
+
+@reporte_async
+async def reporte_cartas_entidad_financiera(request, pk):
+    """Versión asíncrona de FinancialEntityViewSet.reporte_cartas"""
+    try:
+        financial_entity = await FinancialEntity.objects.aget(pk=pk)
+    except FinancialEntity.DoesNotExist:
+        return respuesta(
+            {'error': f'Entidad financiera con ID {pk} no encontrada'},
+            status=404
+        )
+
+    return await ejecutar_reporte(
+        "SELECT * FROM get_warranty_by_financial_entity(%s)",
+        [pk],
+        {
+            'financial_entity_id': pk,
+            'financial_entity_description': financial_entity.description,
+        }
+    )
+
+
+@reporte_async
+async def reporte_cartas_contratista(request, pk):
+    """Versión asíncrona de ContractorViewSet.reporte_cartas"""
+    try:
+        contractor = await Contractor.objects.aget(pk=pk)
+    except Contractor.DoesNotExist:
+        return respuesta(
+            {'error': f'Contratista con ID {pk} no encontrado'},
+            status=404
+        )
+
+    return await ejecutar_reporte(
+        "SELECT * FROM get_warranty_by_contractor(%s)",
+        [pk],
+        {
+            'contractor_id': pk,
+            'contractor_business_name': contractor.business_name,
+            'contractor_ruc': contractor.ruc,
+        }
+    )
+
+
+@reporte_async
+async def reporte_cartas_objeto_garantia(request, pk):
+    """Versión asíncrona de WarrantyObjectViewSet.reporte_cartas"""
+    try:
+        warranty_object = await WarrantyObject.objects.aget(pk=pk)
+    except WarrantyObject.DoesNotExist:
+        return respuesta(
+            {'error': f'Objeto de garantía con ID {pk} no encontrado'},
+            status=404
+        )
+
+    return await ejecutar_reporte(
+        "SELECT * FROM get_warranty_report(%s)",
+        [pk],
+        {
+            'warranty_object_id': pk,
+            'warranty_object_description': warranty_object.description,
+            'warranty_object_cui': warranty_object.cui,
+        }
+    )
+
+
+@reporte_async
+async def certificacion(request):
+    """Versión asíncrona de WarrantyViewSet.certificacion"""
+    warranty_object_id = request.GET.get('warranty_object_id')
+    contractor_id = request.GET.get('contractor_id')
+
+    if not warranty_object_id:
+        return respuesta({'error': 'El parámetro warranty_object_id es requerido'}, status=400)
+
+    if not contractor_id:
+        return respuesta({'error': 'El parámetro contractor_id es requerido'}, status=400)
+
+    try:
+        warranty_object = await WarrantyObject.objects.aget(pk=warranty_object_id)
+    except WarrantyObject.DoesNotExist:
+        return respuesta(
+            {'error': f'Objeto de garantía con ID {warranty_object_id} no encontrado'},
+            status=404
+        )
+
+    try:
+        contractor = await Contractor.objects.aget(pk=contractor_id)
+    except Contractor.DoesNotExist:
+        return respuesta(
+            {'error': f'Contratista con ID {contractor_id} no encontrado'},
+            status=404
+        )
+
+    return await ejecutar_reporte(
+        "SELECT * FROM get_warranty_certification(%s, %s)",
+        [warranty_object_id, contractor_id],
+        {
+            'warranty_object_id': warranty_object_id,
+            'warranty_object_description': warranty_object.description,
+            'warranty_object_cui': warranty_object.cui,
+            'contractor_id': contractor_id,
+            'contractor_business_name': contractor.business_name,
+            'contractor_ruc': contractor.ruc,
+        }
+    )
+
+
+async def movimientos_por_periodo(request, status_id):
+    """
+    Versión asíncrona de devueltas_por_periodo / ejecutadas_por_periodo:
+    mismos parámetros, validaciones y filas (ver WarrantyViewSet).
+    """
+    fecha_desde_str = request.GET.get('fecha_desde', None)
+    fecha_hasta_str = request.GET.get('fecha_hasta', None)
+    financial_entity_id = request.GET.get('financial_entity_id', None)
+    letter_type_id = request.GET.get('letter_type_id', None)
+    contractor_id = request.GET.get('contractor_id', None)
+    warranty_object_id = request.GET.get('warranty_object_id', None)
+
+    if not fecha_desde_str or not fecha_hasta_str:
+        return respuesta({
+            'error': 'Los parámetros "fecha_desde" y "fecha_hasta" son obligatorios (formato YYYY-MM-DD)'
+        }, status=400)
+
+    try:
+        fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
+        fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
+    except ValueError:
+        return respuesta({'error': 'El formato de fecha debe ser YYYY-MM-DD'}, status=400)
+
+    if fecha_desde > fecha_hasta:
+        return respuesta({'error': 'La fecha_desde debe ser menor o igual a fecha_hasta'}, status=400)
+
+    movimientos = WarrantyHistory.objects.filter(
+        warranty_status_id=status_id,
+        issue_date__gte=fecha_desde,
+        issue_date__lte=fecha_hasta
+    ).select_related(
+        'warranty',
+        'warranty__contractor',
+        'warranty__letter_type',
+        'warranty__warranty_object',
+        'previous_history',
+        'previous_history__currency_type',
+        'previous_history__financial_entity'
+    )
+
+    if financial_entity_id:
+        movimientos = movimientos.filter(previous_history__financial_entity_id=financial_entity_id)
+
+    if letter_type_id:
+        movimientos = movimientos.filter(warranty__letter_type_id=letter_type_id)
+
+    if contractor_id:
+        movimientos = movimientos.filter(warranty__contractor_id=contractor_id)
+
+    if warranty_object_id:
+        movimientos = movimientos.filter(warranty__warranty_object_id=warranty_object_id)
+
+    results = []
+    async for movimiento in movimientos.order_by('issue_date'):
+        # Historial original: el movimiento anterior de la cadena (previous_history)
+        results.append(fila_con_historial_original(movimiento, movimiento.previous_history))
+
+    return respuesta({
+        'count': len(results),
+        'periodo': {
+            'fecha_desde': fecha_desde_str,
+            'fecha_hasta': fecha_hasta_str
+        },
+        'filtros_aplicados': {
+            'financial_entity_id': financial_entity_id,
+            'letter_type_id': letter_type_id,
+            'contractor_id': contractor_id,
+            'warranty_object_id': warranty_object_id
+        },
+        'results': results
+    })
+
+
+@reporte_async
+async def devueltas_por_periodo(request):
+    """Versión asíncrona de WarrantyViewSet.devueltas_por_periodo"""
+    return await movimientos_por_periodo(request, DEVOLUCION_STATUS_ID)
+
+
+@reporte_async
+async def ejecutadas_por_periodo(request):
+    """Versión asíncrona de WarrantyViewSet.ejecutadas_por_periodo"""
+    return await movimientos_por_periodo(request, EJECUCION_STATUS_ID)
+
+
+async def flujo_eventos():
+    """Eventos en formato SSE, con latidos mientras no hay cambios"""
+    yield f'retry: {RECONEXION_MS}\n\n'
+    async with canal_eventos.suscribir() as cola:
+        id_evento = 0
+        while True:
+            try:
+                payload = await asyncio.wait_for(cola.get(), timeout=INTERVALO_LATIDO)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            id_evento += 1
+            yield f'id: {id_evento}\ndata: {payload}\n\n'
+
+
+async def eventos(request):
+    """
+    GET /api/events/
+
+    Feed de cambios de garantías (Server-Sent Events). Acepta el token en
+    la cabecera Authorization o un ticket de GET /api/events/ticket/ en
+    ?ticket= (EventSource no envía cabeceras).
+    Cada mensaje 'data' es el JSON de un evento (ver eventos.py).
+    """
+    if not isinstance(request, ASGIRequest) or connections['default'].vendor != 'postgresql':
+        return respuesta(
+            {'error': 'El feed de eventos requiere el despliegue ASGI con PostgreSQL (ver docs/DESPLIEGUE_ASGI.md)'},
+            status=501
+        )
+
+    error = await verificar_peticion(request, ticket_en_url=True)
+    if error is not None:
+        return error
+
+    response = StreamingHttpResponse(flujo_eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx no debe almacenar la respuesta en búfer
+    response['X-Accel-Buffering'] = 'no'
+    return response
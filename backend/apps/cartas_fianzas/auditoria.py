@@ -0,0 +1,169 @@
+"""
+Bitácora de auditoría de garantías, historiales y archivos (AuditLog).
+
+- Señales pre_save/post_save/post_delete de Warranty, WarrantyHistory y
+  WarrantyFile: antes de guardar se leen los valores actuales de la fila
+  (una consulta) y después se registran solo los campos que cambiaron.
+- AuditoriaMiddleware: cada petición que modifica datos se ejecuta en una
+  transacción; los registros se acumulan durante la petición y se guardan
+  al final con un solo INSERT (bulk_create), dentro de la misma transacción.
+  Si la respuesta es un error (4xx/5xx) se revierte todo, igual que en
+  bloquear_garantia, y no queda auditoría de cambios que no se aplicaron.
+- Fuera de una petición (comandos, shell) cada registro se guarda al
+  momento.
+
+No se auditan los campos de control (created_*, updated_*), los generados
+(validity_range), is_latest, que cambia con cada movimiento nuevo, ni el
+texto extraído de los PDF. Las escrituras masivas (bulk_create,
+QuerySet.update) no envían señales y no quedan en la bitácora.
+"""
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from config.db_router import METODOS_ESCRITURA
+
+from .models import AuditLog, Warranty, WarrantyFile, WarrantyHistory
+
+CAMPOS_EXCLUIDOS = {
+    'created_by_id', 'created_at', 'updated_by_id', 'updated_at', 'is_latest',
+    # Texto de los PDF (derivado del archivo)
+    'text_status', 'text_content', 'search_vector', 'text_extracted_at',
+}
+
+# Registros pendientes de la petición actual (None fuera de una petición)
+_pendientes = ContextVar('auditoria_pendientes', default=None)
+
+
+@lru_cache(maxsize=None)
+def campos_auditados(model):
+    """Campos concretos del modelo que se registran en la bitácora"""
+    return tuple(
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and not field.generated
+        and field.attname not in CAMPOS_EXCLUIDOS
+    )
+
+
+def normalizar(field, valor):
+    """Valor comparable y serializable (archivos por nombre, tipos del campo)"""
+    if isinstance(field, models.FileField):
+        return getattr(valor, 'name', valor) or None
+    if valor is None:
+        return None
+    return field.to_python(valor)
+
+
+def valores(instance, campos):
+    """Valores no nulos de los campos (alta y eliminación)"""
+    resultado = {}
+    for field in campos:
+        valor = normalizar(field, field.value_from_object(instance))
+        if valor is not None:
+            resultado[field.attname] = valor
+    return resultado
+
+
+def registrar(instance, accion, cambios):
+    """Agrega un registro a la petición actual o lo guarda si no hay petición"""
+    entrada = AuditLog(
+        entity=instance._meta.model_name,
+        object_id=instance.pk,
+        action=accion,
+        changes=cambios
+    )
+    pendientes = _pendientes.get()
+    if pendientes is None:
+        entrada.save()
+    else:
+        pendientes.append(entrada)
+
+
+@receiver(pre_save, sender=Warranty)
+@receiver(pre_save, sender=WarrantyHistory)
+@receiver(pre_save, sender=WarrantyFile)
+def leer_valores_anteriores(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """Lee de la base los valores que la modificación va a reemplazar"""
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    campos = [
+        field for field in campos_auditados(sender)
+        if update_fields is None or field.name in update_fields or field.attname in update_fields
+    ]
+    instance._auditoria_anterior = sender._base_manager.using(using).filter(
+        pk=instance.pk
+    ).values(*[field.attname for field in campos]).first()
+
+
+@receiver(post_save, sender=Warranty)
+@receiver(post_save, sender=WarrantyHistory)
+@receiver(post_save, sender=WarrantyFile)
+def registrar_guardado(sender, instance, created, raw=False, **kwargs):
+    """Registra el alta o los campos modificados"""
+    anterior = instance.__dict__.pop('_auditoria_anterior', None)
+    if raw:
+        return
+    if created:
+        registrar(instance, AuditLog.ACCION_CREAR, valores(instance, campos_auditados(sender)))
+        return
+    if anterior is None:
+        return
+
+    cambios = {}
+    for field in campos_auditados(sender):
+        if field.attname not in anterior:
+            continue
+        antes = normalizar(field, anterior[field.attname])
+        despues = normalizar(field, field.value_from_object(instance))
+        if antes != despues:
+            cambios[field.attname] = [antes, despues]
+    if cambios:
+        registrar(instance, AuditLog.ACCION_MODIFICAR, cambios)
+
+
+@receiver(post_delete, sender=Warranty)
+@receiver(post_delete, sender=WarrantyHistory)
+@receiver(post_delete, sender=WarrantyFile)
+def registrar_eliminacion_auditoria(sender, instance, **kwargs):
+    """Registra los últimos valores del registro eliminado"""
+    registrar(instance, AuditLog.ACCION_ELIMINAR, valores(instance, campos_auditados(sender)))
+
+
+class AuditoriaMiddleware:
+    """
+    Ejecuta cada petición que modifica datos en una transacción y guarda su
+    auditoría con un solo INSERT antes de confirmarla.
+    """
+    # Rutas que no modifican datos auditados (login/logout)
+    RUTAS_EXCLUIDAS = ('/api/auth/',)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            request.method not in METODOS_ESCRITURA
+            or request.path.startswith(self.RUTAS_EXCLUIDAS)
+        ):
+            return self.get_response(request)
+
+        pendientes = []
+        token = _pendientes.set(pendientes)
+        try:
+            with transaction.atomic():
+                response = self.get_response(request)
+                if response.status_code >= 400:
+                    transaction.set_rollback(True)
+                elif pendientes:
+                    # DRF deja en request.user el usuario autenticado por token
+                    usuario = getattr(request, 'user', None)
+                    usuario_id = usuario.pk if usuario is not None and usuario.is_authenticated else None
+                    for entrada in pendientes:
+                        entrada.user_id = usuario_id
+                    AuditLog.objects.bulk_create(pendientes)
+        finally:
+            _pendientes.reset(token)
+        return response
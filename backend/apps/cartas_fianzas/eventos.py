@@ -0,0 +1,195 @@
+"""
+Feed de cambios con LISTEN/NOTIFY de PostgreSQL.
+
+- publicar_evento / publicar_evento_historial: las acciones que modifican
+  garantías (crear, renovar, devolver, ejecutar, eliminar, modificar-*)
+  envían un evento compacto con pg_notify. Dentro de una transacción,
+  PostgreSQL solo lo entrega al confirmarla.
+- CanalEventos: en cada worker ASGI, una sola conexión hace LISTEN y reparte
+  los eventos a los clientes conectados a GET /api/events/ (SSE), sin
+  importar cuántos sean.
+
+Formato del evento (JSON):
+    {"tipo": "renovar", "warranty_id": 10, "history_id": 55,
+     "warranty_status_id": 2, "financial_entity_id": 3,
+     "warranty_object_id": 7, "contractor_id": 4}
+
+El tipo 'resync' indica que pudieron perderse eventos (reconexión o cliente
+lento): el cliente debe volver a consultar lo que tenga en pantalla.
+
+EventSource no envía cabeceras: en lugar del token de la API, la URL lleva
+un ticket firmado de corta duración que solo sirve para conectarse al feed
+(emitir_ticket / usuario_de_ticket).
+"""
+import asyncio
+import contextlib
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+from config.db_pool import parametros_conexion
+from .renderers import a_json
+
+if is_psycopg3:
+    import psycopg
+else:
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+CANAL = 'cartas_fianzas_eventos'
+
+# Eventos pendientes por cliente antes de considerarlo lento
+TAMANO_COLA = 100
+
+# Segundos entre reintentos si se pierde la conexión LISTEN
+INTERVALO_REINTENTO = 5
+
+EVENTO_RESYNC = json.dumps({'tipo': 'resync'})
+
+# Sal de la firma: un ticket del feed no vale para ninguna otra firma del proyecto
+SAL_TICKET = 'cartas_fianzas.eventos.ticket'
+
+
+def emitir_ticket(user):
+    """Ticket firmado (id de usuario + fecha) para GET /api/events/?ticket="""
+    return signing.TimestampSigner(salt=SAL_TICKET).sign(str(user.pk))
+
+
+def usuario_de_ticket(ticket):
+    """
+    Returns:
+        User | None: Usuario activo del ticket, o None si la firma no es
+        válida o el ticket tiene más de EVENTS_TICKET_MAX_AGE segundos
+    """
+    try:
+        user_id = signing.TimestampSigner(salt=SAL_TICKET).unsign(
+            ticket,
+            max_age=settings.EVENTS_TICKET_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def publicar_evento(tipo, **datos):
+    """
+    Publica un evento de cambio en el canal. Un error al notificar (por
+    ejemplo, un payload de más de 8000 bytes) no afecta a la operación: el
+    pg_notify va en su propio savepoint, que se revierte sin abortar la
+    transacción de la acción.
+    """
+    conexion = connections[DEFAULT_DB_ALIAS]
+    if conexion.vendor != 'postgresql':
+        return
+
+    payload = a_json({'tipo': tipo, **datos}).decode()
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), conexion.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CANAL, payload])
+    except DatabaseError as e:
+        print(f'Error al publicar el evento {tipo}: {e}')
+
+
+def publicar_evento_historial(tipo, history):
+    """Publica el evento de un movimiento (historial) de una garantía"""
+    publicar_evento(
+        tipo,
+        warranty_id=history.warranty_id,
+        history_id=history.id,
+        warranty_status_id=history.warranty_status_id,
+        financial_entity_id=history.financial_entity_id,
+        warranty_object_id=history.warranty.warranty_object_id,
+        contractor_id=history.warranty.contractor_id,
+    )
+
+
+class CanalEventos:
+    """
+    Conexión LISTEN compartida por los clientes SSE de un proceso.
+
+    La conexión se abre con el primer cliente y se cierra con el último.
+    Siempre se escucha en la base de datos principal: las réplicas no
+    reciben las notificaciones.
+    """
+
+    def __init__(self):
+        self._colas = set()
+        self._tarea = None
+
+    @contextlib.asynccontextmanager
+    async def suscribir(self):
+        """Cola con los payloads (JSON) de los eventos recibidos"""
+        cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        self._colas.add(cola)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._escuchar())
+        try:
+            yield cola
+        finally:
+            self._colas.discard(cola)
+            if not self._colas and self._tarea is not None:
+                self._tarea.cancel()
+                self._tarea = None
+
+    def _difundir(self, payload):
+        for cola in list(self._colas):
+            try:
+                cola.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Cliente lento: se descartan sus eventos y debe resincronizar
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait(EVENTO_RESYNC)
+
+    async def _escuchar(self):
+        while True:
+            try:
+                if is_psycopg3:
+                    await self._escuchar_psycopg3()
+                else:
+                    await self._escuchar_psycopg2()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'Error en la conexión LISTEN: {e}')
+
+            # Mientras no hubo conexión pudieron perderse eventos
+            self._difundir(EVENTO_RESYNC)
+            await asyncio.sleep(INTERVALO_REINTENTO)
+
+    async def _escuchar_psycopg3(self):
+        async with await psycopg.AsyncConnection.connect(
+            **parametros_conexion(DEFAULT_DB_ALIAS),
+            autocommit=True
+        ) as conexion:
+            await conexion.execute(f'LISTEN {CANAL}')
+            async for notificacion in conexion.notifies():
+                self._difundir(notificacion.payload)
+
+    async def _escuchar_psycopg2(self):
+        conexion = await asyncio.to_thread(
+            psycopg2.connect, **parametros_conexion(DEFAULT_DB_ALIAS)
+        )
+        conexion.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        loop = asyncio.get_running_loop()
+        hay_datos = asyncio.Event()
+        loop.add_reader(conexion.fileno(), hay_datos.set)
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute(f'LISTEN {CANAL}')
+            while True:
+                await hay_datos.wait()
+                hay_datos.clear()
+                conexion.poll()
+                while conexion.notifies:
+                    self._difundir(conexion.notifies.pop(0).payload)
+        finally:
+            loop.remove_reader(conexion.fileno())
+            conexion.close()
+
+
+canal_eventos = CanalEventos()
@@ -0,0 +1,200 @@
+"""
+Campos dispersos (sparse fieldsets) y control de expansión para toda la API.
+
+Parámetros (solo en peticiones GET):
+- ?fields=id,letter_number,history.letter_number
+    Devuelve solo los campos indicados. Los campos anidados se seleccionan
+    con la ruta separada por puntos; indicar solo el nombre de un anidado
+    ('history') lo incluye completo.
+- ?expand=history,history.files
+    Relaciones anidadas (serializers) a incluir. Cuando se envía 'expand',
+    los anidados que no figuren en él (ni en 'fields') se omiten.
+
+Sin estos parámetros la respuesta no cambia.
+
+SparseFieldsetViewSetMixin además poda los select_related/prefetch_related
+del queryset para que solo se hagan los JOIN y las consultas de las
+relaciones que quedan en la respuesta.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _lista_parametro(request, nombre):
+    """Lista de valores separados por comas de un parámetro de la petición"""
+    valor = request.query_params.get(nombre, '') if request is not None else ''
+    return [item.strip() for item in valor.split(',') if item.strip()]
+
+
+def solicita_campos(request):
+    """Indica si la petición usa ?fields= o ?expand="""
+    return request is not None and request.method == 'GET' and (
+        'fields' in request.query_params or 'expand' in request.query_params
+    )
+
+
+def _es_anidado(field):
+    """True si el campo es un serializer anidado (uno o muchos)"""
+    return isinstance(field, (serializers.BaseSerializer, serializers.ListSerializer))
+
+
+class SparseFieldsetMixin:
+    """
+    Mixin para serializers: aplica ?fields= y ?expand= según la posición del
+    serializer dentro de la respuesta (raíz o anidado).
+    """
+
+    def _ruta_en_respuesta(self):
+        """Ruta con puntos del serializer dentro de la respuesta ('' en la raíz)"""
+        partes = []
+        nodo = self
+        while nodo.parent is not None:
+            if not isinstance(nodo.parent, serializers.ListSerializer):
+                partes.append(nodo.field_name)
+            nodo = nodo.parent
+        return '.'.join(reversed(partes))
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        request = self.context.get('request')
+        if not solicita_campos(request):
+            return fields
+
+        ruta = self._ruta_en_respuesta()
+        prefijo = f'{ruta}.' if ruta else ''
+
+        # Campos pedidos para este nivel (primer segmento de cada ruta)
+        pedidos = {
+            campo[len(prefijo):].split('.')[0]
+            for campo in _lista_parametro(request, 'fields')
+            if campo.startswith(prefijo)
+        }
+        expandidos = {
+            rel[len(prefijo):].split('.')[0]
+            for rel in _lista_parametro(request, 'expand')
+            if rel.startswith(prefijo)
+        }
+        usa_expand = 'expand' in request.query_params
+
+        for nombre in list(fields):
+            field = fields[nombre]
+            if _es_anidado(field):
+                incluir = nombre in pedidos or nombre in expandidos or (
+                    not pedidos and not usa_expand
+                )
+            else:
+                incluir = not pedidos or nombre in pedidos
+            if not incluir:
+                fields.pop(nombre)
+
+        return fields
+
+
+def relaciones_necesarias(serializer, model):
+    """
+    Rutas de relaciones ('a__b') que usan los campos de lectura del serializer.
+
+    Un PrimaryKeyRelatedField directo solo necesita la columna *_id, por lo
+    que no requiere JOIN. Los SerializerMethodField no se analizan.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    rutas = set()
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and len(field.source_attrs) == 1:
+            continue
+
+        actual = model
+        ruta = []
+        for parte in field.source_attrs:
+            try:
+                model_field = actual._meta.get_field(parte)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+            ruta.append(parte)
+            actual = model_field.related_model
+
+        if not ruta:
+            continue
+
+        ruta_relacion = '__'.join(ruta)
+        rutas.add(ruta_relacion)
+        if _es_anidado(field):
+            rutas |= {
+                f'{ruta_relacion}__{subruta}'
+                for subruta in relaciones_necesarias(field, actual)
+            }
+    return rutas
+
+
+def _rutas_select_related(arbol, prefijo=''):
+    """Aplana el árbol query.select_related en rutas 'a', 'a__b', ..."""
+    rutas = []
+    for nombre, hijos in arbol.items():
+        ruta = f'{prefijo}{nombre}'
+        rutas.append(ruta)
+        rutas.extend(_rutas_select_related(hijos, f'{ruta}__'))
+    return rutas
+
+
+def _necesaria(ruta, necesarias):
+    """La ruta es necesaria si coincide o es prefijo de alguna ruta necesaria"""
+    return any(n == ruta or n.startswith(f'{ruta}__') for n in necesarias)
+
+
+def podar_relaciones(queryset, necesarias):
+    """
+    Quita del queryset los select_related y prefetch_related que no
+    aparecen en 'necesarias'. Los Prefetch con queryset propio se podan
+    recursivamente con las rutas relativas a su relación.
+    """
+    select_related = queryset.query.select_related
+    if isinstance(select_related, dict):
+        conservar = [
+            ruta for ruta in _rutas_select_related(select_related)
+            if _necesaria(ruta, necesarias)
+        ]
+        queryset = queryset.select_related(None)
+        if conservar:
+            queryset = queryset.select_related(*conservar)
+
+    lookups = []
+    for lookup in queryset._prefetch_related_lookups:
+        ruta = lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup
+        if not _necesaria(ruta, necesarias):
+            continue
+        if isinstance(lookup, Prefetch) and lookup.queryset is not None:
+            subrutas = {n[len(ruta) + 2:] for n in necesarias if n.startswith(f'{ruta}__')}
+            lookup = Prefetch(
+                lookup.prefetch_through,
+                queryset=podar_relaciones(lookup.queryset, subrutas),
+                to_attr=lookup.to_attr
+            )
+        lookups.append(lookup)
+
+    return queryset.prefetch_related(None).prefetch_related(*lookups)
+
+
+def podar_para_serializer(queryset, serializer):
+    """Poda el queryset según los campos que realmente emitirá el serializer"""
+    return podar_relaciones(queryset, relaciones_necesarias(serializer, queryset.model))
+
+
+class SparseFieldsetViewSetMixin:
+    """
+    Mixin para ViewSets: en list/retrieve con ?fields= o ?expand=, poda las
+    relaciones del queryset según los campos del serializer.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in ('list', 'retrieve') and solicita_campos(self.request):
+            queryset = podar_para_serializer(queryset, self.get_serializer())
+        return queryset
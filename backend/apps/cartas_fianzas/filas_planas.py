@@ -0,0 +1,275 @@
+"""
+Serialización de filas planas para reportes grandes.
+
+FlatRowSerializer produce exactamente la misma salida que un serializer de
+DRF de solo lectura (por ejemplo WarrantyHistoryVigentesPorFechaSerializer),
+pero sin instanciar modelos ni recorrer get_attribute por cada campo:
+
+1. Compila una sola vez el mapa de campos del serializer: cada campo con
+   source 'warranty.contractor.business_name' se convierte en la columna
+   'warranty__contractor__business_name' de una proyección .values().
+2. Ejecuta la consulta con .values() (diccionarios, sin select_related).
+3. Convierte cada valor con el to_representation del campo original, de
+   modo que formatos de fecha, decimales y URLs de archivos coinciden.
+
+Se respetan las reglas de DRF para relaciones nulas: si una relación
+intermedia es NULL el campo se omite, salvo que tenga default o allow_null.
+
+Campos soportados: campos simples con source (con o sin puntos), anotaciones
+del queryset, PrimaryKeyRelatedField, FileField, SerializerMethodField y
+serializers anidados many=True de relaciones inversas (por ejemplo 'files').
+La paridad con DRF se verifica con el comando 'paridad_filas_planas'.
+"""
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import PKOnlyObject
+
+
+class CampoPlano:
+    """Plan de un campo: columna de origen, relaciones nulables y conversión"""
+
+    def __init__(self, nombre, field, columna=None, nulables=(), modelo_archivo=None):
+        self.nombre = nombre
+        self.field = field
+        self.columna = columna or nombre
+        self.nulables = nulables
+        self.modelo_archivo = modelo_archivo
+
+    def sin_valor(self):
+        """
+        Resultado cuando falta el atributo (relación nula o clave ausente),
+        igual que Field.get_attribute de DRF.
+
+        Returns:
+            tuple: (incluir el campo, valor)
+        """
+        if self.field.default is not empty:
+            return True, self.field.get_default()
+        if self.field.allow_null:
+            return True, None
+        return False, None
+
+    def representar(self, fila):
+        if any(fila[columna] is None for columna in self.nulables) or self.columna not in fila:
+            return self.sin_valor()
+
+        valor = fila[self.columna]
+        if self.modelo_archivo is not None:
+            # FieldFile, como el atributo del modelo
+            valor = self.modelo_archivo.attr_class(None, self.modelo_archivo, valor)
+        elif isinstance(self.field, serializers.PrimaryKeyRelatedField):
+            if valor is None:
+                return True, None
+            valor = PKOnlyObject(pk=valor)
+
+        if valor is None:
+            return True, None
+        return True, self.field.to_representation(valor)
+
+
+def _recorrer_source(model, source_attrs):
+    """
+    Traduce los atributos del source a un lookup del ORM.
+
+    Returns:
+        tuple: (lookup, lookups de las relaciones intermedias nulables,
+                campo del modelo final o None si es la columna de una FK),
+               o None si no corresponde a un campo del modelo
+    """
+    actual = model
+    ruta = []
+    nulables = []
+    model_field = None
+    for indice, attr in enumerate(source_attrs):
+        if actual is None:
+            return None
+        try:
+            model_field = actual._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+
+        ruta.append(attr)
+        if model_field.is_relation and attr == getattr(model_field, 'attname', None):
+            # Columna de una FK ('currency_type_id'): valor tal cual
+            actual = model_field = None
+            continue
+
+        es_ultimo = indice == len(source_attrs) - 1
+        if model_field.is_relation and not es_ultimo:
+            if model_field.many_to_many or model_field.one_to_many:
+                return None
+            if model_field.null:
+                nulables.append('__'.join(ruta))
+            actual = model_field.related_model
+        elif not es_ultimo:
+            return None
+
+    return '__'.join(ruta), nulables, model_field
+
+
+class FlatRowSerializer:
+    """
+    Serializer de filas planas equivalente a un serializer de DRF de solo lectura.
+
+    Uso:
+        serializer = FlatRowSerializer(WarrantyHistoryVigentesPorFechaSerializer, queryset)
+        return Response({'results': serializer.data})
+
+    Para completar las filas antes de convertirlas (por ejemplo con
+    completar_tiempo_entre), usar filas() y representar() por separado.
+
+    Args:
+        serializer_class: Serializer de DRF cuyo formato se reproduce
+        queryset: Consulta con los filtros, anotaciones y orden finales
+        context (dict, optional): Contexto del serializer (request para URLs absolutas)
+        columnas_extra (list, optional): Columnas adicionales a incluir en filas()
+    """
+
+    def __init__(self, serializer_class, queryset, context=None, columnas_extra=()):
+        self.queryset = queryset
+        self.context = context or {}
+        if isinstance(serializer_class, serializers.BaseSerializer):
+            # Instancia ya enlazada (serializer hijo de un anidado)
+            self.serializer = serializer_class
+        else:
+            self.serializer = serializer_class(context=self.context)
+        self.model = queryset.model
+        self.campos = []
+        self.anidados = []
+        self.metodos = []
+        self.columnas = set(columnas_extra)
+        self._compilar()
+
+    def _compilar(self):
+        model = self.model
+        anotaciones = self.queryset.query.annotations
+
+        for nombre, field in self.serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if isinstance(field, serializers.ListSerializer):
+                self.anidados.append(self._compilar_anidado(nombre, field))
+                self.columnas.add(model._meta.pk.name)
+                continue
+
+            if isinstance(field, serializers.SerializerMethodField):
+                self.metodos.append((nombre, field))
+                continue
+
+            if (
+                isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField))
+                or field.source == '*'
+            ):
+                raise ValueError(f'Campo no soportado en filas planas: {nombre}')
+
+            if len(field.source_attrs) == 1 and field.source_attrs[0] in anotaciones:
+                campo = CampoPlano(nombre, field, columna=field.source_attrs[0])
+                self.columnas.add(campo.columna)
+                self.campos.append(campo)
+                continue
+
+            recorrido = _recorrer_source(model, field.source_attrs)
+            if recorrido is None:
+                # Atributo que se completa en las filas (ej. time_expired)
+                self.campos.append(CampoPlano(nombre, field, columna=field.source))
+                continue
+
+            lookup, nulables, model_field = recorrido
+            if (
+                model_field is not None and model_field.is_relation
+                and not isinstance(field, serializers.PrimaryKeyRelatedField)
+            ):
+                raise ValueError(f'Campo no soportado en filas planas: {nombre}')
+            modelo_archivo = model_field if isinstance(model_field, models.FileField) else None
+            campo = CampoPlano(
+                nombre, field, columna=lookup, nulables=nulables, modelo_archivo=modelo_archivo
+            )
+            self.columnas.add(lookup)
+            self.columnas.update(nulables)
+            self.campos.append(campo)
+
+        if self.metodos:
+            # Los métodos reciben un objeto con todas las columnas del modelo
+            self.columnas.update(f.attname for f in model._meta.concrete_fields)
+
+    def _compilar_anidado(self, nombre, field):
+        """Serializer anidado many=True de una relación inversa ('files')"""
+        if len(field.source_attrs) != 1:
+            raise ValueError(f'Campo anidado no soportado en filas planas: {nombre}')
+        try:
+            relacion = self.model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            raise ValueError(f'Campo anidado no soportado en filas planas: {nombre}')
+        if not relacion.one_to_many:
+            raise ValueError(f'Campo anidado no soportado en filas planas: {nombre}')
+
+        # Mismo queryset que usaría instance.files.all() (o su Prefetch)
+        queryset = relacion.related_model._default_manager.all()
+        for lookup in self.queryset._prefetch_related_lookups:
+            if isinstance(lookup, Prefetch) and lookup.prefetch_to == nombre and lookup.queryset is not None:
+                queryset = lookup.queryset
+
+        fk = relacion.field.attname
+        plano = FlatRowSerializer(
+            field.child, queryset, context=self.context, columnas_extra=[fk]
+        )
+        return nombre, fk, plano
+
+    def filas(self):
+        """Ejecuta la proyección .values() y devuelve las filas sin convertir"""
+        return list(self.queryset.values(*sorted(self.columnas)))
+
+    def representar(self, filas):
+        """Convierte las filas al formato del serializer de DRF"""
+        hijos = {}
+        if self.anidados and filas:
+            pk = self.model._meta.pk.name
+            ids = [fila[pk] for fila in filas]
+            for nombre, fk, plano in self.anidados:
+                agrupados = {}
+                filas_hijas = list(plano.queryset.filter(**{f'{fk}__in': ids}).values(*sorted(plano.columnas)))
+                for fila_hija, salida in zip(filas_hijas, plano.representar(filas_hijas)):
+                    agrupados.setdefault(fila_hija[fk], []).append(salida)
+                hijos[nombre] = agrupados
+
+        resultado = []
+        for fila in filas:
+            salida = {}
+            for campo in self.campos:
+                incluir, valor = campo.representar(fila)
+                if incluir:
+                    salida[campo.nombre] = valor
+            for nombre, field in self.metodos:
+                salida[nombre] = field.to_representation(self._como_objeto(fila))
+            for nombre, _, _ in self.anidados:
+                salida[nombre] = hijos[nombre].get(fila[self.model._meta.pk.name], [])
+            resultado.append(salida)
+
+        if self.metodos or self.anidados:
+            # Mismo orden de claves que el serializer de DRF
+            orden = list(self.serializer.fields)
+            resultado = [
+                {clave: salida[clave] for clave in orden if clave in salida}
+                for salida in resultado
+            ]
+        return resultado
+
+    def _como_objeto(self, fila):
+        """Objeto con los atributos de la fila (para SerializerMethodField)"""
+        atributos = {}
+        for model_field in self.model._meta.concrete_fields:
+            valor = fila.get(model_field.attname)
+            if isinstance(model_field, models.FileField):
+                valor = model_field.attr_class(None, model_field, valor)
+            atributos[model_field.attname] = valor
+        return SimpleNamespace(**atributos)
+
+    @property
+    def data(self):
+        return self.representar(self.filas())
@@ -0,0 +1,126 @@
+"""
+Benchmark de serialización JSON de un reporte grande.
+
+Compara, sobre filas sintéticas con la forma de los reportes de cartas
+(get_warranty_by_contractor y similares):
+
+- drf_con_conversion: conversión previa de cada valor a float (bucle
+  hasattr(value, '__float__') que usaban las vistas) + JSONRenderer de DRF.
+- orjson: ORJSONRenderer directamente sobre las filas.
+
+Mide tiempo (mejor de N repeticiones) y memoria pico (tracemalloc).
+No requiere base de datos.
+
+Uso:
+    python manage.py benchmark_renderer
+    python manage.py benchmark_renderer --filas 50000 --repeticiones 5
+"""
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from apps.cartas_fianzas.renderers import ORJSONRenderer, orjson
+
+
+def generar_filas(cantidad):
+    """Filas sintéticas con los tipos que devuelven los procedimientos almacenados"""
+    inicio = date(2020, 1, 1)
+    ahora = timezone.now()
+    return [
+        {
+            'warranty_histories_id': i,
+            'letter_number': f'{i:09d}-000',
+            'issue_date': inicio + timedelta(days=i % 2000),
+            'validity_start': inicio + timedelta(days=i % 2000),
+            'validity_end': inicio + timedelta(days=i % 2000 + 365),
+            'amount': Decimal(f'{(i * 137) % 1000000}.{i % 100:02d}'),
+            'currency_type_id': 1 + i % 2,
+            'financial_entity_id': 1 + i % 12,
+            'warranty_id': i // 3,
+            'contractor_id': 1 + i % 400,
+            'letter_type_id': 1 + i % 4,
+            'warranty_object_id': 1 + i % 900,
+            'symbol': 'S/.' if i % 2 else 'US$',
+            'financial_entities_description': f'Entidad Financiera {i % 12}',
+            'business_name': f'Contratista Constructora {i % 400} S.A.C.',
+            'ruc': f'20{i:09d}',
+            'letter_types_description': 'Fiel Cumplimiento',
+            'warranty_objects_description': f'Mejoramiento del servicio de agua potable - obra {i % 900}',
+            'cui': f'{2000000 + i % 900}',
+            'warranty_statuses_last_description': 'Renovación',
+            'created_at': ahora,
+        }
+        for i in range(cantidad)
+    ]
+
+
+def convertir_a_float(filas):
+    """Bucle de conversión que usaban las vistas antes de ORJSONRenderer"""
+    results = []
+    for fila in filas:
+        row_dict = dict(fila)
+        for key, value in row_dict.items():
+            if hasattr(value, '__float__'):
+                row_dict[key] = float(value)
+        results.append(row_dict)
+    return results
+
+
+def medir(funcion, repeticiones):
+    """
+    Returns:
+        tuple: (mejor tiempo en ms, memoria pico en MB, tamaño de la salida en bytes)
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(tiempos), pico / 1024 / 1024, len(salida)
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo y la memoria de JSONRenderer (DRF) y ORJSONRenderer en un reporte grande'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=50000, help='Filas del reporte (por defecto 50000)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por caso (por defecto 5)')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson no está instalado')
+
+        filas = generar_filas(options['filas'])
+        respuesta = {'contractor_id': '1', 'count': len(filas), 'results': filas}
+
+        casos = {
+            'drf_con_conversion': lambda: JSONRenderer().render({
+                **respuesta,
+                'results': convertir_a_float(filas)
+            }),
+            'orjson': lambda: ORJSONRenderer().render(respuesta),
+        }
+
+        self.stdout.write(f'Reporte de {len(filas)} filas, mejor de {options["repeticiones"]} repeticiones\n')
+        self.stdout.write(f'{"caso":<22}{"tiempo (ms)":>14}{"memoria pico (MB)":>20}{"bytes":>14}')
+
+        resultados = {}
+        for nombre, funcion in casos.items():
+            tiempo, pico, tamano = medir(funcion, options['repeticiones'])
+            resultados[nombre] = tiempo
+            self.stdout.write(f'{nombre:<22}{tiempo:>14.1f}{pico:>20.1f}{tamano:>14}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ orjson es {resultados["drf_con_conversion"] / resultados["orjson"]:.1f}x más rápido'
+        ))
@@ -0,0 +1,146 @@
+"""
+Carga masiva de tipos de cambio diarios desde un archivo CSV.
+
+Formato (con encabezado; separador ',' o ';'):
+    fecha,moneda,tasa
+    2025-01-02,USD,3.7450
+    2025-01-02,EUR,3.8921
+
+- fecha: YYYY-MM-DD o DD/MM/YYYY
+- moneda: código de CurrencyType (ej. USD)
+- tasa: valor de 1 unidad de la moneda en la moneda de referencia
+        (settings.MONEDA_REFERENCIA, por defecto PEN); acepta coma decimal
+
+Si ya existe la tasa de una moneda y fecha se actualiza (INSERT ... ON
+CONFLICT DO UPDATE). El archivo se carga completo o no se carga: ante
+cualquier fila inválida se informan los errores y no se guarda nada.
+
+Uso:
+    python manage.py cargar_tipos_cambio tipos_cambio.csv
+    python manage.py cargar_tipos_cambio tipos_cambio.csv --validar
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.cartas_fianzas.models import CurrencyType, ExchangeRate
+from config.cache_reportes import registrar_escritura
+
+# Filas por INSERT
+TAMANO_LOTE = 2000
+
+# Errores a mostrar como máximo
+MAXIMO_ERRORES = 20
+
+
+def parsear_fecha(valor):
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f'fecha no válida "{valor}" (YYYY-MM-DD o DD/MM/YYYY)')
+
+
+def parsear_tasa(valor):
+    try:
+        tasa = Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f'tasa no válida "{valor}"')
+    if not tasa.is_finite() or tasa <= 0:
+        raise ValueError(f'la tasa debe ser mayor que cero ("{valor}")')
+    return tasa.quantize(Decimal('0.000001'))
+
+
+class Command(BaseCommand):
+    help = 'Carga tipos de cambio diarios desde un archivo CSV (fecha,moneda,tasa)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', type=str, help='Ruta del archivo CSV')
+        parser.add_argument(
+            '--validar',
+            action='store_true',
+            help='Solo validar el archivo, sin guardar'
+        )
+
+    def handle(self, *args, **options):
+        monedas = {codigo.upper(): pk for pk, codigo in CurrencyType.objects.values_list('id', 'code')}
+        referencia = settings.MONEDA_REFERENCIA.upper()
+
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                muestra = archivo.read(4096)
+                archivo.seek(0)
+                try:
+                    dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+                except csv.Error:
+                    dialecto = csv.excel
+                lector = csv.DictReader(archivo, dialect=dialecto)
+                faltantes = {'fecha', 'moneda', 'tasa'} - set(lector.fieldnames or [])
+                if faltantes:
+                    raise CommandError(
+                        f'Faltan columnas en el encabezado: {", ".join(sorted(faltantes))} '
+                        f'(se espera fecha,moneda,tasa)'
+                    )
+
+                tasas = {}
+                errores = []
+                omitidas = 0
+                for linea, fila in enumerate(lector, start=2):
+                    codigo = (fila['moneda'] or '').strip().upper()
+                    try:
+                        fecha = parsear_fecha((fila['fecha'] or '').strip())
+                        tasa = parsear_tasa((fila['tasa'] or '').strip())
+                        if codigo not in monedas:
+                            raise ValueError(f'moneda "{codigo}" no registrada')
+                    except ValueError as e:
+                        errores.append(f'Línea {linea}: {e}')
+                        continue
+                    if codigo == referencia:
+                        # La moneda de referencia siempre tiene tasa 1
+                        omitidas += 1
+                        continue
+                    # Si el archivo repite moneda y fecha, prevalece la última fila
+                    tasas[(monedas[codigo], fecha)] = tasa
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        if errores:
+            for error in errores[:MAXIMO_ERRORES]:
+                self.stdout.write(self.style.ERROR(error))
+            if len(errores) > MAXIMO_ERRORES:
+                self.stdout.write(f'... y {len(errores) - MAXIMO_ERRORES} errores más')
+            raise CommandError(f'{len(errores)} filas con errores; no se cargó ningún tipo de cambio')
+
+        if omitidas:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {omitidas} filas de la moneda de referencia ({referencia}) omitidas: su tasa es siempre 1'
+            ))
+
+        if options['validar']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Archivo válido: {len(tasas)} tipos de cambio'))
+            return
+
+        registros = [
+            ExchangeRate(currency_type_id=currency_type_id, rate_date=fecha, rate=tasa)
+            for (currency_type_id, fecha), tasa in tasas.items()
+        ]
+        with transaction.atomic():
+            ExchangeRate.objects.bulk_create(
+                registros,
+                batch_size=TAMANO_LOTE,
+                update_conflicts=True,
+                unique_fields=['currency_type', 'rate_date'],
+                update_fields=['rate']
+            )
+
+        # Los reportes cacheados con ?moneda_base= dejan de ser válidos
+        registrar_escritura()
+
+        fechas = [fecha for _, fecha in tasas]
+        rango = f' ({min(fechas)} a {max(fechas)})' if fechas else ''
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(registros)} tipos de cambio cargados{rango}'))
@@ -0,0 +1,74 @@
+"""
+Extrae e indexa el texto de los PDF adjuntos pendientes (ver texto_archivos.py).
+
+Uso:
+    python manage.py extraer_texto_archivos
+    python manage.py extraer_texto_archivos --continuo --intervalo 30
+    python manage.py extraer_texto_archivos --reintentar-errores
+
+Sin --continuo procesa todos los pendientes y termina (cron). Con
+--continuo queda en ejecución como proceso de fondo (servicio
+'texto_archivos' de docker-compose.prod.yml) y revisa la cola cada
+--intervalo segundos. Se pueden ejecutar varios procesos a la vez.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from apps.cartas_fianzas import texto_archivos
+from apps.cartas_fianzas.models import WarrantyFile
+
+
+class Command(BaseCommand):
+    help = 'Extrae el texto de los PDF adjuntos pendientes para la búsqueda de texto completo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=20, help='Archivos por transacción (por defecto 20)')
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='No terminar: revisar la cola cada --intervalo segundos'
+        )
+        parser.add_argument('--intervalo', type=int, default=30, help='Segundos entre revisiones con --continuo (por defecto 30)')
+        parser.add_argument(
+            '--reintentar-errores',
+            action='store_true',
+            help='Volver a poner en cola los archivos con error antes de procesar'
+        )
+
+    def handle(self, *args, **options):
+        if texto_archivos.PdfReader is None:
+            raise CommandError('pypdf no está instalado (pip install -r requirements.txt)')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+
+        if options['reintentar_errores']:
+            reintentos = WarrantyFile.all_objects.filter(
+                text_status=WarrantyFile.TEXTO_ERROR
+            ).update(text_status=WarrantyFile.TEXTO_PENDIENTE)
+            self.stdout.write(f'{reintentos} archivos con error vuelven a la cola')
+
+        while True:
+            procesados = self.procesar_cola(options['lote'])
+            if procesados:
+                self.stdout.write(self.style.SUCCESS(f'✅ {procesados} archivos procesados'))
+            if not options['continuo']:
+                break
+            # Proceso de larga duración: no conservar conexiones caídas o vencidas
+            close_old_connections()
+            time.sleep(options['intervalo'])
+
+    def procesar_cola(self, tamano_lote):
+        """Procesa lotes hasta vaciar la cola; retorna la cantidad de archivos"""
+        total = 0
+        while True:
+            resultados = texto_archivos.procesar_pendientes(tamano_lote)
+            for archivo, estado, error in resultados:
+                if estado == WarrantyFile.TEXTO_ERROR:
+                    self.stdout.write(self.style.WARNING(
+                        f'⚠️ Archivo {archivo.pk} ({archivo.file_name}): {error}'
+                    ))
+            total += len(resultados)
+            if len(resultados) < tamano_lote:
+                return total
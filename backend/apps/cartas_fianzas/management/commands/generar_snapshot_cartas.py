@@ -0,0 +1,152 @@
+"""
+Comando para generar la fotografía diaria de la cartera de cartas fianza.
+
+Uso:
+    python manage.py generar_snapshot_cartas
+    python manage.py generar_snapshot_cartas --fecha 2025-12-31
+    python manage.py generar_snapshot_cartas --desde 2024-01-01 --hasta 2025-12-31
+
+Pensado para ejecutarse cada noche (cron), por ejemplo:
+    5 0 * * * docker exec cartas_fianzas_backend_prod python manage.py generar_snapshot_cartas
+"""
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.cartas_fianzas.models import WarrantySnapshot
+
+
+# Días hasta el vencimiento para considerar una carta "por vencer"
+# (mismo criterio que /api/warranties/por-vencer/)
+DIAS_POR_VENCER = 15
+
+
+# Genera todas las fechas del rango con generate_series y, para cada fecha,
+# toma el último historial (MAX(id)) de cada garantía emitido hasta esa fecha.
+# Solo se consideran estados activos (excluye Devolución y Ejecución).
+SNAPSHOT_SQL = """
+    WITH dias AS (
+        SELECT d::date AS snapshot_date
+        FROM generate_series(%s::date, %s::date, interval '1 day') AS d
+    ),
+    ultimo_historial AS (
+        SELECT dias.snapshot_date, wh.*
+        FROM dias
+        CROSS JOIN LATERAL (
+            SELECT DISTINCT ON (h.warranty_id)
+                h.warranty_id,
+                h.warranty_status_id,
+                h.validity_end,
+                h.amount,
+                h.currency_type_id,
+                h.financial_entity_id
+            FROM warranty_histories h
+            WHERE h.issue_date <= dias.snapshot_date
+            ORDER BY h.warranty_id, h.id DESC
+        ) wh
+    )
+    INSERT INTO warranty_snapshots (
+        snapshot_date,
+        status_bucket,
+        currency_type_id,
+        financial_entity_id,
+        letter_type_id,
+        warranty_count,
+        total_amount,
+        created_at
+    )
+    SELECT
+        uh.snapshot_date,
+        CASE
+            WHEN uh.validity_end < uh.snapshot_date THEN %s
+            WHEN uh.validity_end <= uh.snapshot_date + %s THEN %s
+            ELSE %s
+        END AS status_bucket,
+        uh.currency_type_id,
+        uh.financial_entity_id,
+        warranties.letter_type_id,
+        COUNT(*) AS warranty_count,
+        COALESCE(SUM(uh.amount), 0) AS total_amount,
+        NOW()
+    FROM ultimo_historial uh
+    INNER JOIN warranty_statuses
+        ON uh.warranty_status_id = warranty_statuses.id
+        AND warranty_statuses.is_active = true
+    INNER JOIN warranties
+        ON uh.warranty_id = warranties.id
+    WHERE uh.validity_end IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def generar_snapshot(desde, hasta):
+    """
+    Genera (o regenera) las fotografías del rango [desde, hasta] en una sola
+    consulta. Es idempotente: primero elimina las fotografías existentes del
+    rango dentro de la misma transacción.
+    
+    Returns:
+        int: Cantidad de filas insertadas
+    """
+    with transaction.atomic():
+        WarrantySnapshot.objects.filter(
+            snapshot_date__gte=desde,
+            snapshot_date__lte=hasta
+        ).delete()
+        
+        with connection.cursor() as cursor:
+            cursor.execute(SNAPSHOT_SQL, [
+                desde,
+                hasta,
+                WarrantySnapshot.BUCKET_VENCIDA,
+                DIAS_POR_VENCER,
+                WarrantySnapshot.BUCKET_POR_VENCER,
+                WarrantySnapshot.BUCKET_VIGENTE,
+            ])
+            return cursor.rowcount
+
+
+class Command(BaseCommand):
+    help = 'Genera la fotografía diaria agregada de la cartera de cartas fianza'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            help='Fecha a generar (YYYY-MM-DD). Por defecto, hoy.'
+        )
+        parser.add_argument(
+            '--desde',
+            help='Inicio del rango a regenerar (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--hasta',
+            help='Fin del rango a regenerar (YYYY-MM-DD). Por defecto, hoy.'
+        )
+
+    def handle(self, *args, **options):
+        def parse(value, nombre):
+            try:
+                return datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f'El formato de {nombre} debe ser YYYY-MM-DD')
+
+        if options['fecha'] and (options['desde'] or options['hasta']):
+            raise CommandError('Use --fecha o --desde/--hasta, no ambos')
+
+        if options['fecha']:
+            desde = hasta = parse(options['fecha'], 'fecha')
+        elif options['desde']:
+            desde = parse(options['desde'], 'desde')
+            hasta = parse(options['hasta'], 'hasta') if options['hasta'] else date.today()
+        else:
+            desde = hasta = date.today()
+
+        if desde > hasta:
+            raise CommandError('La fecha desde debe ser menor o igual a la fecha hasta')
+
+        filas = generar_snapshot(desde, hasta)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Fotografía generada del {desde} al {hasta}: {filas} filas'
+        ))
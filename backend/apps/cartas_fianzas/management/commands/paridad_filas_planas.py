@@ -0,0 +1,253 @@
+"""
+Paridad y benchmark de FlatRowSerializer frente a los serializers de DRF.
+
+Para cada caso genera la respuesta con el serializer de DRF (modelos con
+select_related) y con FlatRowSerializer (.values()), la renderiza con
+ORJSONRenderer y verifica que los bytes sean idénticos. Luego mide el tiempo
+de ambos (consulta + serialización, mejor de N repeticiones).
+
+Casos:
+- vigentes:  WarrantyHistoryVigentesPorFechaSerializer (vigentes-por-fecha)
+- vencidas:  WarrantyHistoryVencidasPorFechaSerializer (vencidas-por-fecha)
+- detalle:   WarrantyHistoryDetailSerializer con archivos (solo paridad, 500 filas)
+
+Si la base tiene menos historiales que --filas, se generan datos sintéticos
+dentro de una transacción que se revierte al terminar (la base no cambia).
+
+Uso:
+    python manage.py paridad_filas_planas
+    python manage.py paridad_filas_planas --filas 50000 --repeticiones 3
+"""
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Value
+
+from apps.cartas_fianzas.filas_planas import FlatRowSerializer
+from apps.cartas_fianzas.models import (
+    Contractor,
+    CurrencyType,
+    FinancialEntity,
+    LetterType,
+    Warranty,
+    WarrantyFile,
+    WarrantyHistory,
+    WarrantyObject,
+    WarrantyStatus,
+)
+from apps.cartas_fianzas.renderers import ORJSONRenderer
+from apps.cartas_fianzas.serializers import (
+    WarrantyHistoryDetailSerializer,
+    WarrantyHistoryVencidasPorFechaSerializer,
+    WarrantyHistoryVigentesPorFechaSerializer,
+)
+from apps.cartas_fianzas.views import anotar_tiempo_entre, completar_tiempo_entre
+
+RELACIONES_REPORTE = (
+    'warranty',
+    'warranty__contractor',
+    'warranty__letter_type',
+    'warranty__warranty_object',
+    'currency_type',
+    'financial_entity',
+)
+
+
+def generar_datos(cantidad, fecha):
+    """
+    Crea 'cantidad' garantías con un historial cada una: la mitad vigentes a
+    la fecha y la mitad vencidas; una de cada siete sin entidad financiera ni
+    moneda (relaciones nulas) y una de cada diez con un archivo adjunto.
+    """
+    estado = WarrantyStatus.objects.create(description='Paridad activa', is_active=True)
+    moneda = CurrencyType.objects.create(description='Paridad', code='PAR', symbol='P$')
+    entidad = FinancialEntity.objects.create(description='Entidad de paridad')
+    tipo = LetterType.objects.create(description='Tipo de paridad')
+    contratistas = Contractor.objects.bulk_create([
+        Contractor(business_name=f'Contratista de paridad {i}', ruc=f'99{i:09d}')
+        for i in range(100)
+    ])
+    objetos = WarrantyObject.objects.bulk_create([
+        WarrantyObject(description=f'Objeto de paridad {i}', cui=str(2000000 + i) if i % 3 else None)
+        for i in range(300)
+    ])
+    garantias = Warranty.objects.bulk_create([
+        Warranty(
+            warranty_object=objetos[i % len(objetos)],
+            letter_type=tipo,
+            contractor=contratistas[i % len(contratistas)]
+        )
+        for i in range(cantidad)
+    ])
+
+    historiales = []
+    for i, garantia in enumerate(garantias):
+        vigente = i % 2 == 0
+        inicio = fecha - timedelta(days=30 + i % 400)
+        sin_relaciones = i % 7 == 0
+        historiales.append(WarrantyHistory(
+            warranty=garantia,
+            warranty_status=estado,
+            letter_number=f'{i:09d}-000',
+            financial_entity=None if sin_relaciones else entidad,
+            issue_date=inicio,
+            validity_start=inicio,
+            validity_end=fecha + timedelta(days=1 + i % 300) if vigente else fecha - timedelta(days=1 + i % 300),
+            currency_type=None if sin_relaciones else moneda,
+            amount=Decimal(f'{(i * 137) % 1000000}.{i % 100:02d}'),
+            reference_document=f'INFORME {i}',
+        ))
+    historiales = WarrantyHistory.objects.bulk_create(historiales)
+
+    WarrantyFile.objects.bulk_create([
+        WarrantyFile(
+            warranty_history=historial,
+            file_name=f'carta_{historial.pk}.pdf',
+            file=f'warranty_files/carta_{historial.pk}.pdf'
+        )
+        for historial in historiales[::10]
+    ])
+
+
+def consulta_vigentes(fecha):
+    return WarrantyHistory.objects.valid_on(fecha).select_related(
+        *RELACIONES_REPORTE
+    ).order_by('letter_number', 'id')
+
+
+def consulta_vencidas(fecha):
+    queryset = WarrantyHistory.objects.latest_per_warranty().active_status().expired_on(
+        fecha
+    ).select_related(*RELACIONES_REPORTE).order_by('validity_end', 'id')
+    return anotar_tiempo_entre(
+        queryset,
+        desde=F('validity_end'),
+        hasta=Value(fecha),
+        campo_dias='days_expired',
+        prefijo='time_expired'
+    )
+
+
+def completar(filas, fecha):
+    return completar_tiempo_entre(
+        filas,
+        campo_fecha='validity_end',
+        fecha_actual=fecha,
+        campo_dias='days_expired',
+        prefijo='time_expired',
+        vencido=True,
+        campo_texto='time_expired'
+    )
+
+
+def medir(funcion, repeticiones):
+    """
+    Returns:
+        tuple: (mejor tiempo en ms, salida de la última ejecución)
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tiempos), salida
+
+
+class Command(BaseCommand):
+    help = 'Verifica que FlatRowSerializer produce los mismos bytes que DRF y compara tiempos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=50000, help='Historiales mínimos para el benchmark (por defecto 50000)')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones por caso (por defecto 3)')
+        parser.add_argument('--fecha', type=str, default=None, help='Fecha de consulta YYYY-MM-DD (por defecto hoy)')
+
+    def handle(self, *args, **options):
+        try:
+            fecha = datetime.strptime(options['fecha'], '%Y-%m-%d').date() if options['fecha'] else date.today()
+        except ValueError:
+            raise CommandError('El formato de fecha debe ser YYYY-MM-DD')
+
+        renderer = ORJSONRenderer()
+        repeticiones = options['repeticiones']
+        diferencias = []
+
+        with transaction.atomic():
+            existentes = WarrantyHistory.objects.count()
+            if existentes < options['filas']:
+                faltantes = options['filas'] - existentes
+                self.stdout.write(f'Generando {faltantes} historiales sintéticos (se revierten al terminar)...')
+                generar_datos(faltantes, fecha)
+
+            casos = {
+                'vigentes': (
+                    lambda: renderer.render(
+                        WarrantyHistoryVigentesPorFechaSerializer(consulta_vigentes(fecha), many=True).data
+                    ),
+                    lambda: renderer.render(
+                        FlatRowSerializer(WarrantyHistoryVigentesPorFechaSerializer, consulta_vigentes(fecha)).data
+                    ),
+                ),
+                'vencidas': (
+                    lambda: renderer.render(
+                        WarrantyHistoryVencidasPorFechaSerializer(
+                            completar(list(consulta_vencidas(fecha)), fecha), many=True
+                        ).data
+                    ),
+                    lambda: self.vencidas_planas(renderer, fecha),
+                ),
+            }
+
+            self.stdout.write(f'\n{"caso":<12}{"filas":>10}{"DRF (ms)":>14}{"planas (ms)":>14}{"mejora":>10}  paridad')
+            for nombre, (drf, planas) in casos.items():
+                tiempo_drf, salida_drf = medir(drf, repeticiones)
+                tiempo_planas, salida_planas = medir(planas, repeticiones)
+                identicas = salida_drf == salida_planas
+                if not identicas:
+                    diferencias.append((nombre, salida_drf, salida_planas))
+                filas = salida_drf.count(b'{"id":')
+                self.stdout.write(
+                    f'{nombre:<12}{filas:>10}{tiempo_drf:>14.1f}{tiempo_planas:>14.1f}'
+                    f'{tiempo_drf / max(tiempo_planas, 0.001):>9.1f}x  {"✅" if identicas else "❌"}'
+                )
+
+            # Detalle con archivos anidados (solo paridad)
+            muestra = list(
+                WarrantyHistory.objects.filter(files__isnull=False).values_list('id', flat=True)[:250]
+            ) + list(WarrantyHistory.objects.values_list('id', flat=True)[:250])
+            detalle = WarrantyHistory.objects.filter(id__in=muestra).select_related(
+                *RELACIONES_REPORTE, 'warranty_status', 'created_by', 'updated_by'
+            ).prefetch_related('files').order_by('id')
+            salida_drf = renderer.render(WarrantyHistoryDetailSerializer(detalle, many=True).data)
+            salida_planas = renderer.render(FlatRowSerializer(WarrantyHistoryDetailSerializer, detalle).data)
+            identicas = salida_drf == salida_planas
+            if not identicas:
+                diferencias.append(('detalle', salida_drf, salida_planas))
+            self.stdout.write(f'{"detalle":<12}{len(set(muestra)):>10}{"-":>14}{"-":>14}{"-":>10}  {"✅" if identicas else "❌"}')
+
+            transaction.set_rollback(True)
+
+        if diferencias:
+            for nombre, salida_drf, salida_planas in diferencias:
+                posicion = next(
+                    (i for i, (a, b) in enumerate(zip(salida_drf, salida_planas)) if a != b),
+                    min(len(salida_drf), len(salida_planas))
+                )
+                self.stdout.write(self.style.ERROR(
+                    f'\n{nombre}: primera diferencia en el byte {posicion}\n'
+                    f'  DRF:    {salida_drf[max(0, posicion - 80):posicion + 80]!r}\n'
+                    f'  planas: {salida_planas[max(0, posicion - 80):posicion + 80]!r}'
+                ))
+            raise CommandError('FlatRowSerializer no produce la misma salida que DRF')
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Salida idéntica byte a byte en todos los casos'))
+
+    def vencidas_planas(self, renderer, fecha):
+        serializer = FlatRowSerializer(
+            WarrantyHistoryVencidasPorFechaSerializer,
+            consulta_vencidas(fecha),
+            columnas_extra=['validity_end']
+        )
+        return renderer.render(serializer.representar(completar(serializer.filas(), fecha)))
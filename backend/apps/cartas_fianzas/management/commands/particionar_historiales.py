@@ -0,0 +1,460 @@
+"""
+Comando para particionar warranty_histories y archivar cartas cerradas.
+
+Esquema de particiones (PostgreSQL declarativo):
+
+    warranty_histories                  PARTITION BY LIST (is_archived)
+    ├── warranty_histories_activos      FOR VALUES IN (false) PARTITION BY RANGE (issue_date)
+    │   ├── warranty_histories_2024     FOR VALUES FROM ('2024-01-01') TO ('2025-01-01')
+    │   ├── warranty_histories_2025     ...
+    │   └── warranty_histories_activos_default
+    └── warranty_histories_archivo      FOR VALUES IN (true)
+
+    warranty_files                      PARTITION BY LIST (is_archived)
+    ├── warranty_files_activos          FOR VALUES IN (false)
+    └── warranty_files_archivo          FOR VALUES IN (true)
+
+Uso:
+    # Conversión única (requiere ventana de mantenimiento: bloquea ambas tablas)
+    python manage.py particionar_historiales --convertir
+
+    # Crear las particiones anuales de los próximos años (cron anual)
+    python manage.py particionar_historiales --crear-particiones --anios-adelante 2
+
+    # Archivar cartas cerradas hace más de un año (cron mensual)
+    python manage.py particionar_historiales --archivar
+    python manage.py particionar_historiales --archivar --antiguedad-dias 730
+
+    # Devolver una garantía archivada a las particiones calientes
+    python manage.py particionar_historiales --desarchivar 123
+
+Notas:
+- La migración 0010 agrega is_archived; --archivar funciona aunque las
+  tablas no estén particionadas (solo marca las filas).
+- Para la sincronización incremental, archivar un historial o un archivo
+  equivale a eliminarlo: se registran tombstones (DeletedRecord) que
+  --desarchivar vuelve a quitar. La garantía sigue en /api/warranties/ (sin
+  historial): solo se actualiza su updated_at para que se vuelva a consultar.
+- PostgreSQL exige que la clave primaria de una tabla particionada incluya
+  la clave de partición, por lo que la PK pasa a ser (id, is_archived,
+  issue_date) y la FK warranty_files -> warranty_histories deja de existir
+  a nivel de base de datos (Django sigue resolviendo la relación y el
+  borrado en cascada).
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.cartas_fianzas.models import DeletedRecord, Warranty, WarrantyFile, WarrantyHistory
+from config.cache_reportes import registrar_escritura
+
+
+# Antigüedad mínima (días desde el último movimiento) para archivar una carta cerrada
+ANTIGUEDAD_DIAS_ARCHIVO = 365
+
+
+def tabla_particionada(cursor, tabla):
+    """Indica si la tabla ya es una tabla particionada"""
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+        [tabla]
+    )
+    return cursor.fetchone() is not None
+
+
+def definiciones_tabla(cursor, tabla):
+    """
+    Obtiene las definiciones de índices y FKs de una tabla (excepto la PK)
+    para recrearlas sobre la tabla particionada.
+    """
+    cursor.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+    """, [tabla])
+    indices = [fila[0] for fila in cursor.fetchall()]
+
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, [tabla])
+    fks = cursor.fetchall()
+    return indices, fks
+
+
+def columnas_copiables(cursor, tabla):
+    """Columnas no generadas de la tabla, en orden"""
+    cursor.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+          AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """, [tabla])
+    return [connection.ops.quote_name(fila[0]) for fila in cursor.fetchall()]
+
+
+def convertir_tabla(cursor, tabla, clave_primaria, particiones):
+    """
+    Convierte 'tabla' en una tabla particionada por LIST (is_archived):
+    renombra la original, crea la nueva con la misma estructura, copia los
+    datos, recrea índices y FKs y elimina la original.
+
+    Args:
+        tabla: Nombre de la tabla a convertir
+        clave_primaria: Columnas de la nueva PK (debe incluir la clave de partición)
+        particiones: Sentencias CREATE TABLE ... PARTITION OF para las particiones
+    """
+    antigua = f'{tabla}_old'
+    secuencia = f'{tabla}_part_id_seq'
+    indices, fks = definiciones_tabla(cursor, tabla)
+
+    cursor.execute(f'ALTER TABLE {tabla} RENAME TO {antigua}')
+    cursor.execute(f"""
+        CREATE TABLE {tabla} (
+            LIKE {antigua} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS
+        ) PARTITION BY LIST (is_archived)
+    """)
+    # LIKE no copia la identidad de id: se reemplaza por una secuencia propia
+    cursor.execute(f'CREATE SEQUENCE {secuencia} OWNED BY {tabla}.id')
+    cursor.execute(f"ALTER TABLE {tabla} ALTER COLUMN id SET DEFAULT nextval('{secuencia}')")
+    cursor.execute(f'ALTER TABLE {tabla} ADD PRIMARY KEY ({clave_primaria})')
+
+    for sentencia in particiones:
+        cursor.execute(sentencia)
+
+    columnas = ', '.join(columnas_copiables(cursor, antigua))
+    cursor.execute(f'INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM {antigua}')
+    cursor.execute(f"SELECT setval('{secuencia}', COALESCE((SELECT MAX(id) FROM {tabla}), 0) + 1, false)")
+
+    cursor.execute(f'DROP TABLE {antigua}')
+
+    # Los nombres de índices y FKs quedan libres al eliminar la tabla original
+    for definicion in indices:
+        cursor.execute(definicion.replace(f' ON public.{antigua} ', f' ON {tabla} ')
+                                 .replace(f' ON {antigua} ', f' ON {tabla} '))
+    for nombre, definicion in fks:
+        cursor.execute(f'ALTER TABLE {tabla} ADD CONSTRAINT {nombre} {definicion}')
+
+
+def particiones_anuales(desde_anio, hasta_anio):
+    """
+    Sentencias para crear las particiones anuales de warranty_histories_activos.
+    Solo sirven mientras la partición default no existe o está separada.
+    """
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS warranty_histories_{anio}
+        PARTITION OF warranty_histories_activos
+        FOR VALUES FROM ('{anio}-01-01') TO ('{anio + 1}-01-01')
+        """
+        for anio in range(desde_anio, hasta_anio + 1)
+    ]
+
+
+def anios_sin_particion(cursor, desde_anio, hasta_anio):
+    """Años del intervalo que aún no tienen partición propia"""
+    faltantes = []
+    for anio in range(desde_anio, hasta_anio + 1):
+        cursor.execute('SELECT to_regclass(%s)', [f'warranty_histories_{anio}'])
+        if cursor.fetchone()[0] is None:
+            faltantes.append(anio)
+    return faltantes
+
+
+def convertir(anios_adelante):
+    """
+    Conversión única de warranty_histories y warranty_files a tablas
+    particionadas. Todo ocurre en una sola transacción.
+
+    Returns:
+        tuple: (primer año, último año) de las particiones creadas
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if tabla_particionada(cursor, 'warranty_histories'):
+            raise CommandError('warranty_histories ya está particionada')
+
+        cursor.execute('LOCK TABLE warranty_histories, warranty_files IN ACCESS EXCLUSIVE MODE')
+
+        cursor.execute('SELECT EXTRACT(YEAR FROM MIN(issue_date))::int FROM warranty_histories')
+        primer_anio = cursor.fetchone()[0] or date.today().year
+        ultimo_anio = date.today().year + anios_adelante
+
+        # Una FK hacia una tabla particionada exigiría incluir la clave de
+        # partición; warranty_files queda relacionada solo a nivel de Django
+        cursor.execute("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = 'warranty_files'::regclass
+              AND confrelid = 'warranty_histories'::regclass
+              AND contype = 'f'
+        """)
+        for (nombre,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE warranty_files DROP CONSTRAINT {nombre}')
+
+        convertir_tabla(
+            cursor,
+            'warranty_histories',
+            'id, is_archived, issue_date',
+            [
+                """
+                CREATE TABLE warranty_histories_activos
+                PARTITION OF warranty_histories FOR VALUES IN (false)
+                PARTITION BY RANGE (issue_date)
+                """,
+                """
+                CREATE TABLE warranty_histories_archivo
+                PARTITION OF warranty_histories FOR VALUES IN (true)
+                """,
+                *particiones_anuales(primer_anio, ultimo_anio),
+                """
+                CREATE TABLE warranty_histories_activos_default
+                PARTITION OF warranty_histories_activos DEFAULT
+                """,
+            ]
+        )
+
+        convertir_tabla(
+            cursor,
+            'warranty_files',
+            'id, is_archived',
+            [
+                """
+                CREATE TABLE warranty_files_activos
+                PARTITION OF warranty_files FOR VALUES IN (false)
+                """,
+                """
+                CREATE TABLE warranty_files_archivo
+                PARTITION OF warranty_files FOR VALUES IN (true)
+                """,
+            ]
+        )
+
+    return primer_anio, ultimo_anio
+
+
+def crear_particiones(anios_adelante):
+    """
+    Crea las particiones anuales faltantes hasta el año actual + anios_adelante.
+
+    PostgreSQL no permite crear una partición si la partición default ya
+    tiene filas de ese rango. Por eso, en una sola transacción, se separa la
+    default, se crean las particiones, se mueven a ellas las filas de sus
+    años y se vuelve a adjuntar la default (bloquea warranty_histories_activos
+    mientras dura).
+
+    Returns:
+        tuple: (particiones creadas, filas que quedan en la partición default)
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not tabla_particionada(cursor, 'warranty_histories'):
+            raise CommandError('warranty_histories no está particionada; ejecute --convertir primero')
+
+        anio_actual = date.today().year
+        faltantes = anios_sin_particion(cursor, anio_actual, anio_actual + anios_adelante)
+
+        if faltantes:
+            cursor.execute(
+                'ALTER TABLE warranty_histories_activos '
+                'DETACH PARTITION warranty_histories_activos_default'
+            )
+            columnas = ', '.join(columnas_copiables(cursor, 'warranty_histories_activos_default'))
+            for anio in faltantes:
+                cursor.execute(particiones_anuales(anio, anio)[0])
+                rango = [date(anio, 1, 1), date(anio + 1, 1, 1)]
+                cursor.execute(f"""
+                    INSERT INTO warranty_histories_{anio} ({columnas})
+                    SELECT {columnas} FROM warranty_histories_activos_default
+                    WHERE issue_date >= %s AND issue_date < %s
+                """, rango)
+                cursor.execute("""
+                    DELETE FROM warranty_histories_activos_default
+                    WHERE issue_date >= %s AND issue_date < %s
+                """, rango)
+            cursor.execute(
+                'ALTER TABLE warranty_histories_activos '
+                'ATTACH PARTITION warranty_histories_activos_default DEFAULT'
+            )
+
+        cursor.execute('SELECT COUNT(*) FROM warranty_histories_activos_default')
+        return len(faltantes), cursor.fetchone()[0]
+
+
+def registrar_archivados(modelo, ids):
+    """Tombstones de los registros que pasan al archivo (dejan de verse en la API)"""
+    DeletedRecord.objects.bulk_create(
+        [DeletedRecord(model=modelo._meta.model_name, object_id=pk) for pk in ids],
+        batch_size=1000
+    )
+
+
+def archivar(antiguedad_dias):
+    """
+    Marca como archivadas las garantías cuyo último movimiento tiene estado
+    inactivo (Devolución/Ejecución) y fue emitido hace más de antiguedad_dias,
+    junto con los archivos de todos sus historiales. Con las tablas
+    particionadas, PostgreSQL mueve las filas a la partición de archivo.
+
+    update() no pasa por save() ni por las señales: se actualiza updated_at
+    y se crean los tombstones (DeletedRecord) de los historiales y archivos
+    para que la sincronización incremental los retire. Las garantías no se
+    archivan (siguen en /api/warranties/ con el historial vacío): se
+    actualiza su updated_at para que los clientes las vuelvan a consultar.
+
+    Returns:
+        tuple: (historiales archivados, archivos archivados)
+    """
+    limite = date.today() - timedelta(days=antiguedad_dias)
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        warranty_ids = list(WarrantyHistory.objects.latest_per_warranty().filter(
+            warranty_status__is_active=False,
+            issue_date__lt=limite
+        ).values_list('warranty_id', flat=True))
+        historial_ids = list(WarrantyHistory.objects.filter(
+            warranty_id__in=warranty_ids
+        ).values_list('id', flat=True))
+        archivo_ids = list(WarrantyFile.objects.filter(
+            warranty_history_id__in=historial_ids
+        ).values_list('id', flat=True))
+
+        archivos = WarrantyFile.objects.filter(id__in=archivo_ids).update(
+            is_archived=True, updated_at=ahora
+        )
+        historiales = WarrantyHistory.objects.filter(id__in=historial_ids).update(
+            is_archived=True, updated_at=ahora
+        )
+
+        Warranty.objects.filter(id__in=warranty_ids).update(updated_at=ahora)
+        registrar_archivados(WarrantyHistory, historial_ids)
+        registrar_archivados(WarrantyFile, archivo_ids)
+
+    # Los reportes cacheados dejan de ser válidos
+    registrar_escritura()
+    return historiales, archivos
+
+
+def desarchivar(warranty_id):
+    """
+    Devuelve una garantía archivada (historiales y archivos) a las
+    particiones calientes.
+
+    Elimina los tombstones de sus historiales y archivos y actualiza
+    updated_at (también el de la garantía, que vuelve a traer su historial)
+    para que la sincronización incremental los vuelva a entregar.
+
+    Returns:
+        tuple: (historiales restaurados, archivos restaurados)
+    """
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        historial_ids = list(WarrantyHistory.all_objects.filter(
+            warranty_id=warranty_id,
+            is_archived=True
+        ).values_list('id', flat=True))
+        archivo_ids = list(WarrantyFile.all_objects.filter(
+            warranty_history_id__in=historial_ids,
+            is_archived=True
+        ).values_list('id', flat=True))
+
+        archivos = WarrantyFile.all_objects.filter(id__in=archivo_ids).update(
+            is_archived=False, updated_at=ahora
+        )
+        historiales = WarrantyHistory.all_objects.filter(id__in=historial_ids).update(
+            is_archived=False, updated_at=ahora
+        )
+
+        if historiales:
+            Warranty.objects.filter(pk=warranty_id).update(updated_at=ahora)
+            DeletedRecord.objects.filter(
+                Q(model=WarrantyHistory._meta.model_name, object_id__in=historial_ids)
+                | Q(model=WarrantyFile._meta.model_name, object_id__in=archivo_ids)
+            ).delete()
+
+    registrar_escritura()
+    return historiales, archivos
+
+
+class Command(BaseCommand):
+    help = 'Particiona warranty_histories por año de emisión y archiva las cartas cerradas'
+
+    def add_arguments(self, parser):
+        acciones = parser.add_mutually_exclusive_group(required=True)
+        acciones.add_argument(
+            '--convertir',
+            action='store_true',
+            help='Convierte warranty_histories y warranty_files en tablas particionadas (una sola vez)'
+        )
+        acciones.add_argument(
+            '--crear-particiones',
+            action='store_true',
+            help='Crea las particiones anuales faltantes'
+        )
+        acciones.add_argument(
+            '--archivar',
+            action='store_true',
+            help='Mueve las cartas cerradas a la partición de archivo'
+        )
+        acciones.add_argument(
+            '--desarchivar',
+            type=int,
+            metavar='WARRANTY_ID',
+            help='Devuelve una garantía archivada a las particiones calientes'
+        )
+        parser.add_argument(
+            '--anios-adelante',
+            type=int,
+            default=1,
+            help='Años futuros para los que se crean particiones (por defecto 1)'
+        )
+        parser.add_argument(
+            '--antiguedad-dias',
+            type=int,
+            default=ANTIGUEDAD_DIAS_ARCHIVO,
+            help=f'Días desde el último movimiento para archivar (por defecto {ANTIGUEDAD_DIAS_ARCHIVO})'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El particionamiento requiere PostgreSQL')
+
+        if options['anios_adelante'] < 0 or options['antiguedad_dias'] < 0:
+            raise CommandError('--anios-adelante y --antiguedad-dias deben ser positivos')
+
+        if options['convertir']:
+            primer_anio, ultimo_anio = convertir(options['anios_adelante'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Tablas particionadas. Particiones anuales de {primer_anio} a {ultimo_anio}'
+            ))
+
+        elif options['crear_particiones']:
+            creadas, en_default = crear_particiones(options['anios_adelante'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Particiones anuales creadas: {creadas}'
+            ))
+            if en_default:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠️ {en_default} historiales en la partición default '
+                    f'(años sin partición propia)'
+                ))
+
+        elif options['archivar']:
+            historiales, archivos = archivar(options['antiguedad_dias'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Archivados {historiales} historiales y {archivos} archivos'
+            ))
+
+        else:
+            historiales, archivos = desarchivar(options['desarchivar'])
+            if not historiales:
+                raise CommandError(
+                    f'La garantía {options["desarchivar"]} no tiene historiales archivados'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Restaurados {historiales} historiales y {archivos} archivos'
+            ))
@@ -0,0 +1,129 @@
+"""
+Prueba de carga: latencia de un endpoint interactivo mientras corren reportes largos.
+
+Mide la latencia del endpoint interactivo en dos fases:
+1. Sin carga (línea base).
+2. Con N reportes largos ejecutándose en paralelo de forma continua.
+
+Con el despliegue síncrono (gunicorn, 3 workers) basta con 3 reportes en
+paralelo para que la latencia interactiva crezca hasta la duración de un
+reporte. Con el perfil ASGI (docs/DESPLIEGUE_ASGI.md) debe mantenerse
+cercana a la línea base.
+
+Uso (contra un servidor en ejecución):
+    python manage.py prueba_carga_reportes --token abc123...
+    python manage.py prueba_carga_reportes --token abc123... \\
+        --url http://localhost/api --concurrentes 6 --muestras 100 \\
+        --reporte "warranties/devueltas-por-periodo/?fecha_desde=2000-01-01&fecha_hasta=2100-12-31" \\
+        --interactivo "warranty-statuses/"
+"""
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) de una lista de valores"""
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, round(p / 100 * (len(ordenados) - 1)))
+    return ordenados[indice]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de un endpoint interactivo con reportes largos en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help='Token de autenticación de la API')
+        parser.add_argument('--url', default='http://localhost:8000/api', help='URL base de la API')
+        parser.add_argument(
+            '--reporte',
+            default='warranties/devueltas-por-periodo/?fecha_desde=2000-01-01&fecha_hasta=2100-12-31',
+            help='Ruta del reporte largo (relativa a --url)'
+        )
+        parser.add_argument(
+            '--interactivo',
+            default='warranty-statuses/',
+            help='Ruta del endpoint interactivo (relativa a --url)'
+        )
+        parser.add_argument('--concurrentes', type=int, default=6, help='Reportes en paralelo')
+        parser.add_argument('--muestras', type=int, default=50, help='Peticiones interactivas por fase')
+        parser.add_argument('--timeout', type=int, default=120, help='Timeout por petición (segundos)')
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        headers = {'Authorization': f'Token {options["token"]}'}
+        timeout = options['timeout']
+
+        def pedir(ruta):
+            """Ejecuta un GET y devuelve la duración en milisegundos"""
+            inicio = time.perf_counter()
+            peticion = urllib.request.Request(f'{base}/{ruta.lstrip("/")}', headers=headers)
+            with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+                respuesta.read()
+            return (time.perf_counter() - inicio) * 1000
+
+        def medir_interactivo():
+            return [pedir(options['interactivo']) for _ in range(options['muestras'])]
+
+        try:
+            pedir(options['interactivo'])
+            duracion_reporte = pedir(options['reporte'])
+        except urllib.error.URLError as e:
+            raise CommandError(f'No se pudo consultar la API: {e}')
+
+        self.stdout.write(f'Reporte aislado: {duracion_reporte:.0f} ms')
+
+        # Fase 1: línea base
+        base_ms = medir_interactivo()
+
+        # Fase 2: reportes largos en paralelo
+        detener = threading.Event()
+        duraciones_reportes = []
+        errores = []
+
+        def ejecutar_reportes():
+            while not detener.is_set():
+                try:
+                    duraciones_reportes.append(pedir(options['reporte']))
+                except Exception as e:
+                    errores.append(str(e))
+
+        hilos = [
+            threading.Thread(target=ejecutar_reportes, daemon=True)
+            for _ in range(options['concurrentes'])
+        ]
+        for hilo in hilos:
+            hilo.start()
+        # Dar tiempo a que los reportes ocupen el servidor
+        time.sleep(min(duracion_reporte / 1000 / 2, 5))
+
+        carga_ms = medir_interactivo()
+
+        detener.set()
+        for hilo in hilos:
+            hilo.join(timeout)
+
+        def resumen(nombre, valores):
+            self.stdout.write(
+                f'{nombre:<32} p50 {statistics.median(valores):8.0f} ms   '
+                f'p95 {percentil(valores, 95):8.0f} ms   max {max(valores):8.0f} ms'
+            )
+
+        self.stdout.write('')
+        resumen('Interactivo sin carga', base_ms)
+        resumen(f'Interactivo con {options["concurrentes"]} reportes', carga_ms)
+        if duraciones_reportes:
+            resumen(f'Reportes ({len(duraciones_reportes)})', duraciones_reportes)
+        if errores:
+            self.stdout.write(self.style.WARNING(f'⚠️ {len(errores)} reportes con error: {errores[0]}'))
+
+        degradacion = percentil(carga_ms, 95) / max(percentil(base_ms, 95), 1)
+        mensaje = f'p95 interactivo con carga = {degradacion:.1f}x la línea base'
+        if degradacion <= 3:
+            self.stdout.write(self.style.SUCCESS(f'✅ {mensaje}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'⚠️ {mensaje}'))
@@ -0,0 +1,144 @@
+"""
+Prueba de concurrencia: muchos movimientos en paralelo sobre una misma garantía.
+
+Envía N peticiones simultáneas de devolución (o ejecución) para una garantía
+activa. Solo la primera puede aplicarse: después de ella el último historial
+queda inactivo y las demás deben responder 400. Sin el bloqueo por garantía
+(bloquear_garantia en views.py) varias peticiones validan el mismo último
+historial y se crean movimientos duplicados.
+
+Al terminar elimina los movimientos creados (DELETE .../eliminar/) para
+dejar la garantía como estaba, salvo que se indique --conservar.
+
+Uso (contra un servidor en ejecución):
+    python manage.py prueba_concurrencia_movimientos --token abc123... --warranty-id 15
+    python manage.py prueba_concurrencia_movimientos --token abc123... --warranty-id 15 \\
+        --url http://localhost/api --concurrentes 30 --accion ejecutar
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Envía movimientos concurrentes sobre una garantía y verifica que solo uno se aplique'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help='Token de autenticación de la API')
+        parser.add_argument('--warranty-id', type=int, required=True, help='Garantía con último estado activo')
+        parser.add_argument('--url', default='http://localhost:8000/api', help='URL base de la API')
+        parser.add_argument('--accion', choices=['devolver', 'ejecutar'], default='devolver')
+        parser.add_argument('--concurrentes', type=int, default=20, help='Peticiones simultáneas')
+        parser.add_argument('--timeout', type=int, default=60, help='Timeout por petición (segundos)')
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No eliminar los movimientos creados por la prueba'
+        )
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        warranty_id = options['warranty_id']
+        timeout = options['timeout']
+        headers = {
+            'Authorization': f'Token {options["token"]}',
+            'Content-Type': 'application/json',
+        }
+
+        def pedir(metodo, ruta, datos=None):
+            """
+            Returns:
+                tuple: (código HTTP, cuerpo JSON)
+            """
+            peticion = urllib.request.Request(
+                f'{base}/{ruta.lstrip("/")}',
+                data=json.dumps(datos).encode() if datos is not None else None,
+                headers=headers,
+                method=metodo
+            )
+            try:
+                with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+                    return respuesta.status, json.loads(respuesta.read() or b'{}')
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read() or b'{}')
+
+        ruta_ultimo = f'warranty-histories/latest-by-warranty/{warranty_id}/'
+        try:
+            estado, ultimo = pedir('GET', ruta_ultimo)
+        except urllib.error.URLError as e:
+            raise CommandError(f'No se pudo consultar la API: {e}')
+        if estado != 200:
+            raise CommandError(f'No se pudo obtener el último historial de la garantía {warranty_id}: {ultimo}')
+
+        ultimo_id = ultimo.get('id')
+        self.stdout.write(
+            f'Garantía {warranty_id}: último historial {ultimo_id}. '
+            f'Enviando {options["concurrentes"]} peticiones "{options["accion"]}" en paralelo...'
+        )
+
+        datos = {
+            'warranty_id': warranty_id,
+            'issue_date': date.today().isoformat(),
+            'comments': 'Prueba de concurrencia',
+        }
+        barrera = threading.Barrier(options['concurrentes'])
+        resultados = []
+
+        def enviar():
+            barrera.wait()
+            inicio = time.perf_counter()
+            try:
+                estado, cuerpo = pedir('POST', f'warranty-histories/{options["accion"]}/', datos)
+            except Exception as e:
+                estado, cuerpo = None, {'error': str(e)}
+            resultados.append((estado, cuerpo, (time.perf_counter() - inicio) * 1000))
+
+        hilos = [threading.Thread(target=enviar) for _ in range(options['concurrentes'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        creados = [cuerpo['id'] for estado, cuerpo, _ in resultados if estado == 201]
+        rechazados = [cuerpo for estado, cuerpo, _ in resultados if estado == 400]
+        otros = [(estado, cuerpo) for estado, cuerpo, _ in resultados if estado not in (201, 400)]
+        duraciones = sorted(duracion for _, _, duracion in resultados)
+
+        self.stdout.write(f'Creados:    {len(creados)} {creados}')
+        self.stdout.write(f'Rechazados: {len(rechazados)}')
+        if otros:
+            self.stdout.write(self.style.WARNING(f'⚠️ {len(otros)} respuestas inesperadas: {otros[0]}'))
+        self.stdout.write(f'Latencia:   min {duraciones[0]:.0f} ms   max {duraciones[-1]:.0f} ms')
+
+        if not options['conservar']:
+            # Eliminar del más reciente al más antiguo (solo se puede eliminar el último)
+            for history_id in sorted(creados, reverse=True):
+                estado, cuerpo = pedir('DELETE', f'warranty-histories/{history_id}/eliminar/')
+                if estado != 200:
+                    self.stdout.write(self.style.WARNING(
+                        f'⚠️ No se pudo eliminar el historial {history_id}: {cuerpo}'
+                    ))
+            estado, ultimo = pedir('GET', ruta_ultimo)
+            if estado == 200 and ultimo.get('id') == ultimo_id:
+                self.stdout.write(f'Garantía restaurada: último historial {ultimo_id}')
+
+        if len(creados) == 1 and not otros:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Solo un movimiento aplicado de {options["concurrentes"]} peticiones simultáneas'
+            ))
+        elif not creados:
+            detalle = rechazados[0] if rechazados else otros[0] if otros else None
+            raise CommandError(
+                f'No se aplicó ningún movimiento; la garantía debe tener un último '
+                f'estado activo. Primera respuesta: {detalle}'
+            )
+        else:
+            raise CommandError(
+                f'Se aplicaron {len(creados)} movimientos (se esperaba 1): '
+                f'el bloqueo por garantía no está funcionando'
+            )
@@ -0,0 +1,572 @@
+"""
+Verificación de los planes de ejecución de las consultas frecuentes.
+
+Genera un conjunto de datos mediano dentro de una transacción que se
+revierte al terminar (la base no cambia), ejecuta ANALYZE y llama a las
+acciones reales de los ViewSets: un cambio en views.py se verifica con la
+consulta que realmente genera. Cada SELECT de la acción se captura con un
+execute_wrapper y se obtiene su EXPLAIN (FORMAT JSON). De las funciones
+almacenadas (SELECT * FROM get_...) se analiza la consulta de su RETURN
+QUERY con los argumentos de la llamada, leída de pg_proc (la versión
+instalada en la base).
+
+Casos:
+- ultimo_historial:      latest-by-warranty (is_latest, índice parcial wh_latest_idx)
+- vencidas_por_fecha:    latest_per_warranty + expired_on de un contratista
+- vigentes_por_fecha:    validity_range @> fecha (índice GiST), paginado
+- buscar_<filter_type>:  warranty-objects/buscar/ con cada filter_type
+- devueltas_por_periodo, ejecutadas_por_periodo
+- funcion_<nombre>:      get_warranty_report, get_warranty_by_contractor,
+                         get_warranty_by_financial_entity, get_warranty_certification
+
+Propiedades verificadas en cada caso:
+- índices: (tabla, columna inicial) que algún nodo Index Scan, Index Only
+  Scan o Bitmap Index Scan debe usar
+- sin Seq Scan sobre warranty_histories, salvo excepción documentada en el caso
+- estimaciones acotadas: ningún nodo que lee warranty_histories estima más
+  de --fraccion-maxima de la tabla, y los casos paginados no estiman más
+  filas que la página
+
+Con la tabla particionada (particionar_historiales) las particiones y sus
+índices se resuelven a la tabla y el índice padre. Si algún caso falla el
+comando termina con error, de modo que puede ejecutarse en CI contra una
+base con las migraciones y las funciones (create_*_function.sql) aplicadas.
+
+Uso:
+    python manage.py verificar_planes_consultas
+    python manage.py verificar_planes_consultas --garantias 50000 --caso buscar
+    python manage.py verificar_planes_consultas --mostrar-planes --salida /tmp/planes
+"""
+import json
+import random
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.cartas_fianzas.models import (
+    Contractor,
+    CurrencyType,
+    FinancialEntity,
+    LetterType,
+    Warranty,
+    WarrantyHistory,
+    WarrantyObject,
+    WarrantyStatus,
+)
+from apps.cartas_fianzas.views import (
+    ContractorViewSet,
+    FinancialEntityViewSet,
+    WarrantyHistoryViewSet,
+    WarrantyObjectViewSet,
+    WarrantyViewSet,
+)
+
+DEVOLUCION_STATUS_ID = 3
+EJECUCION_STATUS_ID = 6
+
+# Días de vigencia de cada carta y entre renovaciones
+DIAS_VIGENCIA = 90
+
+# Años hacia atrás en los que se reparten las emisiones
+ANIOS_DATOS = 20
+
+FRACCION_MAXIMA = 0.05
+
+TABLA_HISTORIALES = 'warranty_histories'
+
+NODOS_INDICE = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+LLAMADA_FUNCION = re.compile(r'^\s*SELECT \* FROM (get_\w+)\(', re.IGNORECASE)
+RETURN_QUERY = re.compile(r'RETURN\s+QUERY\s+(.*?);\s*END\b', re.IGNORECASE | re.DOTALL)
+
+SQL_ANCESTROS = """
+    WITH RECURSIVE cadena(oid, relname, nivel) AS (
+        SELECT c.oid, c.relname, 0
+        FROM pg_class c
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+        UNION ALL
+        SELECT p.oid, p.relname, cadena.nivel + 1
+        FROM cadena
+        JOIN pg_inherits i ON i.inhrelid = cadena.oid
+        JOIN pg_class p ON p.oid = i.inhparent
+    )
+    SELECT relname FROM cadena ORDER BY nivel DESC LIMIT 1
+"""
+
+SQL_INDICE = """
+    SELECT t.relname, a.attname
+    FROM pg_class i
+    JOIN pg_index x ON x.indexrelid = i.oid
+    JOIN pg_class t ON t.oid = x.indrelid
+    LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = x.indkey[0]
+    WHERE i.relname = %s AND pg_table_is_visible(i.oid)
+"""
+
+
+def generar_datos(cantidad, hoy, semilla):
+    """
+    Crea 'cantidad' garantías con su cadena de movimientos: una emisión,
+    de 0 a 5 renovaciones cada DIAS_VIGENCIA días y, en el 45% de los casos,
+    una devolución o ejecución final. Las emisiones se reparten en los
+    últimos ANIOS_DATOS años; los movimientos se insertan por generación
+    (todas las emisiones, luego las primeras renovaciones, ...), de modo que
+    las filas de una misma fecha quedan dispersas en la tabla.
+
+    Returns:
+        dict: Registros y valores de referencia para los casos
+    """
+    azar = random.Random(semilla)
+    devolucion, _ = WarrantyStatus.objects.get_or_create(
+        pk=DEVOLUCION_STATUS_ID, defaults={'description': 'Devolución', 'is_active': False}
+    )
+    ejecucion, _ = WarrantyStatus.objects.get_or_create(
+        pk=EJECUCION_STATUS_ID, defaults={'description': 'Ejecución', 'is_active': False}
+    )
+    activo = WarrantyStatus.objects.filter(is_active=True).exclude(
+        pk__in=(DEVOLUCION_STATUS_ID, EJECUCION_STATUS_ID)
+    ).first()
+    if activo is None:
+        # Id explícito: los estados 3 y 6 se insertaron sin usar la secuencia
+        ultimo = WarrantyStatus.objects.order_by('-pk').values_list('pk', flat=True).first()
+        activo = WarrantyStatus.objects.create(
+            pk=ultimo + 1,
+            description='Vigente (verificación de planes)',
+            is_active=True
+        )
+
+    monedas = [
+        CurrencyType.objects.get_or_create(code=codigo, defaults={'description': codigo, 'symbol': codigo})[0]
+        for codigo in ('VPA', 'VPB')
+    ]
+    tipos = LetterType.objects.bulk_create([
+        LetterType(description=f'Tipo de verificación de planes {i}') for i in range(3)
+    ])
+    entidades = FinancialEntity.objects.bulk_create([
+        FinancialEntity(description=f'Entidad de verificación de planes {i:03d}') for i in range(100)
+    ])
+    contratistas = Contractor.objects.bulk_create([
+        Contractor(business_name=f'Contratista de verificación de planes {i:05d}', ruc=f'98{i:09d}')
+        for i in range(max(cantidad // 40, 1))
+    ])
+    objetos = WarrantyObject.objects.bulk_create([
+        WarrantyObject(description=f'Objeto de verificación de planes {i:05d}', cui=str(3000000 + i))
+        for i in range(max(cantidad // 4, 1))
+    ])
+    garantias = Warranty.objects.bulk_create([
+        Warranty(
+            warranty_object=azar.choice(objetos),
+            letter_type=azar.choice(tipos),
+            contractor=azar.choice(contratistas)
+        )
+        for _ in range(cantidad)
+    ])
+
+    cadenas = []
+    for i, garantia in enumerate(garantias):
+        inicio = hoy - timedelta(days=azar.randint(0, ANIOS_DATOS * 365))
+        entidad = azar.choice(entidades)
+        moneda = azar.choice(monedas)
+        cadena = []
+        for renovacion in range(azar.randint(1, 6)):
+            emision = inicio + timedelta(days=DIAS_VIGENCIA * renovacion)
+            if renovacion and emision > hoy:
+                break
+            cadena.append(WarrantyHistory(
+                warranty=garantia,
+                warranty_status=activo,
+                letter_number=f'{i:09d}-{renovacion:03d}',
+                financial_entity=entidad,
+                issue_date=emision,
+                validity_start=emision,
+                validity_end=emision + timedelta(days=DIAS_VIGENCIA - 1),
+                currency_type=moneda,
+                amount=Decimal(azar.randint(1000, 5000000)),
+                reference_document=f'VERIFICACION {i}-{renovacion}',
+            ))
+        cierre = azar.random()
+        fin = cadena[-1].validity_end + timedelta(days=azar.randint(1, 30))
+        if cierre < 0.45 and fin <= hoy:
+            cadena.append(WarrantyHistory(
+                warranty=garantia,
+                warranty_status=devolucion if cierre < 0.4 else ejecucion,
+                issue_date=fin,
+                reference_document=f'VERIFICACION {i}-cierre',
+            ))
+        cadenas.append(cadena)
+
+    # bulk_create no envía señales: la cadena (enlazar_movimiento) se arma aquí
+    for generacion in range(max(len(cadena) for cadena in cadenas)):
+        movimientos = []
+        for cadena in cadenas:
+            if generacion < len(cadena):
+                movimiento = cadena[generacion]
+                movimiento.sequence_no = generacion + 1
+                movimiento.is_latest = generacion == len(cadena) - 1
+                movimiento.previous_history_id = cadena[generacion - 1].pk if generacion else None
+                movimientos.append(movimiento)
+        WarrantyHistory.objects.bulk_create(movimientos, batch_size=2000)
+
+    # Garantía de referencia: con renovaciones y devuelta (carta anterior en el reporte)
+    indice = next(
+        (i for i, cadena in enumerate(cadenas) if len(cadena) >= 3 and cadena[-1].warranty_status_id != activo.pk),
+        0
+    )
+    garantia = garantias[indice]
+    fecha_referencia = hoy - timedelta(days=5 * 365)
+    return {
+        'garantia': garantia,
+        'letter_number': cadenas[indice][0].letter_number,
+        'objeto': garantia.warranty_object,
+        'contratista': garantia.contractor,
+        'entidad': cadenas[indice][0].financial_entity,
+        'hoy': hoy,
+        'fecha': fecha_referencia,
+        'periodo': (fecha_referencia - timedelta(days=30), fecha_referencia),
+    }
+
+
+def definir_casos(datos):
+    """
+    Casos a verificar. Claves:
+        vista, accion, kwargs, parametros: acción del ViewSet y su petición GET
+        indices: (tabla, columna) que el plan debe usar
+        seq_scan_aceptado: motivo por el que se acepta un Seq Scan de
+                           warranty_histories (None: no se acepta)
+        filas_maximas: filas estimadas como máximo en la raíz de cada plan
+    """
+    garantia = datos['garantia']
+    objeto = datos['objeto']
+    contratista = datos['contratista']
+    desde, hasta = datos['periodo']
+    por_garantia = (TABLA_HISTORIALES, 'warranty_id')
+    por_id = (TABLA_HISTORIALES, 'id')
+    # Prefetch de buscar: garantías de los objetos y sus historiales
+    prefetch_buscar = [('warranties', 'warranty_object_id'), por_garantia]
+
+    casos = [
+        {
+            'nombre': 'ultimo_historial',
+            'vista': WarrantyHistoryViewSet,
+            'accion': 'latest_by_warranty',
+            'kwargs': {'warranty_id': str(garantia.pk)},
+            'indices': [por_garantia],
+        },
+        {
+            'nombre': 'vencidas_por_fecha',
+            'vista': WarrantyViewSet,
+            'accion': 'vencidas_por_fecha',
+            'parametros': {'fecha': datos['hoy'].isoformat(), 'contractor_id': contratista.pk},
+            'indices': [('warranties', 'contractor_id'), por_garantia],
+        },
+        {
+            'nombre': 'vigentes_por_fecha',
+            'vista': WarrantyViewSet,
+            'accion': 'vigentes_por_fecha',
+            'parametros': {'fecha': datos['fecha'].isoformat(), 'page_size': 100},
+            'indices': [(TABLA_HISTORIALES, 'validity_range')],
+            'filas_maximas': 101,
+        },
+    ]
+
+    valores_buscar = {
+        'cui': (objeto.cui, prefetch_buscar),
+        'description': (objeto.description[-5:], prefetch_buscar),
+        'letter_number': (datos['letter_number'][:10], prefetch_buscar),
+        # La primera rama 'contractor_ruc' de buscar filtra por descripción:
+        # con un RUC no hay resultados ni prefetch que verificar
+        'contractor_ruc': (contratista.ruc, []),
+        'contractor_name': (contratista.business_name[-5:], prefetch_buscar),
+    }
+    for filter_type, (valor, indices) in valores_buscar.items():
+        casos.append({
+            'nombre': f'buscar_{filter_type}',
+            'vista': WarrantyObjectViewSet,
+            'accion': 'buscar',
+            'parametros': {'filter_type': filter_type, 'filter_value': valor},
+            'indices': indices,
+            'seq_scan_aceptado': (
+                "LIKE '%valor%' sobre letter_number, sin índice trigram"
+                if filter_type == 'letter_number' else None
+            ),
+        })
+
+    for accion in ('devueltas_por_periodo', 'ejecutadas_por_periodo'):
+        casos.append({
+            'nombre': accion,
+            'vista': WarrantyViewSet,
+            'accion': accion,
+            'parametros': {'fecha_desde': desde.isoformat(), 'fecha_hasta': hasta.isoformat()},
+            # Carta original: previous_history por id
+            'indices': [por_id],
+            'seq_scan_aceptado': 'sin índice por (warranty_status, issue_date) para el período',
+        })
+
+    casos += [
+        {
+            'nombre': 'funcion_get_warranty_report',
+            'vista': WarrantyObjectViewSet,
+            'accion': 'reporte_cartas',
+            'kwargs': {'pk': str(objeto.pk)},
+            'indices': [('warranties', 'warranty_object_id'), por_garantia, por_id],
+        },
+        {
+            'nombre': 'funcion_get_warranty_by_contractor',
+            'vista': ContractorViewSet,
+            'accion': 'reporte_cartas',
+            'kwargs': {'pk': str(contratista.pk)},
+            'indices': [('warranties', 'contractor_id'), por_garantia, por_id],
+        },
+        {
+            'nombre': 'funcion_get_warranty_by_financial_entity',
+            'vista': FinancialEntityViewSet,
+            'accion': 'reporte_cartas',
+            'kwargs': {'pk': str(datos['entidad'].pk)},
+            'indices': [(TABLA_HISTORIALES, 'financial_entity_id'), por_garantia, por_id],
+        },
+        {
+            'nombre': 'funcion_get_warranty_certification',
+            'vista': WarrantyViewSet,
+            'accion': 'certificacion',
+            'parametros': {'warranty_object_id': objeto.pk, 'contractor_id': contratista.pk},
+            'indices': [por_garantia, por_id],
+        },
+    ]
+    return casos
+
+
+def nodos(plan):
+    """Recorre el plan y todos sus subplanes"""
+    yield plan
+    for subplan in plan.get('Plans', ()):
+        yield from nodos(subplan)
+
+
+class Command(BaseCommand):
+    help = 'Verifica los planes de ejecución (EXPLAIN) de las consultas frecuentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--garantias', type=int, default=20000, help='Garantías a generar (por defecto 20000, ~4 movimientos c/u)')
+        parser.add_argument('--semilla', type=int, default=20240101, help='Semilla de los datos generados')
+        parser.add_argument('--caso', type=str, default=None, help='Solo los casos cuyo nombre contiene este texto')
+        parser.add_argument(
+            '--fraccion-maxima',
+            type=float,
+            default=FRACCION_MAXIMA,
+            help=f'Fracción de warranty_histories que puede estimar un nodo (por defecto {FRACCION_MAXIMA})'
+        )
+        parser.add_argument('--mostrar-planes', action='store_true', help='Mostrar el EXPLAIN de las consultas de los casos con errores')
+        parser.add_argument('--salida', type=str, default=None, help='Directorio donde guardar los planes JSON de cada caso')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('La verificación de planes requiere PostgreSQL')
+        if options['garantias'] < 100:
+            raise CommandError('--garantias debe ser al menos 100')
+
+        salida = Path(options['salida']) if options['salida'] else None
+        if salida:
+            salida.mkdir(parents=True, exist_ok=True)
+
+        self.raices = {}
+        self.indices = {}
+        self.fraccion_maxima = options['fraccion_maxima']
+        fallidos = []
+
+        with transaction.atomic():
+            self.stdout.write(f'Generando {options["garantias"]} garantías sintéticas (se revierten al terminar)...')
+            datos = generar_datos(options['garantias'], date.today(), options['semilla'])
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'ANALYZE warranty_histories, warranties, warranty_objects, contractors, '
+                    'financial_entities, warranty_statuses'
+                )
+            self.total_historiales = WarrantyHistory.all_objects.count()
+            self.stdout.write(f'{self.total_historiales} historiales en la tabla\n')
+
+            casos = [
+                caso for caso in definir_casos(datos)
+                if not options['caso'] or options['caso'] in caso['nombre']
+            ]
+            if not casos:
+                raise CommandError(f'Ningún caso contiene "{options["caso"]}"')
+
+            self.stdout.write(f'{"caso":<44}{"consultas":>10}{"filas máx.":>12}  resultado')
+            for caso in casos:
+                planes, errores = self.verificar_caso(caso)
+                filas = max((plan['Plan']['Plan Rows'] for _, plan in planes), default=0)
+                self.stdout.write(
+                    f'{caso["nombre"]:<44}{len(planes):>10}{filas:>12.0f}  {"❌" if errores else "✅"}'
+                )
+                for error in errores:
+                    self.stdout.write(self.style.ERROR(f'    {error}'))
+                if errores:
+                    fallidos.append(caso['nombre'])
+                    if options['mostrar_planes']:
+                        self.mostrar_planes(planes)
+                if salida:
+                    (salida / f'{caso["nombre"]}.json').write_text(
+                        json.dumps([{'sql': sql, 'plan': plan} for sql, plan in planes], indent=2, default=str),
+                        encoding='utf-8'
+                    )
+
+            transaction.set_rollback(True)
+
+        if fallidos:
+            raise CommandError(f'{len(fallidos)} casos con planes que no cumplen: {", ".join(fallidos)}')
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {len(casos)} casos con los planes esperados'))
+
+    def verificar_caso(self, caso):
+        """
+        Returns:
+            tuple: ([(sql, plan JSON)], [errores])
+        """
+        consultas, response = self.capturar(caso)
+        if response.status_code != 200:
+            detalle = getattr(response, 'data', None)
+            return [], [f'La acción respondió {response.status_code}: {detalle}']
+
+        planes = []
+        errores = []
+        for sql, params in consultas:
+            try:
+                with transaction.atomic():
+                    planes.append(self.explicar(sql, params))
+            except (ValueError, DatabaseError) as e:
+                errores.append(f'{e}'.strip())
+
+        usados = set()
+        for sql, plan in planes:
+            for nodo in nodos(plan['Plan']):
+                tipo = nodo['Node Type']
+                tabla = self.raiz(nodo['Relation Name']) if 'Relation Name' in nodo else None
+                if tipo in NODOS_INDICE:
+                    usados.add(self.indice(nodo['Index Name']))
+                if tabla != TABLA_HISTORIALES:
+                    continue
+                if tipo == 'Seq Scan' and not caso.get('seq_scan_aceptado'):
+                    errores.append(f'Seq Scan de {nodo["Relation Name"]}: {self.resumir(sql)}')
+                fraccion = nodo['Plan Rows'] / max(self.total_historiales, 1)
+                if fraccion > self.fraccion_maxima:
+                    errores.append(
+                        f'{tipo} de {nodo["Relation Name"]} estima {nodo["Plan Rows"]:.0f} filas '
+                        f'({fraccion:.1%} de la tabla): {self.resumir(sql)}'
+                    )
+            filas_maximas = caso.get('filas_maximas')
+            if filas_maximas and plan['Plan']['Plan Rows'] > filas_maximas:
+                errores.append(
+                    f'Estima {plan["Plan"]["Plan Rows"]:.0f} filas (máximo {filas_maximas}): {self.resumir(sql)}'
+                )
+
+        for tabla, columna in caso.get('indices', ()):
+            if (tabla, columna) not in usados:
+                errores.append(f'No usa un índice de {tabla}({columna})')
+        return planes, errores
+
+    def capturar(self, caso):
+        """
+        Ejecuta la acción del caso y retorna los SELECT que ejecutó.
+
+        Returns:
+            tuple: ([(sql, params)], response)
+        """
+        consultas = []
+
+        def registrar(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                consultas.append((sql, params))
+            return execute(sql, params, many, context)
+
+        request = APIRequestFactory().get('/', caso.get('parametros', {}), HTTP_ACCEPT='application/json')
+        force_authenticate(request, user=User(username='verificar_planes'))
+        # Leer de 'default' (los datos generados no están en la réplica)
+        request.leer_de_primaria = True
+        # Marca del perfilado: cachear_reporte ejecuta la acción sin caché
+        request.perfilando = True
+
+        vista = caso['vista'].as_view({'get': caso['accion']})
+        with transaction.atomic(), connection.execute_wrapper(registrar):
+            response = vista(request, **caso.get('kwargs', {}))
+            # Las acciones capturan los errores de SQL (por ejemplo, una función
+            # no instalada) y dejan la transacción abortada: volver al savepoint
+            transaction.set_rollback(True)
+        return consultas, response
+
+    def explicar(self, sql, params):
+        """
+        EXPLAIN (FORMAT JSON) de una consulta, o de la consulta de la función
+        almacenada si la consulta es una llamada a get_...
+
+        Returns:
+            tuple: (sql analizado, plan JSON)
+        """
+        llamada = LLAMADA_FUNCION.match(sql)
+        with connection.cursor() as cursor:
+            if llamada:
+                sql = self.consulta_funcion(cursor, llamada.group(1), params)
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            else:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            resultado = cursor.fetchone()[0]
+        if isinstance(resultado, str):
+            resultado = json.loads(resultado)
+        return sql, resultado[0]
+
+    def consulta_funcion(self, cursor, nombre, argumentos):
+        """Consulta del RETURN QUERY de la función con los argumentos como literales"""
+        cursor.execute('SELECT prosrc, proargnames FROM pg_proc WHERE proname = %s', [nombre])
+        fila = cursor.fetchone()
+        if fila is None:
+            raise ValueError(f'La función {nombre} no existe (ejecutar create_*_function.sql)')
+        cuerpo, nombres = fila
+        coincidencia = RETURN_QUERY.search(cuerpo)
+        if coincidencia is None:
+            raise ValueError(f'La función {nombre} no tiene un RETURN QUERY que analizar')
+        consulta = coincidencia.group(1)
+        # proargnames lista primero los parámetros de entrada y luego las columnas de RETURNS TABLE
+        for parametro, valor in zip(nombres or (), argumentos):
+            consulta = re.sub(rf'\b{re.escape(parametro)}\b', str(int(valor)), consulta)
+        return consulta
+
+    def raiz(self, relacion):
+        """Tabla padre de una partición (o la misma tabla)"""
+        if relacion not in self.raices:
+            with connection.cursor() as cursor:
+                cursor.execute(SQL_ANCESTROS, [relacion])
+                fila = cursor.fetchone()
+            self.raices[relacion] = fila[0] if fila else relacion
+        return self.raices[relacion]
+
+    def indice(self, nombre):
+        """(tabla padre, columna inicial) de un índice"""
+        if nombre not in self.indices:
+            with connection.cursor() as cursor:
+                cursor.execute(SQL_INDICE, [nombre])
+                fila = cursor.fetchone()
+            self.indices[nombre] = (self.raiz(fila[0]), fila[1]) if fila else (None, None)
+        return self.indices[nombre]
+
+    def resumir(self, sql):
+        sql = ' '.join(sql.split())
+        return sql if len(sql) <= 120 else f'{sql[:117]}...'
+
+    def mostrar_planes(self, planes):
+        for sql, plan in planes:
+            self.stdout.write(f'\n    {self.resumir(sql)}')
+            self.mostrar_nodo(plan['Plan'], 3)
+
+    def mostrar_nodo(self, nodo, nivel):
+        """Árbol del plan: tipo de nodo, tabla, índice y filas estimadas"""
+        descripcion = nodo['Node Type']
+        if 'Relation Name' in nodo:
+            descripcion += f' on {nodo["Relation Name"]}'
+        if 'Index Name' in nodo:
+            descripcion += f' using {nodo["Index Name"]}'
+        self.stdout.write(f'{"  " * nivel}-> {descripcion} (rows={nodo["Plan Rows"]:.0f})')
+        for subplan in nodo.get('Plans', ()):
+            self.mostrar_nodo(subplan, nivel + 1)
@@ -0,0 +1,77 @@
+"""
+Comando para verificar el enrutamiento de lecturas a la réplica.
+
+Comprueba que:
+- Fuera de una vista con réplica, las lecturas van a 'default'.
+- Dentro de leer_de_replica(), las lecturas del ORM y el SQL directo
+  van a 'replica', y las escrituras siguen yendo a 'default'.
+- Con una escritura reciente (leer_de_primaria), las lecturas vuelven a 'default'.
+
+Para probarlo localmente con dos bases de datos, cree una copia de la base
+principal y apunte la réplica a ella:
+
+    createdb -T cartas_fianzas_db cartas_fianzas_replica
+    DB_REPLICA_HOST=localhost DB_REPLICA_NAME=cartas_fianzas_replica \\
+        python manage.py verificar_replica
+
+Uso:
+    python manage.py verificar_replica
+"""
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+
+from apps.cartas_fianzas.models import WarrantyHistory
+from config.db_router import REPLICA_ALIAS, alias_lectura, leer_de_replica, replica_configurada
+
+
+class Command(BaseCommand):
+    help = 'Verifica el enrutamiento de lecturas a la réplica de base de datos'
+
+    def handle(self, *args, **options):
+        if not replica_configurada():
+            raise CommandError('La réplica no está configurada (defina DB_REPLICA_HOST)')
+
+        errores = []
+
+        def verificar(descripcion, obtenido, esperado):
+            if obtenido == esperado:
+                self.stdout.write(f'  ✔ {descripcion}: {obtenido}')
+            else:
+                errores.append(descripcion)
+                self.stdout.write(self.style.ERROR(
+                    f'  ✘ {descripcion}: {obtenido} (se esperaba {esperado})'
+                ))
+
+        self.stdout.write('Sin réplica:')
+        verificar('lectura ORM', WarrantyHistory.objects.all().db, 'default')
+
+        self.stdout.write('Con réplica:')
+        with leer_de_replica():
+            verificar('lectura ORM', WarrantyHistory.objects.all().db, REPLICA_ALIAS)
+            verificar('SQL directo', alias_lectura(), REPLICA_ALIAS)
+            verificar('escritura', router.db_for_write(WarrantyHistory), 'default')
+
+        self.stdout.write('Con escritura reciente del cliente:')
+        with leer_de_replica(SimpleNamespace(leer_de_primaria=True)):
+            verificar('lectura ORM', WarrantyHistory.objects.all().db, 'default')
+
+        self.stdout.write('Conexiones:')
+        for alias in ('default', REPLICA_ALIAS):
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT current_database(), pg_is_in_recovery()')
+                base_datos, en_recuperacion = cursor.fetchone()
+                retraso = ''
+                if en_recuperacion:
+                    cursor.execute('SELECT now() - pg_last_xact_replay_timestamp()')
+                    retraso = f', retraso de replicación {cursor.fetchone()[0]}'
+            self.stdout.write(
+                f'  {alias}: base de datos {base_datos}, '
+                f'{"réplica" if en_recuperacion else "primaria"}{retraso}'
+            )
+
+        if errores:
+            raise CommandError(f'{len(errores)} verificaciones fallidas')
+
+        self.stdout.write(self.style.SUCCESS('✅ Enrutamiento a la réplica verificado'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 16:29
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0007_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarrantySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField(verbose_name='Fecha de la fotografía')),
+                ('status_bucket', models.CharField(choices=[('vigente', 'Vigente'), ('por_vencer', 'Por vencer'), ('vencida', 'Vencida')], help_text='vigente (vence en más de 15 días), por_vencer (0 a 15 días) o vencida', max_length=12, verbose_name='Situación')),
+                ('warranty_count', models.PositiveIntegerField(default=0, verbose_name='Cantidad de cartas')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=20, verbose_name='Monto total')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('currency_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='cartas_fianzas.currencytype', verbose_name='Tipo de Moneda')),
+                ('financial_entity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='cartas_fianzas.financialentity', verbose_name='Entidad Financiera')),
+                ('letter_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='cartas_fianzas.lettertype', verbose_name='Tipo de Carta')),
+            ],
+            options={
+                'verbose_name': 'Fotografía de Cartera',
+                'verbose_name_plural': 'Fotografías de Cartera',
+                'db_table': 'warranty_snapshots',
+                'ordering': ['snapshot_date', 'status_bucket'],
+                'constraints': [models.UniqueConstraint(fields=('snapshot_date', 'status_bucket', 'currency_type', 'financial_entity', 'letter_type'), name='uniq_warranty_snapshot_group', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 16:31
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0008_warrantysnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warrantyhistory',
+            name='validity_range',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(then=models.Func(models.F('validity_start'), models.F('validity_end'), models.Value('[]'), function='daterange', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), validity_end__isnull=False, validity_start__isnull=False), default=None, output_field=django.contrib.postgres.fields.ranges.DateRangeField()), output_field=django.contrib.postgres.fields.ranges.DateRangeField(), verbose_name='Rango de Vigencia'),
+        ),
+        migrations.AddIndex(
+            model_name='warrantyhistory',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['validity_range'], name='wh_validity_range_gist'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0009_warrantyhistory_validity_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warrantyfile',
+            name='is_archived',
+            field=models.BooleanField(default=False, help_text='Se archiva junto con su historial de garantía', verbose_name='Archivado'),
+        ),
+        migrations.AddField(
+            model_name='warrantyhistory',
+            name='is_archived',
+            field=models.BooleanField(default=False, help_text='Carta cerrada movida a la partición de archivo', verbose_name='Archivado'),
+        ),
+    ]
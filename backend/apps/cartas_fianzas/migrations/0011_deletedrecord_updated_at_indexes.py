@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0010_warrantyfile_is_archived_warrantyhistory_is_archived'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(help_text='Nombre del modelo eliminado (ej. warranty, warrantyhistory)', max_length=64, verbose_name='Modelo')),
+                ('object_id', models.BigIntegerField(verbose_name='ID del registro eliminado')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de eliminación')),
+            ],
+            options={
+                'verbose_name': 'Registro Eliminado',
+                'verbose_name_plural': 'Registros Eliminados',
+                'db_table': 'deleted_records',
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='contractor',
+            index=models.Index(fields=['updated_at', 'id'], name='contractors_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='warranty',
+            index=models.Index(fields=['updated_at', 'id'], name='warranties_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='warrantyhistory',
+            index=models.Index(fields=['updated_at', 'id'], name='wh_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='warrantyobject',
+            index=models.Index(fields=['updated_at', 'id'], name='wo_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedrecord',
+            index=models.Index(fields=['model', 'deleted_at', 'id'], name='deleted_records_sync_idx'),
+        ),
+    ]
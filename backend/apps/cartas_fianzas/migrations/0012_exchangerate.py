@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 17:00
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0011_deletedrecord_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rate_date', models.DateField(verbose_name='Fecha del tipo de cambio')),
+                ('rate', models.DecimalField(decimal_places=6, help_text='Valor de 1 unidad de la moneda en la moneda de referencia', max_digits=18, validators=[django.core.validators.MinValueValidator(Decimal('0.000001'))], verbose_name='Tipo de cambio')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('currency_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exchange_rates', to='cartas_fianzas.currencytype', verbose_name='Tipo de Moneda')),
+            ],
+            options={
+                'verbose_name': 'Tipo de Cambio',
+                'verbose_name_plural': 'Tipos de Cambio',
+                'db_table': 'exchange_rates',
+                'ordering': ['currency_type', '-rate_date'],
+                'constraints': [models.UniqueConstraint(fields=('currency_type', 'rate_date'), name='uniq_exchange_rate_currency_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-19 17:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Cadena de movimientos de cada garantía (ordenada por id) con funciones de
+# ventana. Las garantías con un solo historial ya quedan correctas con los
+# valores por defecto (sin anterior, sequence_no = 1, is_latest = true).
+RELLENAR_CADENA = """
+    UPDATE warranty_histories AS wh
+    SET previous_history_id = cadena.anterior,
+        sequence_no = cadena.secuencia,
+        is_latest = cadena.siguiente IS NULL
+    FROM (
+        SELECT id,
+               LAG(id) OVER movimientos AS anterior,
+               ROW_NUMBER() OVER movimientos AS secuencia,
+               LEAD(id) OVER movimientos AS siguiente
+        FROM warranty_histories
+        WINDOW movimientos AS (PARTITION BY warranty_id ORDER BY id)
+    ) AS cadena
+    WHERE wh.id = cadena.id
+      AND (cadena.anterior IS NOT NULL OR cadena.siguiente IS NOT NULL)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0012_exchangerate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warrantyhistory',
+            name='is_latest',
+            field=models.BooleanField(default=True, help_text='Indica si es el movimiento más reciente de la garantía', verbose_name='Último movimiento'),
+        ),
+        migrations.AddField(
+            model_name='warrantyhistory',
+            name='previous_history',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='next_histories', to='cartas_fianzas.warrantyhistory', verbose_name='Movimiento anterior'),
+        ),
+        migrations.AddField(
+            model_name='warrantyhistory',
+            name='sequence_no',
+            field=models.PositiveIntegerField(default=1, help_text='Posición en la cadena de movimientos de la garantía (1 = emisión)', verbose_name='Número de movimiento'),
+        ),
+        migrations.RunSQL(RELLENAR_CADENA, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='warrantyhistory',
+            index=models.Index(condition=models.Q(('is_latest', True)), fields=['warranty'], name='wh_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-19 17:09
+
+import django.contrib.postgres.indexes
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0013_warrantyhistory_chain'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(help_text='Modelo auditado (warranty, warrantyhistory, warrantyfile)', max_length=32, verbose_name='Entidad')),
+                ('object_id', models.BigIntegerField(verbose_name='ID del registro')),
+                ('action', models.CharField(choices=[('crear', 'Creación'), ('modificar', 'Modificación'), ('eliminar', 'Eliminación')], max_length=16, verbose_name='Acción')),
+                ('changes', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Cambios')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='audit_logs', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro de Auditoría',
+                'verbose_name_plural': 'Registros de Auditoría',
+                'db_table': 'audit_logs',
+                'ordering': ['-id'],
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='audit_logs_created_brin'), models.Index(fields=['entity', 'object_id', 'id'], name='audit_logs_entity_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 17:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cartas_fianzas', '0014_auditlog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warrantyfile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='Vector de búsqueda'),
+        ),
+        migrations.AddField(
+            model_name='warrantyfile',
+            name='text_content',
+            field=models.TextField(blank=True, default='', help_text='Texto del PDF (para los fragmentos de la búsqueda)', verbose_name='Texto extraído'),
+        ),
+        migrations.AddField(
+            model_name='warrantyfile',
+            name='text_extracted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha de extracción de texto'),
+        ),
+        migrations.AddField(
+            model_name='warrantyfile',
+            name='text_status',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('extraido', 'Extraído'), ('sin_texto', 'Sin texto'), ('error', 'Error')], default='pendiente', max_length=16, verbose_name='Estado de extracción de texto'),
+        ),
+        migrations.AddIndex(
+            model_name='warrantyfile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='warranty_files_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='warrantyfile',
+            index=models.Index(condition=models.Q(('text_status', 'pendiente')), fields=['id'], name='warranty_files_pendientes_idx'),
+        ),
+    ]
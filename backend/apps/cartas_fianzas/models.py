@@ -1,9 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.search import SearchVectorField
+from django.db.backends.postgresql.psycopg_any import DateRange
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, GistIndex
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class UserProfile(models.Model):
@@ -110,6 +116,10 @@ class WarrantyObject(BaseModel):
         verbose_name = 'Objeto de Garantía'
         verbose_name_plural = 'Objetos de Garantía'
         ordering = ['-created_at']
+        indexes = [
+            # Sincronización incremental (?updated_since=)
+            models.Index(fields=['updated_at', 'id'], name='wo_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cui} - {self.description[:50]}"
@@ -175,6 +185,10 @@ class Contractor(BaseModel):
         verbose_name = 'Contratista'
         verbose_name_plural = 'Contratistas'
         ordering = ['business_name']
+        indexes = [
+            # Sincronización incremental (?updated_since=)
+            models.Index(fields=['updated_at', 'id'], name='contractors_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.business_name} - {self.ruc}"
@@ -264,14 +278,85 @@ class Warranty(BaseModel):
         verbose_name = 'Garantía'
         verbose_name_plural = 'Garantías'
         ordering = ['-created_at']
+        indexes = [
+            # Sincronización incremental (?updated_since=)
+            models.Index(fields=['updated_at', 'id'], name='warranties_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return f"Garantía {self.id} - {self.warranty_object.cui} - {self.contractor.business_name}"
 
 
+class WarrantyHistoryQuerySet(models.QuerySet):
+    """
+    Consultas reutilizables sobre el historial de garantías para reportes
+    "a una fecha" (vigentes, vencidas, último movimiento de cada garantía).
+    """
+
+    def latest_per_warranty(self):
+        """
+        Solo el último historial de cada garantía.
+        
+        Usa la columna mantenida is_latest (índice parcial wh_latest_idx):
+        WHERE is_latest = true
+        """
+        return self.filter(is_latest=True)
+
+    def active_status(self):
+        """Solo historiales con estado activo (excluye Devolución y Ejecución)"""
+        return self.filter(warranty_status__is_active=True)
+
+    def valid_on(self, fecha):
+        """
+        Historiales vigentes a una fecha: validity_start <= fecha <= validity_end.
+        
+        Usa el rango generado validity_range (índice GiST):
+        WHERE validity_range @> fecha
+        """
+        return self.filter(validity_range__contains=fecha)
+
+    def expired_on(self, fecha):
+        """
+        Historiales vencidos a una fecha: validity_end < fecha.
+        
+        Usa el rango generado validity_range (índice GiST):
+        WHERE validity_range << daterange(fecha, NULL)
+        """
+        return self.filter(validity_range__fully_lt=DateRange(fecha, None))
+
+    def as_of(self, fecha):
+        """
+        Último movimiento con estado activo de cada garantía, vigente a la fecha.
+        Base común para reportes de cartera a una fecha.
+        """
+        return self.latest_per_warranty().active_status().valid_on(fecha)
+
+
+class NonArchivedManager(models.Manager):
+    """
+    Manager por defecto que excluye los registros archivados.
+    
+    Con warranty_histories/warranty_files particionadas por is_archived,
+    el filtro is_archived = false hace que PostgreSQL descarte la partición
+    de archivo y solo recorra las particiones calientes.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_archived=False)
+
+
 class WarrantyHistory(BaseModel):
     """
     Historial de garantías (movimientos de cada carta fianza)
+    
+    Las cartas cerradas (último estado Devolución/Ejecución) con más de un año
+    se archivan con el comando 'particionar_historiales --archivar'.
+    'objects' solo ve las no archivadas; 'all_objects' incluye el archivo.
+    
+    Cadena de movimientos: previous_history, sequence_no e is_latest se
+    mantienen con las señales enlazar_movimiento / desenlazar_movimiento al
+    crear y eliminar historiales, de modo que el anterior, el siguiente y el
+    último movimiento de una garantía se obtienen sin MAX(id) ni ORDER BY.
     """
     warranty = models.ForeignKey(
         Warranty,
@@ -347,21 +432,140 @@ class WarrantyHistory(BaseModel):
         verbose_name='Comentarios',
         help_text='Observaciones adicionales sobre el movimiento'
     )
+    # Rango de vigencia [validity_start, validity_end] generado por PostgreSQL.
+    # Es NULL cuando falta alguna de las fechas (devoluciones/ejecuciones).
+    validity_range = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                validity_start__isnull=False,
+                validity_end__isnull=False,
+                then=models.Func(
+                    models.F('validity_start'),
+                    models.F('validity_end'),
+                    models.Value('[]'),
+                    function='daterange',
+                    output_field=DateRangeField()
+                )
+            ),
+            default=None,
+            output_field=DateRangeField()
+        ),
+        output_field=DateRangeField(),
+        db_persist=True,
+        verbose_name='Rango de Vigencia'
+    )
+    is_archived = models.BooleanField(
+        default=False,
+        verbose_name='Archivado',
+        help_text='Carta cerrada movida a la partición de archivo'
+    )
+    # Sin FK en la base de datos: warranty_histories puede estar particionada
+    # y su PK (id, is_archived, issue_date) no admite referencias solo por id
+    previous_history = models.ForeignKey(
+        'self',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='next_histories',
+        verbose_name='Movimiento anterior',
+        null=True,
+        blank=True
+    )
+    sequence_no = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Número de movimiento',
+        help_text='Posición en la cadena de movimientos de la garantía (1 = emisión)'
+    )
+    is_latest = models.BooleanField(
+        default=True,
+        verbose_name='Último movimiento',
+        help_text='Indica si es el movimiento más reciente de la garantía'
+    )
+
+    objects = NonArchivedManager.from_queryset(WarrantyHistoryQuerySet)()
+    all_objects = WarrantyHistoryQuerySet.as_manager()
 
     class Meta:
         db_table = 'warranty_histories'
         verbose_name = 'Historial de Garantía'
         verbose_name_plural = 'Historiales de Garantía'
         ordering = ['-issue_date', '-created_at']
+        indexes = [
+            GistIndex(fields=['validity_range'], name='wh_validity_range_gist'),
+            # Sincronización incremental (?updated_since=)
+            models.Index(fields=['updated_at', 'id'], name='wh_updated_at_id_idx'),
+            # Último movimiento de cada garantía
+            models.Index(
+                fields=['warranty'],
+                condition=models.Q(is_latest=True),
+                name='wh_latest_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.letter_number} - {self.warranty_status.description}"
 
 
+@receiver(pre_save, sender=WarrantyHistory)
+def enlazar_movimiento(sender, instance, raw=False, **kwargs):
+    """
+    Enlaza un historial nuevo con el último movimiento de su garantía.
+    
+    Las acciones que crean movimientos bloquean la garantía
+    (bloquear_garantia), por lo que el último movimiento no cambia
+    hasta que termina la transacción.
+    """
+    if raw or not instance._state.adding or instance.previous_history_id is not None:
+        return
+    anterior = sender.all_objects.filter(
+        warranty_id=instance.warranty_id,
+        is_latest=True
+    ).values('id', 'sequence_no').first()
+    if anterior:
+        instance.previous_history_id = anterior['id']
+        instance.sequence_no = anterior['sequence_no'] + 1
+    instance.is_latest = True
+
+
+@receiver(post_save, sender=WarrantyHistory)
+def cerrar_movimiento_anterior(sender, instance, created, raw=False, **kwargs):
+    """El movimiento anterior deja de ser el último"""
+    if created and not raw and instance.previous_history_id is not None:
+        sender.all_objects.filter(pk=instance.previous_history_id).update(
+            is_latest=False,
+            updated_at=timezone.now()
+        )
+
+
+@receiver(post_delete, sender=WarrantyHistory)
+def desenlazar_movimiento(sender, instance, **kwargs):
+    """Al eliminar el último movimiento, el anterior vuelve a ser el último"""
+    if instance.is_latest and instance.previous_history_id is not None:
+        sender.all_objects.filter(pk=instance.previous_history_id).update(
+            is_latest=True,
+            updated_at=timezone.now()
+        )
+
+
 class WarrantyFile(BaseModel):
     """
     Archivos adjuntos al historial de garantías
+    
+    El texto de los PDF se extrae fuera de la petición de carga con el
+    comando 'extraer_texto_archivos' (los archivos nuevos quedan en
+    text_status 'pendiente') y se indexa en search_vector (índice GIN)
+    para /api/warranty-files/buscar/ (ver texto_archivos.py).
     """
+    TEXTO_PENDIENTE = 'pendiente'
+    TEXTO_EXTRAIDO = 'extraido'
+    TEXTO_VACIO = 'sin_texto'
+    TEXTO_ERROR = 'error'
+    ESTADOS_TEXTO = [
+        (TEXTO_PENDIENTE, 'Pendiente'),
+        (TEXTO_EXTRAIDO, 'Extraído'),
+        (TEXTO_VACIO, 'Sin texto'),
+        (TEXTO_ERROR, 'Error'),
+    ]
+
     warranty_history = models.ForeignKey(
         WarrantyHistory,
         on_delete=models.CASCADE,
@@ -378,13 +582,315 @@ class WarrantyFile(BaseModel):
         blank=True,
         null=True
     )
+    is_archived = models.BooleanField(
+        default=False,
+        verbose_name='Archivado',
+        help_text='Se archiva junto con su historial de garantía'
+    )
+    text_status = models.CharField(
+        max_length=16,
+        choices=ESTADOS_TEXTO,
+        default=TEXTO_PENDIENTE,
+        verbose_name='Estado de extracción de texto'
+    )
+    text_content = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Texto extraído',
+        help_text='Texto del PDF (para los fragmentos de la búsqueda)'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Vector de búsqueda'
+    )
+    text_extracted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de extracción de texto'
+    )
+
+    objects = NonArchivedManager()
+    all_objects = models.Manager()
 
     class Meta:
         db_table = 'warranty_files'
         verbose_name = 'Archivo de Garantía'
         verbose_name_plural = 'Archivos de Garantía'
         ordering = ['-created_at']
+        indexes = [
+            # Búsqueda de texto completo (/api/warranty-files/buscar/)
+            GinIndex(fields=['search_vector'], name='warranty_files_search_gin'),
+            # Cola de extracción de texto
+            models.Index(
+                fields=['id'],
+                condition=models.Q(text_status='pendiente'),
+                name='warranty_files_pendientes_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.file_name
 
+
+
+class DeletedRecord(models.Model):
+    """
+    Registro de eliminación (tombstone) para la sincronización incremental.
+
+    Se crea automáticamente al eliminar una garantía, un historial, un
+    contratista o un objeto de garantía (y al archivar historiales y archivos
+    con particionar_historiales --archivar), y se devuelve en
+    'deleted' en las consultas con ?updated_since=.
+    """
+    model = models.CharField(
+        max_length=64,
+        verbose_name='Modelo',
+        help_text='Nombre del modelo eliminado (ej. warranty, warrantyhistory)'
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='ID del registro eliminado'
+    )
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de eliminación'
+    )
+
+    class Meta:
+        db_table = 'deleted_records'
+        verbose_name = 'Registro Eliminado'
+        verbose_name_plural = 'Registros Eliminados'
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['model', 'deleted_at', 'id'], name='deleted_records_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
+
+
+@receiver(post_delete, sender=Warranty)
+@receiver(post_delete, sender=WarrantyHistory)
+@receiver(post_delete, sender=Contractor)
+@receiver(post_delete, sender=WarrantyObject)
+def registrar_eliminacion(sender, instance, **kwargs):
+    """Registra el tombstone de un registro sincronizable eliminado"""
+    DeletedRecord.objects.create(
+        model=sender._meta.model_name,
+        object_id=instance.pk
+    )
+
+
+class AuditLog(models.Model):
+    """
+    Bitácora de auditoría (solo inserción) de garantías, historiales y archivos.
+    
+    Cada fila es un alta, una modificación o una eliminación; 'changes'
+    guarda en JSONB solo los campos involucrados (por attname):
+    - crear / eliminar: {"amount": "1500.00", "issue_date": "2025-01-10", ...}
+    - modificar:        {"amount": ["1000.00", "1500.00"]}  (antes, después)
+    
+    Las filas se escriben con auditoria.py en la misma transacción que el
+    cambio y no se modifican ni eliminan. Como se insertan en orden de
+    tiempo, el índice BRIN sobre created_at resuelve los rangos de fechas
+    ocupando unas pocas páginas aunque la tabla tenga millones de filas.
+    """
+    ACCION_CREAR = 'crear'
+    ACCION_MODIFICAR = 'modificar'
+    ACCION_ELIMINAR = 'eliminar'
+    ACCIONES = [
+        (ACCION_CREAR, 'Creación'),
+        (ACCION_MODIFICAR, 'Modificación'),
+        (ACCION_ELIMINAR, 'Eliminación'),
+    ]
+
+    entity = models.CharField(
+        max_length=32,
+        verbose_name='Entidad',
+        help_text='Modelo auditado (warranty, warrantyhistory, warrantyfile)'
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='ID del registro'
+    )
+    action = models.CharField(
+        max_length=16,
+        choices=ACCIONES,
+        verbose_name='Acción'
+    )
+    changes = models.JSONField(
+        encoder=DjangoJSONEncoder,
+        verbose_name='Cambios'
+    )
+    # Sin FK en la base de datos: eliminar un usuario no modifica la bitácora
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='audit_logs',
+        verbose_name='Usuario',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha'
+    )
+
+    class Meta:
+        db_table = 'audit_logs'
+        verbose_name = 'Registro de Auditoría'
+        verbose_name_plural = 'Registros de Auditoría'
+        ordering = ['-id']
+        indexes = [
+            BrinIndex(fields=['created_at'], name='audit_logs_created_brin'),
+            models.Index(fields=['entity', 'object_id', 'id'], name='audit_logs_entity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} #{self.object_id} ({self.action})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('La bitácora de auditoría no admite modificaciones')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('La bitácora de auditoría no admite eliminaciones')
+
+
+class WarrantySnapshot(models.Model):
+    """
+    Fotografía diaria agregada de la cartera de cartas fianza.
+    
+    Cada fila resume, para una fecha, la cantidad y el monto de las cartas
+    cuyo último movimiento a esa fecha tiene estado activo, agrupadas por
+    situación (vigente, por vencer, vencida), moneda, entidad financiera
+    y tipo de carta.
+    
+    Se genera con el comando 'generar_snapshot_cartas' y alimenta el
+    endpoint /api/warranties/series/.
+    """
+    BUCKET_VIGENTE = 'vigente'
+    BUCKET_POR_VENCER = 'por_vencer'
+    BUCKET_VENCIDA = 'vencida'
+    BUCKET_CHOICES = [
+        (BUCKET_VIGENTE, 'Vigente'),
+        (BUCKET_POR_VENCER, 'Por vencer'),
+        (BUCKET_VENCIDA, 'Vencida'),
+    ]
+
+    snapshot_date = models.DateField(
+        verbose_name='Fecha de la fotografía'
+    )
+    status_bucket = models.CharField(
+        max_length=12,
+        choices=BUCKET_CHOICES,
+        verbose_name='Situación',
+        help_text='vigente (vence en más de 15 días), por_vencer (0 a 15 días) o vencida'
+    )
+    currency_type = models.ForeignKey(
+        CurrencyType,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        verbose_name='Tipo de Moneda',
+        null=True,
+        blank=True
+    )
+    financial_entity = models.ForeignKey(
+        FinancialEntity,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        verbose_name='Entidad Financiera',
+        null=True,
+        blank=True
+    )
+    letter_type = models.ForeignKey(
+        LetterType,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        verbose_name='Tipo de Carta'
+    )
+    warranty_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Cantidad de cartas'
+    )
+    total_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal('0'),
+        verbose_name='Monto total'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+
+    class Meta:
+        db_table = 'warranty_snapshots'
+        verbose_name = 'Fotografía de Cartera'
+        verbose_name_plural = 'Fotografías de Cartera'
+        ordering = ['snapshot_date', 'status_bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['snapshot_date', 'status_bucket', 'currency_type', 'financial_entity', 'letter_type'],
+                name='uniq_warranty_snapshot_group',
+                nulls_distinct=False
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.snapshot_date} - {self.status_bucket}: {self.warranty_count}"
+
+
+class ExchangeRate(models.Model):
+    """
+    Tipo de cambio diario de una moneda respecto a la moneda de referencia
+    (settings.MONEDA_REFERENCIA, por defecto PEN).
+    
+    'rate' es el valor de 1 unidad de la moneda en la moneda de referencia
+    (ej. USD 3.7500 = 1 dólar vale 3.75 soles). La moneda de referencia no
+    necesita filas: su tipo de cambio es siempre 1.
+    
+    La tasa vigente a una fecha es la última con rate_date <= fecha; la
+    restricción única (currency_type, rate_date) crea el índice que resuelve
+    esa búsqueda con un solo acceso (ORDER BY rate_date DESC LIMIT 1).
+    
+    Se carga con el comando 'cargar_tipos_cambio' y se usa en los reportes
+    con ?moneda_base= (ver tipo_cambio.py).
+    """
+    currency_type = models.ForeignKey(
+        CurrencyType,
+        on_delete=models.CASCADE,
+        related_name='exchange_rates',
+        verbose_name='Tipo de Moneda'
+    )
+    rate_date = models.DateField(
+        verbose_name='Fecha del tipo de cambio'
+    )
+    rate = models.DecimalField(
+        max_digits=18,
+        decimal_places=6,
+        validators=[MinValueValidator(Decimal('0.000001'))],
+        verbose_name='Tipo de cambio',
+        help_text='Valor de 1 unidad de la moneda en la moneda de referencia'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+
+    class Meta:
+        db_table = 'exchange_rates'
+        verbose_name = 'Tipo de Cambio'
+        verbose_name_plural = 'Tipos de Cambio'
+        ordering = ['currency_type', '-rate_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['currency_type', 'rate_date'],
+                name='uniq_exchange_rate_currency_date'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.currency_type_id} {self.rate_date}: {self.rate}"
@@ -0,0 +1,184 @@
+"""
+Orden y paginación por cursor (keyset) para reportes que se serializan
+como filas planas (vigentes-por-fecha, vencidas-por-fecha).
+
+Parámetros:
+- ordering (opcional): campo de orden, con '-' para descendente (ej. -amount)
+- page_size (opcional): si se indica, la respuesta se pagina por cursor
+- cursor (opcional): valor de 'next' de la página anterior
+
+Sin page_size (ni tamano_defecto) la respuesta trae todas las filas y
+'count' es su cantidad: la consulta se ejecuta una sola vez. Con page_size,
+la primera página obtiene el total con COUNT(*) OVER () en la misma consulta
+y lo guarda en el cursor, de modo que las páginas siguientes no vuelven a
+contar. Con contar=False no se calcula el total (la ventana recorre todas las
+filas filtradas antes del LIMIT) y la respuesta solo trae 'next'.
+
+El orden siempre se desempata por id y los NULL van al final en ambos
+sentidos, para que la posición (valor, id) del cursor sea única.
+"""
+import base64
+import json
+
+from django.db.models import Count, F, Q, Window
+from rest_framework.utils.urls import replace_query_param
+
+from .sincronizacion import TAMANO_MAXIMO_PAGINA
+
+# Anotación con el total de filas (COUNT(*) OVER ())
+COLUMNA_TOTAL = 'total_filas'
+
+
+def codificar_cursor(valor, pk, total):
+    """Cursor opaco: valor de orden e id de la última fila + total de la consulta"""
+    texto = json.dumps([None if valor is None else str(valor), pk, total])
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        tuple | None: (valor, id, total), o None si el cursor no es válido
+    """
+    try:
+        valor, pk, total = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return valor, int(pk), None if total is None else int(total)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+class PaginacionKeyset:
+    """
+    Uso:
+        paginacion = PaginacionKeyset(request, ['letter_number', 'amount'], 'letter_number')
+        queryset = paginacion.aplicar(queryset)
+        serializer = FlatRowSerializer(Serializer, queryset, columnas_extra=paginacion.columnas)
+        filas = paginacion.paginar(serializer.filas())
+        return Response({**paginacion.resumen(), 'results': serializer.representar(filas)})
+
+    Args:
+        request: Petición con ordering, page_size y cursor
+        campos_orden (list): Campos del modelo permitidos en ?ordering=
+        orden_defecto (str): Orden cuando no se indica ?ordering=
+        tamano_defecto (int, optional): page_size cuando no se indica (None: sin paginar)
+        contar (bool, optional): False para no calcular 'count' al paginar
+
+    Raises:
+        ValueError: Si ordering, page_size o cursor no son válidos (mensaje para el cliente)
+    """
+
+    def __init__(self, request, campos_orden, orden_defecto, tamano_defecto=None, contar=True):
+        self.request = request
+        self.contar = contar
+        self.ordering = request.query_params.get('ordering') or orden_defecto
+        self.campo = self.ordering.lstrip('-')
+        self.descendente = self.ordering.startswith('-')
+        if self.campo not in campos_orden:
+            raise ValueError(
+                f'El parámetro ordering debe ser uno de: {", ".join(campos_orden)} '
+                f'(con "-" para orden descendente)'
+            )
+
+        self.tamano_pagina = tamano_defecto
+        if request.query_params.get('page_size'):
+            try:
+                self.tamano_pagina = int(request.query_params['page_size'])
+            except ValueError:
+                raise ValueError('El parámetro page_size debe ser un número entero')
+            self.tamano_pagina = max(1, min(self.tamano_pagina, TAMANO_MAXIMO_PAGINA))
+
+        self.posicion = None
+        if request.query_params.get('cursor'):
+            if self.tamano_pagina is None:
+                raise ValueError('El parámetro cursor requiere page_size')
+            self.posicion = decodificar_cursor(request.query_params['cursor'])
+            if self.posicion is None:
+                raise ValueError('El cursor no es válido')
+
+        self.count = None
+        self.siguiente = None
+
+    @property
+    def columnas(self):
+        """Columnas que las filas deben traer para construir el cursor"""
+        columnas = [self.campo, 'id']
+        if self.contar and self.tamano_pagina is not None and self.posicion is None:
+            columnas.append(COLUMNA_TOTAL)
+        return columnas
+
+    def _despues_de(self, valor, pk):
+        """
+        Filas posteriores a (valor, pk) en el orden (campo NULLS LAST, id).
+
+        Ascendente:  campo > valor OR (campo = valor AND id > pk) OR campo IS NULL
+        Con valor NULL solo quedan los NULL con id posterior.
+        """
+        mayor = 'lt' if self.descendente else 'gt'
+        siguiente_id = Q(**{f'id__{mayor}': pk})
+        if valor is None:
+            return Q(**{f'{self.campo}__isnull': True}) & siguiente_id
+        return (
+            Q(**{f'{self.campo}__{mayor}': valor})
+            | (Q(**{self.campo: valor}) & siguiente_id)
+            | Q(**{f'{self.campo}__isnull': True})
+        )
+
+    def aplicar(self, queryset):
+        """Ordena el queryset y, si se pagina, filtra por cursor, cuenta y limita"""
+        if self.descendente:
+            queryset = queryset.order_by(F(self.campo).desc(nulls_last=True), '-id')
+        else:
+            queryset = queryset.order_by(F(self.campo).asc(nulls_last=True), 'id')
+
+        if self.tamano_pagina is None:
+            return queryset
+
+        if self.posicion is None:
+            if self.contar:
+                # Primera página: total en la misma consulta (antes del LIMIT)
+                queryset = queryset.annotate(**{COLUMNA_TOTAL: Window(Count('*'))})
+        else:
+            valor, pk, _ = self.posicion
+            queryset = queryset.filter(self._despues_de(valor, pk))
+
+        # Una fila extra indica si hay página siguiente
+        return queryset[:self.tamano_pagina + 1]
+
+    def paginar(self, filas):
+        """
+        Recorta la fila extra y calcula count y el enlace 'next'.
+
+        Args:
+            filas (list): Filas (.values()) obtenidas del queryset de aplicar()
+        """
+        if self.tamano_pagina is None:
+            self.count = len(filas)
+            return filas
+
+        if not self.contar:
+            self.count = None
+        elif self.posicion is None:
+            self.count = filas[0][COLUMNA_TOTAL] if filas else 0
+        else:
+            self.count = self.posicion[2]
+
+        if len(filas) > self.tamano_pagina:
+            filas = filas[:self.tamano_pagina]
+            ultima = filas[-1]
+            self.siguiente = replace_query_param(
+                self.request.build_absolute_uri(),
+                'cursor',
+                codificar_cursor(ultima[self.campo], ultima['id'], self.count)
+            )
+        return filas
+
+    def resumen(self):
+        """Campos de paginación para la respuesta ('count' solo si se cuenta)"""
+        resumen = {
+            'count': self.count,
+            'ordering': self.ordering,
+            'next': self.siguiente,
+        }
+        if not self.contar:
+            del resumen['count']
+        return resumen
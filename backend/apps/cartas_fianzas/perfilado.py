@@ -0,0 +1,303 @@
+"""
+Perfilado bajo demanda de las acciones de WarrantyViewSet y WarrantyHistoryViewSet.
+
+Un usuario con can_manage_users activa el perfilado de una petición con la
+cabecera 'X-Perfilar: 1' o con ?perfilar=1. Para otros usuarios la marca se
+ignora y la petición no paga el costo de cProfile.
+
+Durante la petición (acción + serialización + renderizado):
+- cProfile registra las llamadas de Python.
+- Un execute_wrapper en cada conexión registra cada consulta SQL con su
+  duración (hasta MAXIMO_CONSULTAS; el resto solo se cuenta).
+- Los reportes cacheados (cachear_reporte) se ejecutan sin caché.
+
+Cada captura se guarda en settings.PROFILING_DIR como <id>.prof (formato
+pstats) y <id>.json (ruta, usuario, tiempos y consultas). Es un buffer
+circular: al superar settings.PROFILING_MAX_CAPTURES se eliminan las más
+antiguas. La respuesta perfilada trae el id en la cabecera X-Perfil-Id y
+las capturas se consultan en /api/sistema/perfiles/.
+
+Una sola captura a la vez por proceso: desde Python 3.12 cProfile usa
+sys.monitoring, que es global al proceso, y dos perfiles simultáneos en
+hilos distintos se interfieren. Si otra petición ya se está perfilando, la
+petición se atiende sin perfilar y la respuesta trae la cabecera
+X-Perfil-Omitido.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+CABECERA_PERFIL = 'X-Perfil-Id'
+CABECERA_PERFIL_OMITIDO = 'X-Perfil-Omitido'
+
+# Tomado mientras dura una captura (cProfile es global al proceso en 3.12+)
+CAPTURA_EN_CURSO = threading.Lock()
+
+# Consultas SQL que se guardan por captura
+MAXIMO_CONSULTAS = 1000
+
+# Profundidad máxima de las pilas del flamegraph
+MAXIMO_PROFUNDIDAD = 100
+
+# Subárboles del flamegraph con menos tiempo (segundos) se omiten
+TIEMPO_MINIMO_PILA = 0.00001
+
+
+def perfilado_solicitado(request):
+    """Indica si la petición pide perfilado (cabecera X-Perfilar o ?perfilar=1)"""
+    valor = request.headers.get('X-Perfilar') or request.query_params.get('perfilar')
+    return valor in ('1', 'true', 'True')
+
+
+def puede_perfilar(user):
+    """Solo los usuarios con can_manage_users (mismo criterio que CanManageUsers)"""
+    if not user.is_authenticated:
+        return False
+    profile = getattr(user, 'profile', None)
+    return bool(profile and profile.can_manage_users)
+
+
+def directorio():
+    ruta = Path(settings.PROFILING_DIR)
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def ruta_captura(perfil_id, extension):
+    """
+    Ruta de un archivo de la captura.
+
+    Raises:
+        ValueError: Si el id no es válido (evita rutas fuera del directorio)
+    """
+    if not str(perfil_id).isdigit():
+        raise ValueError('Id de perfil no válido')
+    return directorio() / f'{perfil_id}.{extension}'
+
+
+class RegistroConsultas:
+    """execute_wrapper que mide cada consulta SQL"""
+
+    def __init__(self):
+        self.consultas = []
+        self.total = 0
+        self.tiempo_ms = 0.0
+
+    def __call__(self, alias):
+        def envoltura(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duracion = (time.perf_counter() - inicio) * 1000
+                self.total += 1
+                self.tiempo_ms += duracion
+                if len(self.consultas) < MAXIMO_CONSULTAS:
+                    self.consultas.append({
+                        'alias': alias,
+                        'sql': sql,
+                        'many': many,
+                        'duracion_ms': round(duracion, 3),
+                    })
+        return envoltura
+
+
+class Perfil:
+    """Captura de una petición: cProfile + consultas SQL"""
+
+    def __init__(self, request):
+        self.request = request
+        self.id = str(time.time_ns())
+        self.profiler = cProfile.Profile()
+        self.sql = RegistroConsultas()
+        self.pila = ExitStack()
+        self.inicio = None
+
+    def iniciar(self):
+        """
+        Returns:
+            bool: False si otra petición del proceso ya se está perfilando
+        """
+        if not CAPTURA_EN_CURSO.acquire(blocking=False):
+            return False
+        for alias in connections:
+            self.pila.enter_context(connections[alias].execute_wrapper(self.sql(alias)))
+        self.inicio = time.perf_counter()
+        self.profiler.enable()
+        return True
+
+    def cancelar(self):
+        """Detiene la captura sin guardarla (la petición terminó con una excepción)"""
+        try:
+            self.profiler.disable()
+            self.pila.close()
+        finally:
+            CAPTURA_EN_CURSO.release()
+
+    def detener(self, response):
+        """Detiene la captura, la guarda y agrega la cabecera X-Perfil-Id"""
+        duracion = (time.perf_counter() - self.inicio) * 1000
+        self.cancelar()
+
+        self.profiler.dump_stats(ruta_captura(self.id, 'prof'))
+        metadatos = {
+            'id': self.id,
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'metodo': self.request.method,
+            'ruta': self.request.get_full_path(),
+            'usuario': self.request.user.username,
+            'status': response.status_code,
+            'duracion_ms': round(duracion, 3),
+            'consultas': self.sql.total,
+            'consultas_ms': round(self.sql.tiempo_ms, 3),
+            'sql': self.sql.consultas,
+        }
+        ruta_captura(self.id, 'json').write_text(json.dumps(metadatos), encoding='utf-8')
+        limpiar_capturas()
+        response[CABECERA_PERFIL] = self.id
+
+
+def limpiar_capturas():
+    """Conserva solo las PROFILING_MAX_CAPTURES capturas más recientes"""
+    capturas = sorted(directorio().glob('*.json'), key=lambda ruta: int(ruta.stem))
+    for ruta in capturas[:-settings.PROFILING_MAX_CAPTURES or None]:
+        for extension in ('json', 'prof'):
+            ruta.with_suffix(f'.{extension}').unlink(missing_ok=True)
+
+
+def listar_capturas():
+    """Metadatos de las capturas (sin las consultas), de la más reciente a la más antigua"""
+    capturas = []
+    for ruta in sorted(directorio().glob('*.json'), key=lambda ruta: int(ruta.stem), reverse=True):
+        try:
+            metadatos = json.loads(ruta.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            # Eliminada o a medio escribir por otro worker
+            continue
+        metadatos.pop('sql', None)
+        capturas.append(metadatos)
+    return capturas
+
+
+def leer_captura(perfil_id):
+    """
+    Returns:
+        dict | None: Metadatos con las consultas, o None si no existe
+    """
+    try:
+        return json.loads(ruta_captura(perfil_id, 'json').read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def resumen_pstats(perfil_id, orden='cumulative', lineas=50):
+    """Tabla de pstats (print_stats) ordenada por 'orden'"""
+    salida = io.StringIO()
+    stats = pstats.Stats(os.fspath(ruta_captura(perfil_id, 'prof')), stream=salida)
+    stats.strip_dirs().sort_stats(orden).print_stats(lineas)
+    return salida.getvalue()
+
+
+def nombre_funcion(funcion):
+    archivo, linea, nombre = funcion
+    if archivo == '~':
+        # Funciones integradas: '<built-in method time.sleep>'
+        return nombre
+    return f'{nombre} ({os.path.basename(archivo)}:{linea})'
+
+
+def pilas_colapsadas(perfil_id):
+    """
+    Pilas en formato colapsado ('a;b;c microsegundos' por línea) para
+    flamegraph.pl o speedscope.
+
+    cProfile solo guarda las aristas llamador -> llamado, no las pilas
+    completas: el tiempo de cada función se reparte entre sus llamadores en
+    proporción al tiempo acumulado de cada arista (aproximación habitual).
+    Las llamadas recursivas se cortan en la primera repetición.
+    """
+    stats = pstats.Stats(os.fspath(ruta_captura(perfil_id, 'prof'))).stats
+    llamados = {}
+    for funcion, (_, _, _, _, llamadores) in stats.items():
+        for llamador, arista in llamadores.items():
+            llamados.setdefault(llamador, []).append((funcion, arista[3]))
+
+    pilas = {}
+
+    def recorrer(funcion, pila, factor):
+        tiempo_propio = stats[funcion][2]
+        pila = pila + (nombre_funcion(funcion),)
+        microsegundos = int(tiempo_propio * factor * 1_000_000)
+        if microsegundos:
+            clave = ';'.join(pila)
+            pilas[clave] = pilas.get(clave, 0) + microsegundos
+        if len(pila) >= MAXIMO_PROFUNDIDAD:
+            return
+        for llamado, tiempo_arista in llamados.get(funcion, ()):
+            acumulado_llamado = stats[llamado][3]
+            if (
+                not acumulado_llamado
+                or factor * tiempo_arista < TIEMPO_MINIMO_PILA
+                or nombre_funcion(llamado) in pila
+            ):
+                continue
+            recorrer(llamado, pila, factor * tiempo_arista / acumulado_llamado)
+
+    # Raíces: el tiempo de cada función que no se explica por sus llamadores
+    # registrados (llamadas desde marcos anteriores a activar el perfilado)
+    for funcion, (_, _, _, tiempo_acumulado, llamadores) in stats.items():
+        sin_llamador = tiempo_acumulado - sum(
+            arista[3] for llamador, arista in llamadores.items() if llamador != funcion
+        )
+        if tiempo_acumulado and sin_llamador >= TIEMPO_MINIMO_PILA:
+            recorrer(funcion, (), sin_llamador / tiempo_acumulado)
+        elif not llamadores:
+            recorrer(funcion, (), 1.0)
+
+    return ''.join(f'{pila} {valor}\n' for pila, valor in sorted(pilas.items()))
+
+
+class PerfiladoMixin:
+    """
+    Mixin para ViewSets: perfila la petición si el usuario lo solicita y
+    puede hacerlo. Se aplica después de autenticar y verificar permisos,
+    y cubre la acción, la serialización y el renderizado. Si ya hay una
+    captura en curso la petición se atiende sin perfilar.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if perfilado_solicitado(request) and puede_perfilar(request.user):
+            perfil = Perfil(request)
+            if perfil.iniciar():
+                # Marca leída por cachear_reporte (ejecutar sin caché)
+                request.perfilando = True
+                self._perfil = perfil
+            else:
+                self._perfil_omitido = True
+
+    def dispatch(self, request, *args, **kwargs):
+        self._perfil = None
+        self._perfil_omitido = False
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if self._perfil is not None and hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            if self._perfil is not None:
+                self._perfil.cancelar()
+            raise
+        if self._perfil is not None:
+            self._perfil.detener(response)
+        elif self._perfil_omitido:
+            response[CABECERA_PERFIL_OMITIDO] = 'captura en curso'
+        return response
@@ -0,0 +1,85 @@
+"""
+Renderer y parser JSON basados en orjson.
+
+Sustituyen a JSONRenderer/JSONParser de DRF (registrados en REST_FRAMEWORK)
+con la misma salida:
+- Decimal se serializa como número (igual que el JSONEncoder de DRF), por lo
+  que las vistas pueden devolver las filas de los procedimientos almacenados
+  sin convertir cada valor a float.
+- date/datetime sin pasar por un serializer se emiten en ISO 8601 (UTC como
+  'Z'), que es lo que esperan los reportes del frontend. Los campos de los
+  serializers ya llegan formateados con DATE_FORMAT/DATETIME_FORMAT.
+- Cualquier otro tipo (timedelta, UUID, textos traducibles, QuerySet, ...)
+  se delega al JSONEncoder de DRF.
+
+Si orjson no está instalado, se comportan exactamente como las clases de DRF.
+"""
+from decimal import Decimal
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_encoder_drf = JSONEncoder()
+
+if orjson is not None:
+    OPCIONES_ORJSON = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def codificar_tipo(obj):
+    """Tipos que orjson no serializa de forma nativa"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return _encoder_drf.default(obj)
+
+
+def a_json(data, indentar=False):
+    """
+    Serializa a JSON (bytes) con orjson o, si no está disponible, con DRF.
+    Usado por el renderer y por las vistas que no pasan por DRF.
+    """
+    if orjson is None:
+        return JSONRenderer().render(data, 'application/json; indent=2' if indentar else None)
+
+    opciones = OPCIONES_ORJSON | orjson.OPT_INDENT_2 if indentar else OPCIONES_ORJSON
+    return orjson.dumps(data, default=codificar_tipo, option=opciones)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Renderer JSON de alto rendimiento (orjson).
+
+    Respeta ?indent / 'Accept: application/json; indent=N' con sangría de 2
+    espacios (orjson no admite otros tamaños).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indentar = bool(self.get_indent(accepted_media_type, renderer_context))
+        return a_json(data, indentar)
+
+
+class ORJSONParser(JSONParser):
+    """Parser JSON de alto rendimiento (orjson)"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
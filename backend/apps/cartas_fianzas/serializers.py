@@ -3,6 +3,7 @@ from django.db import transaction
 from django.contrib.auth.models import User
 from decimal import Decimal
 import os
+from .fieldsets import SparseFieldsetMixin
 from .models import (
     WarrantyObject,
     LetterType,
@@ -17,7 +18,7 @@ from .models import (
 )
 
 
-class LetterTypeSerializer(serializers.ModelSerializer):
+class LetterTypeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Tipo de Carta
     """
@@ -59,7 +60,7 @@ class LetterTypeSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class FinancialEntitySerializer(serializers.ModelSerializer):
+class FinancialEntitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Entidad Financiera
     """
@@ -101,7 +102,7 @@ class FinancialEntitySerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class WarrantyObjectSerializer(serializers.ModelSerializer):
+class WarrantyObjectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Objeto de Garantía
     
@@ -149,7 +150,7 @@ class WarrantyObjectSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class WarrantyStatusSerializer(serializers.ModelSerializer):
+class WarrantyStatusSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Estado de Garantía
     """
@@ -191,7 +192,7 @@ class WarrantyStatusSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class CurrencyTypeSerializer(serializers.ModelSerializer):
+class CurrencyTypeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Tipo de Moneda
     """
@@ -241,7 +242,7 @@ class CurrencyTypeSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class ContractorSerializer(serializers.ModelSerializer):
+class ContractorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Contratista
     """
@@ -292,7 +293,7 @@ class ContractorSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class WarrantyFileSerializer(serializers.ModelSerializer):
+class WarrantyFileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Archivos de Garantía
     Solo se permiten archivos PDF
@@ -348,7 +349,7 @@ class WarrantyFileSerializer(serializers.ModelSerializer):
         return value
 
 
-class WarrantyHistorySerializer(serializers.ModelSerializer):
+class WarrantyHistorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Historial de Garantía
     Incluye archivos opcionales
@@ -448,7 +449,7 @@ class WarrantyHistorySerializer(serializers.ModelSerializer):
         return data
 
 
-class WarrantySerializer(serializers.ModelSerializer):
+class WarrantySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para Garantía (Carta Fianza)
     Al crear una garantía, se crea automáticamente el primer historial
@@ -689,7 +690,7 @@ class WarrantySerializer(serializers.ModelSerializer):
 
 # ========== Serializers para Búsqueda Anidada ==========
 
-class WarrantyHistoryNestedSerializer(serializers.ModelSerializer):
+class WarrantyHistoryNestedSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer anidado para Historial de Garantías (solo lectura para búsquedas)
     """
@@ -725,7 +726,7 @@ class WarrantyHistoryNestedSerializer(serializers.ModelSerializer):
         ]
 
 
-class WarrantyNestedSerializer(serializers.ModelSerializer):
+class WarrantyNestedSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer anidado para Garantías (solo lectura para búsquedas)
     """
@@ -749,7 +750,7 @@ class WarrantyNestedSerializer(serializers.ModelSerializer):
         ]
 
 
-class WarrantyObjectSearchSerializer(serializers.ModelSerializer):
+class WarrantyObjectSearchSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para búsqueda de Objetos de Garantía con información anidada completa
     """
@@ -782,7 +783,7 @@ class WarrantyObjectSearchSerializer(serializers.ModelSerializer):
 
 # ========== Serializer para Detalle de Historial ==========
 
-class WarrantyHistoryDetailSerializer(serializers.ModelSerializer):
+class WarrantyHistoryDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer completo para el detalle de un historial de garantía
     Incluye toda la información relacionada de la garantía, tipo de carta,
@@ -836,6 +837,9 @@ class WarrantyHistoryDetailSerializer(serializers.ModelSerializer):
     updated_by_id = serializers.IntegerField(source='updated_by.id', read_only=True, allow_null=True)
     updated_by_username = serializers.CharField(source='updated_by.username', read_only=True, allow_null=True)
     
+    # Cadena de movimientos
+    previous_history_id = serializers.IntegerField(read_only=True, allow_null=True)
+    
     class Meta:
         model = WarrantyHistory
         fields = [
@@ -850,6 +854,11 @@ class WarrantyHistoryDetailSerializer(serializers.ModelSerializer):
             'reference_document',
             'comments',
             
+            # Cadena de movimientos
+            'previous_history_id',
+            'sequence_no',
+            'is_latest',
+            
             # Estado de garantía
             'warranty_status_id',
             'warranty_status_description',
@@ -896,7 +905,7 @@ class WarrantyHistoryDetailSerializer(serializers.ModelSerializer):
 
 # ========== Serializer para Búsqueda de Vigentes por Fecha ==========
 
-class WarrantyHistoryVigentesPorFechaSerializer(serializers.ModelSerializer):
+class WarrantyHistoryVigentesPorFechaSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para la búsqueda de cartas fianza vigentes por fecha.
     
@@ -987,9 +996,34 @@ class WarrantyHistoryVigentesPorFechaSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class WarrantyHistoryVencidasPorFechaSerializer(WarrantyHistoryVigentesPorFechaSerializer):
+    """
+    Serializer para la búsqueda de cartas fianza vencidas por fecha.
+    
+    Extiende WarrantyHistoryVigentesPorFechaSerializer con el tiempo vencido
+    respecto a la fecha consultada. Los valores se calculan en SQL
+    (AGE/DATE_PART) y llegan como atributos anotados del queryset.
+    """
+    days_expired = serializers.IntegerField(read_only=True)
+    time_expired = serializers.CharField(read_only=True, default=None)
+    time_expired_years = serializers.IntegerField(read_only=True)
+    time_expired_months = serializers.IntegerField(read_only=True)
+    time_expired_days = serializers.IntegerField(read_only=True)
+    
+    class Meta(WarrantyHistoryVigentesPorFechaSerializer.Meta):
+        fields = WarrantyHistoryVigentesPorFechaSerializer.Meta.fields + [
+            'days_expired',
+            'time_expired',
+            'time_expired_years',
+            'time_expired_months',
+            'time_expired_days',
+        ]
+        read_only_fields = fields
+
+
 # ==================== SERIALIZERS DE USUARIO ====================
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para el perfil de usuario
     """
@@ -998,7 +1032,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ['can_manage_users']
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para listar usuarios (sin password)
     """
@@ -1023,7 +1057,7 @@ class UserListSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para crear usuarios
     """
@@ -1095,7 +1129,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para actualizar usuarios (sin password obligatorio)
     """
@@ -0,0 +1,147 @@
+"""
+Sincronización incremental (delta sync) con ?updated_since=.
+
+GET /api/<recurso>/?updated_since=2025-01-31T10:00:00Z
+
+En lugar de la lista paginada normal devuelve los registros creados o
+modificados después de 'updated_since', ordenados por (updated_at, id) y
+paginados por cursor (keyset), y los IDs eliminados en el mismo intervalo
+(tombstones de DeletedRecord):
+
+    {
+        "updated_since": "2025-01-31T10:00:00Z",
+        "hasta": "2025-02-01T08:00:00Z",
+        "count": 500,
+        "results": [...],
+        "deleted": [12, 15],
+        "next": "...?updated_since=...&cursor=...",
+        "sync_token": null
+    }
+
+El cliente sigue 'next' hasta que sea null; en la última página
+'sync_token' es el valor de updated_since para la próxima sincronización.
+
+'hasta' se fija en la primera página (ahora menos DELTA_SYNC_MARGIN_SECONDS,
+para no saltar transacciones que aún no se confirmaron) y viaja en el
+cursor, de modo que todas las páginas ven el mismo intervalo. Las consultas
+se hacen siempre en la base de datos principal: el retraso de la réplica
+haría perder cambios.
+"""
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import DeletedRecord
+
+# Tamaño máximo de página (?page_size=)
+TAMANO_MAXIMO_PAGINA = 1000
+
+
+def parsear_fecha_hora(valor):
+    """ISO 8601 a datetime con zona horaria (None si no es válido)"""
+    try:
+        fecha_hora = parse_datetime(valor.replace(' ', '+'))
+    except ValueError:
+        return None
+    if fecha_hora is not None and timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+
+def codificar_cursor(updated_at, pk, hasta):
+    """Cursor opaco: último (updated_at, id) entregado + límite del intervalo"""
+    texto = f'{updated_at.isoformat()}|{pk}|{hasta.isoformat()}'
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        tuple | None: (updated_at, id, hasta), o None si el cursor no es válido
+    """
+    try:
+        updated_at, pk, hasta = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return parsear_fecha_hora(updated_at), int(pk), parsear_fecha_hora(hasta)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class DeltaSyncMixin:
+    """
+    Mixin para ViewSets: list con ?updated_since= devuelve el feed de cambios.
+    Debe ir antes de ReplicaReadMixin para leer de la base principal.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if 'updated_since' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.listar_cambios(request)
+
+    def listar_cambios(self, request):
+        updated_since = parsear_fecha_hora(request.query_params['updated_since'])
+        if updated_since is None:
+            return Response(
+                {'error': 'El parámetro updated_since debe ser una fecha y hora ISO 8601 (ej. 2025-01-31T10:00:00Z)'},
+                status=400
+            )
+
+        try:
+            tamano_pagina = int(request.query_params.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE']))
+        except ValueError:
+            return Response({'error': 'El parámetro page_size debe ser un número entero'}, status=400)
+        tamano_pagina = max(1, min(tamano_pagina, TAMANO_MAXIMO_PAGINA))
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            posicion = decodificar_cursor(cursor)
+            if posicion is None or None in posicion:
+                return Response({'error': 'El cursor no es válido'}, status=400)
+            desde, ultimo_id, hasta = posicion
+            # Keyset: (updated_at, id) > (desde, ultimo_id)
+            despues_de = Q(updated_at__gt=desde) | Q(updated_at=desde, id__gt=ultimo_id)
+        else:
+            desde = updated_since
+            hasta = timezone.now() - timedelta(seconds=settings.DELTA_SYNC_MARGIN_SECONDS)
+            despues_de = Q(updated_at__gt=desde)
+
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            despues_de,
+            updated_at__lte=hasta
+        ).order_by('updated_at', 'id')
+
+        registros = list(queryset[:tamano_pagina + 1])
+        hay_mas = len(registros) > tamano_pagina
+        registros = registros[:tamano_pagina]
+
+        # Las eliminaciones de esta página van hasta el último cambio entregado
+        limite_pagina = registros[-1].updated_at if hay_mas else hasta
+        deleted = list(DeletedRecord.objects.filter(
+            model=queryset.model._meta.model_name,
+            deleted_at__gt=desde,
+            deleted_at__lte=limite_pagina
+        ).order_by('deleted_at', 'id').values_list('object_id', flat=True))
+
+        siguiente = None
+        if hay_mas:
+            siguiente = replace_query_param(
+                request.build_absolute_uri(),
+                'cursor',
+                codificar_cursor(registros[-1].updated_at, registros[-1].pk, hasta)
+            )
+
+        serializer = self.get_serializer(registros, many=True)
+        return Response({
+            'updated_since': request.query_params['updated_since'],
+            'hasta': hasta,
+            'count': len(registros),
+            'results': serializer.data,
+            'deleted': deleted,
+            'next': siguiente,
+            'sync_token': None if hay_mas else hasta
+        })
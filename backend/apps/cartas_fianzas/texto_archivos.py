@@ -0,0 +1,116 @@
+"""
+Extracción e indexación del texto de los PDF adjuntos (WarrantyFile).
+
+- Los archivos nuevos quedan con text_status 'pendiente'; la carga no
+  procesa el PDF.
+- El comando 'extraer_texto_archivos' toma lotes de pendientes con
+  SELECT ... FOR UPDATE SKIP LOCKED (varios procesos pueden trabajar a la
+  vez sin repetir archivos), extrae el texto con pypdf (Python puro) y
+  guarda text_content y search_vector en un solo UPDATE por archivo.
+- search_vector combina el nombre del archivo (peso A) y el texto (peso B)
+  con la configuración 'spanish'; la búsqueda usa el índice GIN.
+
+El texto se limita a MAXIMO_CARACTERES: un tsvector no puede superar 1 MB
+y ts_headline recorre el documento completo para armar los fragmentos.
+Los PDF escaneados (solo imágenes) quedan como 'sin_texto' y se encuentran
+solo por su nombre.
+"""
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+from django.db.models import Value
+from django.utils import timezone
+
+from .models import WarrantyFile
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+CONFIGURACION_BUSQUEDA = 'spanish'
+
+# Caracteres de texto que se guardan e indexan por archivo
+MAXIMO_CARACTERES = 100000
+
+# Páginas que se leen por archivo
+MAXIMO_PAGINAS = 200
+
+
+def extraer_texto(archivo):
+    """
+    Texto de un PDF (páginas separadas por salto de línea).
+
+    Args:
+        archivo: Archivo binario abierto
+    """
+    lector = PdfReader(archivo)
+    partes = []
+    total = 0
+    for pagina in lector.pages[:MAXIMO_PAGINAS]:
+        texto = (pagina.extract_text() or '').replace('\x00', '').strip()
+        if texto:
+            partes.append(texto)
+            total += len(texto)
+        if total >= MAXIMO_CARACTERES:
+            break
+    return '\n'.join(partes)[:MAXIMO_CARACTERES]
+
+
+def vector_busqueda(file_name, texto):
+    """Expresión del search_vector de un archivo (nombre con más peso que el texto)"""
+    return (
+        SearchVector(Value(file_name), weight='A', config=CONFIGURACION_BUSQUEDA)
+        + SearchVector(Value(texto), weight='B', config=CONFIGURACION_BUSQUEDA)
+    )
+
+
+def procesar_archivo(archivo):
+    """
+    Extrae e indexa el texto de un archivo.
+
+    Returns:
+        tuple: (estado, mensaje de error o None)
+    """
+    texto = ''
+    error = None
+    try:
+        if not archivo.file:
+            raise FileNotFoundError('el registro no tiene archivo')
+        with archivo.file.open('rb') as contenido:
+            texto = extraer_texto(contenido)
+        estado = WarrantyFile.TEXTO_EXTRAIDO if texto else WarrantyFile.TEXTO_VACIO
+    except Exception as e:
+        # pypdf falla con excepciones de distintos tipos ante PDF mal
+        # formados; un archivo con error no debe detener el lote
+        estado = WarrantyFile.TEXTO_ERROR
+        error = str(e)
+
+    # QuerySet.update: sin señales (no cambia updated_at ni la auditoría)
+    WarrantyFile.all_objects.filter(pk=archivo.pk).update(
+        text_status=estado,
+        text_content=texto,
+        search_vector=vector_busqueda(archivo.file_name, texto),
+        text_extracted_at=timezone.now()
+    )
+    return estado, error
+
+
+def procesar_pendientes(tamano_lote):
+    """
+    Procesa un lote de archivos pendientes.
+
+    Returns:
+        list: (archivo, estado, error) por cada archivo procesado
+    """
+    resultados = []
+    with transaction.atomic():
+        archivos = list(
+            WarrantyFile.all_objects.select_for_update(skip_locked=True)
+            .filter(text_status=WarrantyFile.TEXTO_PENDIENTE)
+            .only('id', 'file', 'file_name')
+            .order_by('id')[:tamano_lote]
+        )
+        for archivo in archivos:
+            estado, error = procesar_archivo(archivo)
+            resultados.append((archivo, estado, error))
+    return resultados
@@ -0,0 +1,108 @@
+"""
+Conversión de montos a una moneda base con la tabla exchange_rates.
+
+Los reportes que aceptan ?moneda_base=USD anotan en el queryset el monto
+convertido, calculado en SQL con el tipo de cambio vigente a la fecha de
+cada carta (la última tasa con rate_date <= fecha):
+
+    amount * tasa(moneda de la carta, fecha) / tasa(moneda base, fecha)
+
+    tasa(m, fecha) = (SELECT rate FROM exchange_rates
+                      WHERE currency_type_id = m AND rate_date <= fecha
+                      ORDER BY rate_date DESC LIMIT 1)
+
+La moneda de referencia (settings.MONEDA_REFERENCIA) tiene tasa 1 y las
+cartas en la propia moneda base no se convierten. Si falta una tasa el
+monto convertido es NULL; los reportes informan cuántas cartas quedaron
+sin convertir.
+"""
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Round
+
+from .models import CurrencyType, ExchangeRate
+
+CAMPO_DECIMAL = DecimalField(max_digits=24, decimal_places=6)
+
+
+def moneda_base_de_peticion(request):
+    """
+    Moneda indicada en ?moneda_base= (código, ej. PEN o USD).
+
+    Returns:
+        CurrencyType | None: None si no se indicó el parámetro
+
+    Raises:
+        ValueError: Si no existe una moneda con ese código
+    """
+    codigo = request.query_params.get('moneda_base')
+    if not codigo:
+        return None
+    try:
+        return CurrencyType.objects.get(code__iexact=codigo)
+    except CurrencyType.DoesNotExist:
+        raise ValueError(f'No existe una moneda con código {codigo}')
+
+
+def id_moneda_referencia():
+    """ID de la moneda de referencia (None si no está registrada)"""
+    return CurrencyType.objects.filter(
+        code__iexact=settings.MONEDA_REFERENCIA
+    ).values_list('id', flat=True).first()
+
+
+def tasa_vigente(moneda, campo_fecha):
+    """
+    Subconsulta con el tipo de cambio de 'moneda' vigente a la fecha de la fila.
+
+    Args:
+        moneda: ID de la moneda o expresión (ej. OuterRef('currency_type_id'))
+        campo_fecha (str): Campo de fecha de la fila externa (ej. 'issue_date')
+    """
+    return Subquery(
+        ExchangeRate.objects.filter(
+            currency_type_id=moneda,
+            rate_date__lte=OuterRef(campo_fecha)
+        ).order_by('-rate_date').values('rate')[:1],
+        output_field=CAMPO_DECIMAL
+    )
+
+
+def anotar_monto_base(queryset, moneda_base, nombre='amount_base', campo_monto='amount',
+                      campo_moneda='currency_type_id', campo_fecha='issue_date'):
+    """
+    Agrega al queryset el monto convertido a la moneda base.
+
+    Args:
+        queryset: QuerySet con monto, moneda y fecha (ej. WarrantyHistory)
+        moneda_base (CurrencyType): Moneda a la que se convierte
+        nombre (str): Nombre de la anotación
+        campo_monto (str): Campo con el monto
+        campo_moneda (str): Campo con el ID de la moneda
+        campo_fecha (str): Campo con la fecha de la carta
+    """
+    referencia_id = id_moneda_referencia()
+
+    def tasa(moneda, es_referencia):
+        if es_referencia:
+            return Value(1, output_field=CAMPO_DECIMAL)
+        return tasa_vigente(moneda, campo_fecha)
+
+    if referencia_id is None:
+        tasa_origen = tasa(OuterRef(campo_moneda), False)
+    else:
+        tasa_origen = Case(
+            When(**{campo_moneda: referencia_id}, then=Value(1, output_field=CAMPO_DECIMAL)),
+            default=tasa(OuterRef(campo_moneda), False),
+            output_field=CAMPO_DECIMAL
+        )
+    tasa_destino = tasa(moneda_base.pk, moneda_base.pk == referencia_id)
+
+    return queryset.annotate(**{
+        nombre: Case(
+            # En la propia moneda base no se convierte
+            When(**{campo_moneda: moneda_base.pk}, then=F(campo_monto)),
+            default=Round(F(campo_monto) * tasa_origen / tasa_destino, 2),
+            output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+    })
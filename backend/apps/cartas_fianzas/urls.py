@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
@@ -9,9 +10,17 @@ from .views import (
     CurrencyTypeViewSet,
     WarrantyViewSet,
     WarrantyHistoryViewSet,
-    UserViewSet
+    UserViewSet,
+    DatabaseConnectionsView,
+    PerfilesView,
+    PerfilDetalleView,
+    ExposicionView,
+    AuditoriaView,
+    BusquedaArchivosView,
+    TicketEventosView
 )
 from .auth_views import LoginView, LogoutView, UserInfoView
+from . import async_views
 
 # Crear el router
 router = DefaultRouter()
@@ -36,5 +45,41 @@ urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('auth/me/', UserInfoView.as_view(), name='user-info'),
+    
+    # Métricas de conexiones a la base de datos
+    path('sistema/conexiones/', DatabaseConnectionsView.as_view(), name='database-connections'),
+
+    # Capturas de perfilado bajo demanda (X-Perfilar: 1)
+    path('sistema/perfiles/', PerfilesView.as_view(), name='perfiles'),
+    path('sistema/perfiles/<str:perfil_id>/', PerfilDetalleView.as_view(), name='perfil-detalle'),
+    path(
+        'sistema/perfiles/<str:perfil_id>/<str:formato>/',
+        PerfilDetalleView.as_view(),
+        name='perfil-formato'
+    ),
+
+    # Analítica de exposición y concentración de la cartera
+    path('analytics/exposicion/', ExposicionView.as_view(), name='analytics-exposicion'),
+
+    # Bitácora de auditoría
+    path('audit/', AuditoriaView.as_view(), name='audit'),
+
+    # Búsqueda de texto completo en los PDF adjuntos
+    path('warranty-files/buscar/', BusquedaArchivosView.as_view(), name='warranty-files-buscar'),
+
+    # Feed de cambios (Server-Sent Events, requiere ASGI)
+    path('events/', async_views.eventos, name='eventos'),
+    path('events/ticket/', TicketEventosView.as_view(), name='eventos-ticket'),
 ]
 
+# Reportes asíncronos (despliegue ASGI): reemplazan a las acciones de los
+# ViewSets en las mismas rutas, por eso van antes del router
+if settings.ASYNC_REPORTS:
+    urlpatterns = [
+        path('financial-entities/<str:pk>/reporte-cartas/', async_views.reporte_cartas_entidad_financiera),
+        path('contractors/<str:pk>/reporte-cartas/', async_views.reporte_cartas_contratista),
+        path('warranty-objects/<str:pk>/reporte-cartas/', async_views.reporte_cartas_objeto_garantia),
+        path('warranties/certificacion/', async_views.certificacion),
+        path('warranties/devueltas-por-periodo/', async_views.devueltas_por_periodo),
+        path('warranties/ejecutadas-por-periodo/', async_views.ejecutadas_por_periodo),
+    ] + urlpatterns
@@ -1,14 +1,33 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, BasePermission
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Max, Subquery, OuterRef, F
-from django.db import connection
+from django.db.models import F, Func, Value, IntegerField, Prefetch
+from django.db.models.functions import Cast
+from django.conf import settings
+from django.db import connection, connections, transaction
 from django.contrib.auth.models import User
+import html
 from datetime import date, timedelta
+from decimal import Decimal
+from functools import lru_cache, wraps
 from dateutil.relativedelta import relativedelta
+from config.db_router import usar_replica, alias_lectura, ReplicaReadMixin
+from config.db_pool import estadisticas_conexiones
+from config.cache_reportes import cachear_reporte
+from .renderers import ORJSONParser
+from .sincronizacion import DeltaSyncMixin
+from .eventos import emitir_ticket, publicar_evento, publicar_evento_historial
+from .filas_planas import FlatRowSerializer
+from .paginacion import PaginacionKeyset
+from .tipo_cambio import anotar_monto_base, moneda_base_de_peticion
+from .texto_archivos import CONFIGURACION_BUSQUEDA
+from . import perfilado
+from .perfilado import PerfiladoMixin
+from .fieldsets import SparseFieldsetViewSetMixin, podar_para_serializer, solicita_campos
 from .models import (
     WarrantyObject,
     LetterType,
@@ -19,6 +38,8 @@ from .models import (
     Warranty,
     WarrantyHistory,
     WarrantyFile,
+    WarrantySnapshot,
+    AuditLog,
     UserProfile
 )
 from .serializers import (
@@ -32,12 +53,36 @@ from .serializers import (
     WarrantyObjectSearchSerializer,
     WarrantyHistoryDetailSerializer,
     WarrantyHistoryVigentesPorFechaSerializer,
+    WarrantyHistoryVencidasPorFechaSerializer,
     UserListSerializer,
     UserCreateSerializer,
     UserUpdateSerializer
 )
 
 
+@lru_cache(maxsize=4096)
+def formatear_tiempo(years, months, days):
+    """
+    Construye la representación en texto de un intervalo de tiempo.
+    
+    Se memoriza por combinación (años, meses, días) porque en los listados
+    de vencimiento muchas filas comparten el mismo intervalo.
+    
+    Ejemplo:
+        >>> formatear_tiempo(0, 10, 17)
+        '10 meses, 17 días'
+    """
+    time_parts = []
+    if years > 0:
+        time_parts.append(f"{years} año{'s' if years > 1 else ''}")
+    if months > 0:
+        time_parts.append(f"{months} mes{'es' if months > 1 else ''}")
+    if days > 0:
+        time_parts.append(f"{days} día{'s' if days > 1 else ''}")
+    
+    return ", ".join(time_parts) if time_parts else "Menos de un día"
+
+
 def calcular_tiempo_vencido(fecha_vencimiento, fecha_actual=None):
     """
     Calcula el tiempo transcurrido entre una fecha de vencimiento y la fecha actual.
@@ -76,23 +121,12 @@ def calcular_tiempo_vencido(fecha_vencimiento, fecha_actual=None):
     months = diferencia.months
     days = diferencia.days
     
-    # Construir el texto descriptivo
-    time_parts = []
-    if years > 0:
-        time_parts.append(f"{years} año{'s' if years > 1 else ''}")
-    if months > 0:
-        time_parts.append(f"{months} mes{'es' if months > 1 else ''}")
-    if days > 0:
-        time_parts.append(f"{days} día{'s' if days > 1 else ''}")
-    
-    time_expired = ", ".join(time_parts) if time_parts else "Menos de un día"
-    
     return {
         'days_expired': days_expired,
         'years': years,
         'months': months,
         'days': days,
-        'time_expired': time_expired
+        'time_expired': formatear_tiempo(years, months, days)
     }
 
 
@@ -134,27 +168,235 @@ def calcular_tiempo_restante(fecha_vencimiento, fecha_actual=None):
     months = diferencia.months
     days = diferencia.days
     
-    # Construir el texto descriptivo
-    time_parts = []
-    if years > 0:
-        time_parts.append(f"{years} año{'s' if years > 1 else ''}")
-    if months > 0:
-        time_parts.append(f"{months} mes{'es' if months > 1 else ''}")
-    if days > 0:
-        time_parts.append(f"{days} día{'s' if days > 1 else ''}")
-    
-    time_remaining = ", ".join(time_parts) if time_parts else "Menos de un día"
-    
     return {
         'days_remaining': days_remaining,
         'years': years,
         'months': months,
         'days': days,
-        'time_remaining': time_remaining
+        'time_remaining': formatear_tiempo(years, months, days)
+    }
+
+
+def anotar_tiempo_entre(queryset, desde, hasta, campo_dias, prefijo):
+    """
+    Agrega al queryset el tiempo entre dos fechas calculado en PostgreSQL.
+    
+    Equivalente SQL:
+        (hasta - desde)                                  AS {campo_dias}
+        DATE_PART('year',  AGE(hasta, desde))::integer   AS {prefijo}_years
+        DATE_PART('month', AGE(hasta, desde))::integer   AS {prefijo}_months
+        DATE_PART('day',   AGE(hasta, desde))::integer   AS {prefijo}_days
+    
+    En motores distintos de PostgreSQL el queryset se retorna sin cambios y
+    los valores se calculan con completar_tiempo_entre() sobre las filas.
+    
+    Args:
+        queryset: QuerySet de WarrantyHistory
+        desde: Expresión con la fecha inicial (ej. F('validity_end'))
+        hasta: Expresión con la fecha final (ej. Value(today))
+        campo_dias (str): Nombre del campo con el total de días
+        prefijo (str): Prefijo de los campos de años, meses y días
+    """
+    if connection.vendor != 'postgresql':
+        return queryset
+    
+    edad = Func(hasta, desde, function='AGE')
+    
+    def parte(nombre):
+        return Cast(
+            Func(Value(nombre), edad, function='DATE_PART'),
+            output_field=IntegerField()
+        )
+    
+    return queryset.annotate(**{
+        # date - date en PostgreSQL retorna un entero (días)
+        campo_dias: Func(hasta, desde, template='(%(expressions)s)', arg_joiner=' - ', output_field=IntegerField()),
+        f'{prefijo}_years': parte('year'),
+        f'{prefijo}_months': parte('month'),
+        f'{prefijo}_days': parte('day'),
+    })
+
+
+def completar_tiempo_entre(filas, campo_fecha, fecha_actual, campo_dias, prefijo, vencido=True, campo_texto=None):
+    """
+    Completa en una sola pasada los campos de tiempo de una lista de filas.
+    
+    - Si las filas ya traen los valores calculados en SQL (anotar_tiempo_entre),
+      solo se agrega el texto legible cuando se solicita campo_texto.
+    - En caso contrario (motores distintos de PostgreSQL) se calcula con
+      relativedelta una sola vez por fecha distinta y se reutiliza el resultado.
+    
+    Las filas pueden ser diccionarios (.values()) u objetos de modelo.
+    
+    Args:
+        filas (list): Filas a completar (se modifican en el lugar)
+        campo_fecha (str): Nombre del campo con la fecha de vencimiento
+        fecha_actual (date): Fecha de referencia
+        campo_dias (str): Nombre del campo con el total de días
+        prefijo (str): Prefijo de los campos de años, meses y días
+        vencido (bool): True si se mide el tiempo transcurrido desde el vencimiento,
+                        False si se mide el tiempo restante hasta el vencimiento
+        campo_texto (str, optional): Nombre del campo de texto legible a agregar
+    """
+    es_dict = bool(filas) and isinstance(filas[0], dict)
+    
+    def obtener(fila, campo):
+        return fila.get(campo) if es_dict else getattr(fila, campo, None)
+    
+    def asignar(fila, campo, valor):
+        if es_dict:
+            fila[campo] = valor
+        else:
+            setattr(fila, campo, valor)
+    
+    calculados = {}
+    for fila in filas:
+        if obtener(fila, campo_dias) is None:
+            fecha = obtener(fila, campo_fecha)
+            if fecha not in calculados:
+                if vencido:
+                    diferencia = relativedelta(fecha_actual, fecha)
+                    total_dias = (fecha_actual - fecha).days
+                else:
+                    diferencia = relativedelta(fecha, fecha_actual)
+                    total_dias = (fecha - fecha_actual).days
+                calculados[fecha] = (total_dias, diferencia.years, diferencia.months, diferencia.days)
+            total_dias, years, months, days = calculados[fecha]
+            asignar(fila, campo_dias, total_dias)
+            asignar(fila, f'{prefijo}_years', years)
+            asignar(fila, f'{prefijo}_months', months)
+            asignar(fila, f'{prefijo}_days', days)
+        
+        if campo_texto:
+            asignar(fila, campo_texto, formatear_tiempo(
+                obtener(fila, f'{prefijo}_years'),
+                obtener(fila, f'{prefijo}_months'),
+                obtener(fila, f'{prefijo}_days')
+            ))
+    
+    return filas
+
+
+# Campos permitidos en ?ordering= de los reportes por fecha
+CAMPOS_ORDEN_POR_FECHA = ['letter_number', 'issue_date', 'validity_start', 'validity_end', 'amount', 'id']
+
+
+def incluir_texto_tiempo(request):
+    """
+    Indica si la respuesta debe incluir el texto legible del tiempo
+    (time_expired / time_remaining). El cliente puede omitirlo con
+    ?incluir_texto=false y construirlo a partir de años, meses y días.
+    """
+    return request.query_params.get('incluir_texto', 'true').lower() not in ('0', 'false')
+
+
+def incluir_archivados(request):
+    """
+    Indica si la consulta debe incluir las cartas archivadas
+    (?include_archived=1). Por defecto solo se consultan las particiones calientes.
+    """
+    return request.query_params.get('include_archived', '0').lower() in ('1', 'true')
+
+
+def ultimo_movimiento_id(warranty_id):
+    """ID del último historial de una garantía (índice parcial de is_latest)"""
+    return WarrantyHistory.objects.filter(
+        warranty_id=warranty_id,
+        is_latest=True
+    ).values_list('id', flat=True).first()
+
+
+def fila_con_historial_original(movimiento, historial_original):
+    """
+    Fila de los reportes por período (devueltas/ejecutadas): datos del
+    movimiento, de la carta original (historial anterior) y de la garantía.
+    
+    'movimiento' debe traer select_related de warranty, contractor, letter_type
+    y warranty_object; 'historial_original' de currency_type y financial_entity.
+    """
+    return {
+        # Datos del movimiento (devolución/ejecución)
+        'id': movimiento.id,
+        'issue_date': movimiento.issue_date,
+        'warranty_id': movimiento.warranty_id,
+        
+        # Datos de la carta original
+        'letter_number_orig': historial_original.letter_number if historial_original else None,
+        'validity_start_orig': historial_original.validity_start if historial_original else None,
+        'validity_end_orig': historial_original.validity_end if historial_original else None,
+        'amount_orig': str(historial_original.amount) if historial_original and historial_original.amount else None,
+        'currency_type_id_orig': historial_original.currency_type_id if historial_original else None,
+        'symbol_orig': historial_original.currency_type.symbol if historial_original and historial_original.currency_type else None,
+        'financial_entity_id_orig': historial_original.financial_entity_id if historial_original else None,
+        'financial_entity_description_orig': historial_original.financial_entity.description if historial_original and historial_original.financial_entity else None,
+        
+        # Datos de la garantía (warranty)
+        'contractor_id': movimiento.warranty.contractor_id,
+        'contractor_business_name': movimiento.warranty.contractor.business_name,
+        'contractor_ruc': movimiento.warranty.contractor.ruc,
+        'letter_type_id': movimiento.warranty.letter_type_id,
+        'letter_type_description': movimiento.warranty.letter_type.description,
+        'warranty_object_id': movimiento.warranty.warranty_object_id,
+        'warranty_object_description': movimiento.warranty.warranty_object.description,
+        'warranty_object_cui': movimiento.warranty.warranty_object.cui,
     }
 
 
-class LetterTypeViewSet(viewsets.ModelViewSet):
+def warranty_id_de_peticion(request, pk):
+    """warranty_id de las acciones que crean movimientos (renovar, devolver, ejecutar)"""
+    return request.data.get('warranty_id')
+
+
+def warranty_id_de_historial(request, pk):
+    """
+    warranty_id del historial {pk} (eliminar, modificar-*).
+    Con un pk no numérico devuelve None y la acción responde que no existe.
+    """
+    if pk is None or not str(pk).isdigit():
+        return None
+    return WarrantyHistory.all_objects.filter(pk=pk).values_list('warranty_id', flat=True).first()
+
+
+def bloquear_garantia(obtener_warranty_id):
+    """
+    Decorador para las acciones que crean, modifican o eliminan movimientos.
+    
+    Ejecuta la acción en una transacción que empieza bloqueando la fila de la
+    garantía (SELECT ... FOR UPDATE). Dos movimientos sobre la misma garantía
+    se ejecutan uno tras otro, de modo que la validación del último historial
+    (por ejemplo, is_active) no queda obsoleta; las demás garantías no esperan.
+    
+    Si la acción responde con error (4xx/5xx) se revierten sus cambios.
+    
+    Uso:
+        @action(detail=False, methods=['post'], url_path='renovar')
+        @bloquear_garantia(warranty_id_de_peticion)
+        def renovar(self, request):
+            ...
+    """
+    def decorador(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            warranty_id = obtener_warranty_id(request, kwargs.get('pk'))
+            
+            with transaction.atomic():
+                # Con un ID inválido no se bloquea: la acción responde el error
+                if warranty_id is not None and str(warranty_id).isdigit():
+                    list(
+                        Warranty.objects.select_for_update()
+                        .filter(pk=warranty_id)
+                        .values_list('pk', flat=True)
+                    )
+                
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code >= 400:
+                    transaction.set_rollback(True)
+                return response
+        return wrapper
+    return decorador
+
+
+class LetterTypeViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Tipos de Carta
     
@@ -184,7 +426,7 @@ class LetterTypeViewSet(viewsets.ModelViewSet):
     ordering = ['description']
 
 
-class FinancialEntityViewSet(viewsets.ModelViewSet):
+class FinancialEntityViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Entidades Financieras
     
@@ -215,6 +457,8 @@ class FinancialEntityViewSet(viewsets.ModelViewSet):
     ordering = ['description']
     
     @action(detail=True, methods=['get'], url_path='reporte-cartas')
+    @usar_replica
+    @cachear_reporte
     def reporte_cartas(self, request, pk=None):
         """
         Obtiene el reporte de cartas fianza para una entidad financiera específica.
@@ -259,7 +503,7 @@ class FinancialEntityViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            with connection.cursor() as cursor:
+            with connections[alias_lectura()].cursor() as cursor:
                 # Llamar al procedimiento almacenado
                 cursor.execute("SELECT * FROM get_warranty_by_financial_entity(%s)", [financial_entity_id])
                 
@@ -267,14 +511,8 @@ class FinancialEntityViewSet(viewsets.ModelViewSet):
                 columns = [col[0] for col in cursor.description]
                 
                 # Convertir los resultados a diccionarios
-                results = []
-                for row in cursor.fetchall():
-                    row_dict = dict(zip(columns, row))
-                    # Convertir Decimal a float para serialización JSON
-                    for key, value in row_dict.items():
-                        if hasattr(value, '__float__'):
-                            row_dict[key] = float(value)
-                    results.append(row_dict)
+                # (ORJSONRenderer serializa Decimal y fechas directamente)
+                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
                 
             return Response({
                 'financial_entity_id': financial_entity_id,
@@ -290,7 +528,7 @@ class FinancialEntityViewSet(viewsets.ModelViewSet):
             )
 
 
-class ContractorViewSet(viewsets.ModelViewSet):
+class ContractorViewSet(SparseFieldsetViewSetMixin, DeltaSyncMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Contratistas
     
@@ -321,6 +559,8 @@ class ContractorViewSet(viewsets.ModelViewSet):
     ordering = ['business_name']
     
     @action(detail=True, methods=['get'], url_path='reporte-cartas')
+    @usar_replica
+    @cachear_reporte
     def reporte_cartas(self, request, pk=None):
         """
         Obtiene el reporte de cartas fianza para un contratista específico.
@@ -365,7 +605,7 @@ class ContractorViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            with connection.cursor() as cursor:
+            with connections[alias_lectura()].cursor() as cursor:
                 # Llamar al procedimiento almacenado
                 cursor.execute("SELECT * FROM get_warranty_by_contractor(%s)", [contractor_id])
                 
@@ -373,14 +613,8 @@ class ContractorViewSet(viewsets.ModelViewSet):
                 columns = [col[0] for col in cursor.description]
                 
                 # Convertir los resultados a diccionarios
-                results = []
-                for row in cursor.fetchall():
-                    row_dict = dict(zip(columns, row))
-                    # Convertir Decimal a float para serialización JSON
-                    for key, value in row_dict.items():
-                        if hasattr(value, '__float__'):
-                            row_dict[key] = float(value)
-                    results.append(row_dict)
+                # (ORJSONRenderer serializa Decimal y fechas directamente)
+                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
                 
             return Response({
                 'contractor_id': contractor_id,
@@ -397,7 +631,7 @@ class ContractorViewSet(viewsets.ModelViewSet):
             )
 
 
-class WarrantyObjectViewSet(viewsets.ModelViewSet):
+class WarrantyObjectViewSet(SparseFieldsetViewSetMixin, DeltaSyncMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Objetos de Garantía
     
@@ -536,6 +770,13 @@ class WarrantyObjectViewSet(viewsets.ModelViewSet):
                 'error': 'Tipo de filtro no válido. Valores permitidos: cui, description, letter_number, contractor_ruc, contractor_name'
             }, status=400)
         
+        # Con ?fields= / ?expand= se omiten los JOIN y prefetch que no se usan
+        if solicita_campos(request):
+            queryset = podar_para_serializer(
+                queryset,
+                WarrantyObjectSearchSerializer(context={'request': request})
+            )
+        
         # Usar el serializer especial para búsqueda con información anidada
         serializer = WarrantyObjectSearchSerializer(queryset, many=True, context={'request': request})
         return Response({
@@ -544,6 +785,8 @@ class WarrantyObjectViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=True, methods=['get'], url_path='reporte-cartas')
+    @usar_replica
+    @cachear_reporte
     def reporte_cartas(self, request, pk=None):
         """
         Obtiene el reporte de cartas fianza para un objeto de garantía específico.
@@ -588,7 +831,7 @@ class WarrantyObjectViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            with connection.cursor() as cursor:
+            with connections[alias_lectura()].cursor() as cursor:
                 # Llamar al procedimiento almacenado
                 cursor.execute("SELECT * FROM get_warranty_report(%s)", [warranty_object_id])
                 
@@ -596,14 +839,8 @@ class WarrantyObjectViewSet(viewsets.ModelViewSet):
                 columns = [col[0] for col in cursor.description]
                 
                 # Convertir los resultados a diccionarios
-                results = []
-                for row in cursor.fetchall():
-                    row_dict = dict(zip(columns, row))
-                    # Convertir Decimal a float para serialización JSON
-                    for key, value in row_dict.items():
-                        if hasattr(value, '__float__'):
-                            row_dict[key] = float(value)
-                    results.append(row_dict)
+                # (ORJSONRenderer serializa Decimal y fechas directamente)
+                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
                 
             return Response({
                 'warranty_object_id': warranty_object_id,
@@ -620,7 +857,7 @@ class WarrantyObjectViewSet(viewsets.ModelViewSet):
             )
 
 
-class WarrantyStatusViewSet(viewsets.ModelViewSet):
+class WarrantyStatusViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Estados de Garantía
     
@@ -650,7 +887,7 @@ class WarrantyStatusViewSet(viewsets.ModelViewSet):
     ordering = ['description']
 
 
-class CurrencyTypeViewSet(viewsets.ModelViewSet):
+class CurrencyTypeViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Tipos de Moneda
     
@@ -680,7 +917,7 @@ class CurrencyTypeViewSet(viewsets.ModelViewSet):
     ordering = ['description']
 
 
-class WarrantyViewSet(viewsets.ModelViewSet):
+class WarrantyViewSet(PerfiladoMixin, SparseFieldsetViewSetMixin, DeltaSyncMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar Garantías (Cartas Fianza)
     
@@ -690,10 +927,13 @@ class WarrantyViewSet(viewsets.ModelViewSet):
     Operaciones disponibles:
     - GET /api/warranties/ - Listar todas las garantías
     - GET /api/warranties/{id}/ - Obtener una garantía específica con su historial
+    - GET /api/warranties/?updated_since=<ISO 8601> - Cambios y eliminaciones desde una fecha
     - POST /api/warranties/ - Crear una nueva garantía con su primer historial
     - PUT /api/warranties/{id}/ - Actualizar una garantía
     - PATCH /api/warranties/{id}/ - Actualizar parcialmente una garantía
     - DELETE /api/warranties/{id}/ - Eliminar una garantía
+    - GET /api/warranties/calendario/ - Calendario de vencimientos por día, semana o mes
+    - GET /api/warranties/series/ - Serie temporal de la cartera (fotografías diarias)
     """
     queryset = Warranty.objects.all().select_related(
         'warranty_object',
@@ -710,7 +950,7 @@ class WarrantyViewSet(viewsets.ModelViewSet):
     )
     serializer_class = WarrantySerializer
     permission_classes = [IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    parser_classes = [MultiPartParser, FormParser, ORJSONParser]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     
     # Campos por los que se puede filtrar
@@ -736,7 +976,19 @@ class WarrantyViewSet(viewsets.ModelViewSet):
     # Ordenamiento por defecto (más recientes primero)
     ordering = ['-created_at']
     
+    def perform_create(self, serializer):
+        warranty = serializer.save()
+        
+        # Notificar a los clientes conectados al feed de eventos
+        publicar_evento(
+            'crear',
+            warranty_id=warranty.id,
+            warranty_object_id=warranty.warranty_object_id,
+            contractor_id=warranty.contractor_id
+        )
+    
     @action(detail=False, methods=['get'], url_path='vencidas')
+    @usar_replica
     def cartas_vencidas(self, request):
         """
         Endpoint para obtener el listado de cartas fianza vencidas.
@@ -749,18 +1001,18 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         Filtra por:
         - warranty_status.is_active = True (excluye Devolución y Ejecución)
         - validity_end < fecha actual (vencidas)
+        
+        Los días vencidos y su desglose en años, meses y días se calculan en
+        PostgreSQL con AGE()/DATE_PART (ver anotar_tiempo_entre).
+        
+        Parámetros opcionales:
+        - incluir_texto: 'false' para omitir time_expired (el cliente lo construye
+          a partir de time_expired_years, time_expired_months y time_expired_days)
         """
         today = date.today()
         
-        # Subconsulta para obtener el ID del último historial de cada garantía
-        latest_history_subquery = WarrantyHistory.objects.filter(
-            warranty_id=OuterRef('warranty_id')
-        ).order_by('-id').values('id')[:1]
-        
         # Consulta principal: historiales que son los más recientes de cada garantía
-        expired_warranties = WarrantyHistory.objects.filter(
-            id__in=Subquery(latest_history_subquery)
-        ).filter(
+        expired_warranties = WarrantyHistory.objects.latest_per_warranty().filter(
             warranty_status__is_active=True  # Solo estados activos
         ).filter(
             validity_end__lt=today  # Vencidas
@@ -789,29 +1041,24 @@ class WarrantyViewSet(viewsets.ModelViewSet):
             'validity_end'
         ).order_by('validity_end')  # Ordenar por fecha de vencimiento (más antiguas primero)
         
-        # Calcular días vencidos para cada carta usando la función calcular_tiempo_vencido
-        results = []
-        for warranty in expired_warranties:
-            # Calcular el tiempo vencido usando la función auxiliar
-            tiempo_vencido = calcular_tiempo_vencido(warranty['validity_end'], today)
-            
-            results.append({
-                'max_warranty_history': warranty['max_warranty_history'],
-                'warranty_id': warranty['warranty_id'],
-                'warranty_object_id': warranty['warranty_object_id'],
-                'warranty_object_description': warranty['warranty_object_description'],
-                'letter_type_id': warranty['letter_type_id'],
-                'letter_type_description': warranty['letter_type_description'],
-                'warranty_status_id': warranty['warranty_status_id'],
-                'warranty_status_description': warranty['warranty_status_description'],
-                'letter_number': warranty['letter_number'],
-                'validity_end': warranty['validity_end'],
-                'days_expired': tiempo_vencido['days_expired'],
-                'time_expired': tiempo_vencido['time_expired'],
-                'time_expired_years': tiempo_vencido['years'],
-                'time_expired_months': tiempo_vencido['months'],
-                'time_expired_days': tiempo_vencido['days']
-            })
+        # Calcular el tiempo vencido en SQL (AGE/DATE_PART) en lugar de fila por fila
+        expired_warranties = anotar_tiempo_entre(
+            expired_warranties,
+            desde=F('validity_end'),
+            hasta=Value(today),
+            campo_dias='days_expired',
+            prefijo='time_expired'
+        )
+        
+        results = completar_tiempo_entre(
+            list(expired_warranties),
+            campo_fecha='validity_end',
+            fecha_actual=today,
+            campo_dias='days_expired',
+            prefijo='time_expired',
+            vencido=True,
+            campo_texto='time_expired' if incluir_texto_tiempo(request) else None
+        )
         
         return Response({
             'count': len(results),
@@ -819,6 +1066,7 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='por-vencer')
+    @usar_replica
     def cartas_por_vencer(self, request):
         """
         Lista las cartas fianza que están por vencer (de 1 a 15 días).
@@ -832,19 +1080,19 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         - warranty_status.is_active = True (excluye Devolución y Ejecución)
         - validity_end > fecha actual (no vencidas aún)
         - validity_end <= fecha actual + 15 días (próximas a vencer)
+        
+        Los días restantes y su desglose en años, meses y días se calculan en
+        PostgreSQL con AGE()/DATE_PART (ver anotar_tiempo_entre).
+        
+        Parámetros opcionales:
+        - incluir_texto: 'false' para omitir time_remaining (el cliente lo construye
+          a partir de time_remaining_years, time_remaining_months y time_remaining_days)
         """
         today = date.today()
         max_days_ahead = today + timedelta(days=15)
         
-        # Subconsulta para obtener el ID del último historial de cada garantía
-        latest_history_subquery = WarrantyHistory.objects.filter(
-            warranty_id=OuterRef('warranty_id')
-        ).order_by('-id').values('id')[:1]
-        
         # Consulta principal: historiales que son los más recientes de cada garantía
-        soon_to_expire_warranties = WarrantyHistory.objects.filter(
-            id__in=Subquery(latest_history_subquery)
-        ).filter(
+        soon_to_expire_warranties = WarrantyHistory.objects.latest_per_warranty().filter(
             warranty_status__is_active=True  # Solo estados activos
         ).filter(
             validity_end__gt=today  # No vencidas aún (mayor que hoy)
@@ -875,29 +1123,24 @@ class WarrantyViewSet(viewsets.ModelViewSet):
             'validity_end'
         ).order_by('validity_end')  # Ordenar por fecha de vencimiento (más próximas primero)
         
-        # Calcular días restantes para cada carta usando la función calcular_tiempo_restante
-        results = []
-        for warranty in soon_to_expire_warranties:
-            # Calcular el tiempo restante usando la función auxiliar
-            tiempo_restante = calcular_tiempo_restante(warranty['validity_end'], today)
-            
-            results.append({
-                'max_warranty_history': warranty['max_warranty_history'],
-                'warranty_id': warranty['warranty_id'],
-                'warranty_object_id': warranty['warranty_object_id'],
-                'warranty_object_description': warranty['warranty_object_description'],
-                'letter_type_id': warranty['letter_type_id'],
-                'letter_type_description': warranty['letter_type_description'],
-                'warranty_status_id': warranty['warranty_status_id'],
-                'warranty_status_description': warranty['warranty_status_description'],
-                'letter_number': warranty['letter_number'],
-                'validity_end': warranty['validity_end'],
-                'days_remaining': tiempo_restante['days_remaining'],
-                'time_remaining': tiempo_restante['time_remaining'],
-                'time_remaining_years': tiempo_restante['years'],
-                'time_remaining_months': tiempo_restante['months'],
-                'time_remaining_days': tiempo_restante['days']
-            })
+        # Calcular el tiempo restante en SQL (AGE/DATE_PART) en lugar de fila por fila
+        soon_to_expire_warranties = anotar_tiempo_entre(
+            soon_to_expire_warranties,
+            desde=Value(today),
+            hasta=F('validity_end'),
+            campo_dias='days_remaining',
+            prefijo='time_remaining'
+        )
+        
+        results = completar_tiempo_entre(
+            list(soon_to_expire_warranties),
+            campo_fecha='validity_end',
+            fecha_actual=today,
+            campo_dias='days_remaining',
+            prefijo='time_remaining',
+            vencido=False,
+            campo_texto='time_remaining' if incluir_texto_tiempo(request) else None
+        )
         
         return Response({
             'count': len(results),
@@ -905,6 +1148,7 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='vigentes')
+    @usar_replica
     def cartas_vigentes(self, request):
         """
         Retorna el conteo de cartas fianza vigentes (vencen en más de 15 días).
@@ -921,16 +1165,9 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         today = date.today()
         min_days_ahead = today + timedelta(days=15)
         
-        # Subconsulta para obtener el ID del último historial de cada garantía
-        latest_history_subquery = WarrantyHistory.objects.filter(
-            warranty_id=OuterRef('warranty_id')
-        ).order_by('-id').values('id')[:1]
-        
         # Consulta principal: contar historiales que son los más recientes de cada garantía
         # y que vencen en más de 15 días
-        count = WarrantyHistory.objects.filter(
-            id__in=Subquery(latest_history_subquery)
-        ).filter(
+        count = WarrantyHistory.objects.latest_per_warranty().filter(
             warranty_status__is_active=True  # Solo estados activos
         ).filter(
             validity_end__gt=min_days_ahead  # Vencen en más de 15 días
@@ -941,6 +1178,7 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='vigentes-por-fecha')
+    @usar_replica
     def vigentes_por_fecha(self, request):
         """
         Busca cartas fianza vigentes a una fecha específica con filtros opcionales.
@@ -953,9 +1191,12 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         - letter_type_id (opcional): ID del tipo de carta
         - contractor_id (opcional): ID del contratista
         - warranty_object_id (opcional): ID del objeto de garantía
+        - ordering (opcional): Campo de orden (por defecto letter_number; '-' para descendente)
+        - page_size, cursor (opcionales): Paginación por cursor (ver paginacion.py)
         
         Ejemplo:
         GET /api/warranties/vigentes-por-fecha/?fecha=2025-12-09&contractor_id=1
+        GET /api/warranties/vigentes-por-fecha/?fecha=2025-12-09&ordering=-amount&page_size=500
         
         Retorna las cartas fianza donde la fecha especificada está dentro
         del rango de vigencia (validity_start <= fecha <= validity_end).
@@ -969,7 +1210,7 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         LEFT JOIN contractors ON warranties.contractor_id = contractors.id
         LEFT JOIN letter_types ON warranties.letter_type_id = letter_types.id
         LEFT JOIN warranty_objects ON warranties.warranty_object_id = warranty_objects.id
-        WHERE '2025-12-09' BETWEEN validity_start AND validity_end
+        WHERE warranty_histories.validity_range @> '2025-12-09'::date
         """
         from datetime import datetime
         
@@ -994,12 +1235,15 @@ class WarrantyViewSet(viewsets.ModelViewSet):
                 'error': 'El formato de fecha debe ser YYYY-MM-DD'
             }, status=400)
         
+        try:
+            paginacion = PaginacionKeyset(request, CAMPOS_ORDEN_POR_FECHA, 'letter_number')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
         # Construir queryset base con filtro de fecha
-        # WHERE fecha BETWEEN validity_start AND validity_end
-        queryset = WarrantyHistory.objects.filter(
-            validity_start__lte=fecha,
-            validity_end__gte=fecha
-        ).select_related(
+        # WHERE validity_range @> fecha (equivale a fecha BETWEEN validity_start AND validity_end,
+        # resuelto con el índice GiST del rango de vigencia)
+        queryset = WarrantyHistory.objects.valid_on(fecha).select_related(
             'warranty',
             'warranty__contractor',
             'warranty__letter_type',
@@ -1021,14 +1265,20 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         if warranty_object_id:
             queryset = queryset.filter(warranty__warranty_object_id=warranty_object_id)
         
-        # Ordenar por número de carta
-        queryset = queryset.order_by('letter_number')
+        # Ordenar (por defecto por número de carta) y paginar si se pidió page_size
+        queryset = paginacion.aplicar(queryset)
         
-        # Serializar resultados
-        serializer = WarrantyHistoryVigentesPorFechaSerializer(queryset, many=True)
+        # Una sola ejecución: filas planas (.values(), sin instanciar modelos);
+        # count sale de las filas o de COUNT(*) OVER () en la misma consulta
+        serializer = FlatRowSerializer(
+            WarrantyHistoryVigentesPorFechaSerializer,
+            queryset,
+            columnas_extra=paginacion.columnas
+        )
+        histories = paginacion.paginar(serializer.filas())
         
         return Response({
-            'count': queryset.count(),
+            **paginacion.resumen(),
             'fecha_consulta': fecha_str,
             'filtros_aplicados': {
                 'financial_entity_id': financial_entity_id,
@@ -1036,10 +1286,11 @@ class WarrantyViewSet(viewsets.ModelViewSet):
                 'contractor_id': contractor_id,
                 'warranty_object_id': warranty_object_id
             },
-            'results': serializer.data
+            'results': serializer.representar(histories)
         })
     
     @action(detail=False, methods=['get'], url_path='vencidas-por-fecha')
+    @usar_replica
     def vencidas_por_fecha(self, request):
         """
         Busca cartas fianza vencidas a una fecha específica con filtros opcionales.
@@ -1056,9 +1307,16 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         - letter_type_id (opcional): ID del tipo de carta
         - contractor_id (opcional): ID del contratista
         - warranty_object_id (opcional): ID del objeto de garantía
+        - incluir_texto (opcional): 'false' para omitir time_expired
+        - ordering (opcional): Campo de orden (por defecto validity_end; '-' para descendente)
+        - page_size, cursor (opcionales): Paginación por cursor (ver paginacion.py)
         
         Ejemplo:
         GET /api/warranties/vencidas-por-fecha/?fecha=2026-08-27&contractor_id=1
+        GET /api/warranties/vencidas-por-fecha/?fecha=2026-08-27&page_size=500
+        
+        Cada resultado incluye days_expired, time_expired_years, time_expired_months
+        y time_expired_days respecto a la fecha consultada, calculados en SQL.
         
         Lógica:
         1. Obtiene el último historial (max(id)) de cada garantía
@@ -1100,17 +1358,16 @@ class WarrantyViewSet(viewsets.ModelViewSet):
                 'error': 'El formato de fecha debe ser YYYY-MM-DD'
             }, status=400)
         
-        # Subconsulta para obtener el ID del último historial de cada garantía
-        # Equivalente a: SELECT warranty_id, MAX(id) FROM warranty_histories GROUP BY warranty_id
-        latest_history_subquery = WarrantyHistory.objects.filter(
-            warranty_id=OuterRef('warranty_id')
-        ).order_by('-id').values('id')[:1]
+        try:
+            paginacion = PaginacionKeyset(request, CAMPOS_ORDEN_POR_FECHA, 'validity_end')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         
         # Consulta principal: filtrar por último historial, estado activo y vencidas
-        queryset = WarrantyHistory.objects.filter(
-            id__in=Subquery(latest_history_subquery),
-            warranty_status__is_active=True,
-            validity_end__lt=fecha
+        # - latest_per_warranty: SELECT warranty_id, MAX(id) FROM warranty_histories GROUP BY warranty_id
+        # - expired_on: validity_range << daterange(fecha, NULL) (índice GiST), equivale a validity_end < fecha
+        queryset = WarrantyHistory.objects.latest_per_warranty().active_status().expired_on(
+            fecha
         ).select_related(
             'warranty',
             'warranty__contractor',
@@ -1133,14 +1390,39 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         if warranty_object_id:
             queryset = queryset.filter(warranty__warranty_object_id=warranty_object_id)
         
-        # Ordenar por fecha de vencimiento (más antiguas primero)
-        queryset = queryset.order_by('validity_end')
+        # Tiempo vencido respecto a la fecha consultada, calculado en SQL
+        queryset = anotar_tiempo_entre(
+            queryset,
+            desde=F('validity_end'),
+            hasta=Value(fecha),
+            campo_dias='days_expired',
+            prefijo='time_expired'
+        )
+        
+        # Ordenar (por defecto por fecha de vencimiento, más antiguas primero)
+        # y paginar si se pidió page_size
+        queryset = paginacion.aplicar(queryset)
         
-        # Serializar resultados
-        serializer = WarrantyHistoryVigentesPorFechaSerializer(queryset, many=True)
+        # Una sola ejecución: filas planas (.values(), sin instanciar modelos);
+        # count sale de las filas o de COUNT(*) OVER () en la misma consulta
+        serializer = FlatRowSerializer(
+            WarrantyHistoryVencidasPorFechaSerializer,
+            queryset,
+            columnas_extra=['validity_end', *paginacion.columnas]
+        )
+        
+        histories = completar_tiempo_entre(
+            paginacion.paginar(serializer.filas()),
+            campo_fecha='validity_end',
+            fecha_actual=fecha,
+            campo_dias='days_expired',
+            prefijo='time_expired',
+            vencido=True,
+            campo_texto='time_expired' if incluir_texto_tiempo(request) else None
+        )
         
         return Response({
-            'count': queryset.count(),
+            **paginacion.resumen(),
             'fecha_consulta': fecha_str,
             'filtros_aplicados': {
                 'financial_entity_id': financial_entity_id,
@@ -1148,10 +1430,12 @@ class WarrantyViewSet(viewsets.ModelViewSet):
                 'contractor_id': contractor_id,
                 'warranty_object_id': warranty_object_id
             },
-            'results': serializer.data
+            'results': serializer.representar(histories)
         })
     
     @action(detail=False, methods=['get'], url_path='devueltas-por-periodo')
+    @usar_replica
+    @cachear_reporte
     def devueltas_por_periodo(self, request):
         """
         Busca cartas fianza devueltas en un período específico con filtros opcionales.
@@ -1239,9 +1523,17 @@ class WarrantyViewSet(viewsets.ModelViewSet):
             'warranty',
             'warranty__contractor',
             'warranty__letter_type',
-            'warranty__warranty_object'
+            'warranty__warranty_object',
+            # Historial original: el movimiento anterior de la cadena (previous_history)
+            'previous_history',
+            'previous_history__currency_type',
+            'previous_history__financial_entity'
         )
         
+        # Filtro por la entidad financiera de la carta original
+        if financial_entity_id:
+            devoluciones = devoluciones.filter(previous_history__financial_entity_id=financial_entity_id)
+        
         # Aplicar filtros opcionales sobre la garantía
         if letter_type_id:
             devoluciones = devoluciones.filter(warranty__letter_type_id=letter_type_id)
@@ -1255,52 +1547,12 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         # Ordenar por fecha de emisión
         devoluciones = devoluciones.order_by('issue_date')
         
-        # Paso 2: Para cada devolución, obtener el historial original y construir el resultado
+        # Paso 2: Construir el resultado con el historial original (cargado con select_related)
         results = []
         
         for devolucion in devoluciones:
-            # Obtener el historial original (el anterior más reciente a la devolución)
-            # MAX(id) WHERE warranty_id = devolucion.warranty_id AND id < devolucion.id
-            historial_original = WarrantyHistory.objects.filter(
-                warranty_id=devolucion.warranty_id,
-                id__lt=devolucion.id
-            ).select_related(
-                'currency_type',
-                'financial_entity'
-            ).order_by('-id').first()
-            
-            # Si hay filtro por financial_entity_id, verificar que el original coincida
-            if financial_entity_id:
-                if not historial_original or str(historial_original.financial_entity_id) != str(financial_entity_id):
-                    continue  # Saltar esta devolución si no coincide el filtro
-            
             # Construir el resultado combinando datos de devolución y original
-            result = {
-                # Datos de la devolución
-                'id': devolucion.id,
-                'issue_date': devolucion.issue_date,
-                'warranty_id': devolucion.warranty_id,
-                
-                # Datos de la carta original
-                'letter_number_orig': historial_original.letter_number if historial_original else None,
-                'validity_start_orig': historial_original.validity_start if historial_original else None,
-                'validity_end_orig': historial_original.validity_end if historial_original else None,
-                'amount_orig': str(historial_original.amount) if historial_original and historial_original.amount else None,
-                'currency_type_id_orig': historial_original.currency_type_id if historial_original else None,
-                'symbol_orig': historial_original.currency_type.symbol if historial_original and historial_original.currency_type else None,
-                'financial_entity_id_orig': historial_original.financial_entity_id if historial_original else None,
-                'financial_entity_description_orig': historial_original.financial_entity.description if historial_original and historial_original.financial_entity else None,
-                
-                # Datos de la garantía (warranty)
-                'contractor_id': devolucion.warranty.contractor_id,
-                'contractor_business_name': devolucion.warranty.contractor.business_name,
-                'contractor_ruc': devolucion.warranty.contractor.ruc,
-                'letter_type_id': devolucion.warranty.letter_type_id,
-                'letter_type_description': devolucion.warranty.letter_type.description,
-                'warranty_object_id': devolucion.warranty.warranty_object_id,
-                'warranty_object_description': devolucion.warranty.warranty_object.description,
-                'warranty_object_cui': devolucion.warranty.warranty_object.cui,
-            }
+            result = fila_con_historial_original(devolucion, devolucion.previous_history)
             
             results.append(result)
         
@@ -1320,6 +1572,8 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='ejecutadas-por-periodo')
+    @usar_replica
+    @cachear_reporte
     def ejecutadas_por_periodo(self, request):
         """
         Busca cartas fianza ejecutadas en un período específico con filtros opcionales.
@@ -1407,9 +1661,17 @@ class WarrantyViewSet(viewsets.ModelViewSet):
             'warranty',
             'warranty__contractor',
             'warranty__letter_type',
-            'warranty__warranty_object'
+            'warranty__warranty_object',
+            # Historial original: el movimiento anterior de la cadena (previous_history)
+            'previous_history',
+            'previous_history__currency_type',
+            'previous_history__financial_entity'
         )
         
+        # Filtro por la entidad financiera de la carta original
+        if financial_entity_id:
+            ejecuciones = ejecuciones.filter(previous_history__financial_entity_id=financial_entity_id)
+        
         # Aplicar filtros opcionales sobre la garantía
         if letter_type_id:
             ejecuciones = ejecuciones.filter(warranty__letter_type_id=letter_type_id)
@@ -1423,52 +1685,12 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         # Ordenar por fecha de emisión
         ejecuciones = ejecuciones.order_by('issue_date')
         
-        # Paso 2: Para cada ejecución, obtener el historial original y construir el resultado
+        # Paso 2: Construir el resultado con el historial original (cargado con select_related)
         results = []
         
         for ejecucion in ejecuciones:
-            # Obtener el historial original (el anterior más reciente a la ejecución)
-            # MAX(id) WHERE warranty_id = ejecucion.warranty_id AND id < ejecucion.id
-            historial_original = WarrantyHistory.objects.filter(
-                warranty_id=ejecucion.warranty_id,
-                id__lt=ejecucion.id
-            ).select_related(
-                'currency_type',
-                'financial_entity'
-            ).order_by('-id').first()
-            
-            # Si hay filtro por financial_entity_id, verificar que el original coincida
-            if financial_entity_id:
-                if not historial_original or str(historial_original.financial_entity_id) != str(financial_entity_id):
-                    continue  # Saltar esta ejecución si no coincide el filtro
-            
             # Construir el resultado combinando datos de ejecución y original
-            result = {
-                # Datos de la ejecución
-                'id': ejecucion.id,
-                'issue_date': ejecucion.issue_date,
-                'warranty_id': ejecucion.warranty_id,
-                
-                # Datos de la carta original
-                'letter_number_orig': historial_original.letter_number if historial_original else None,
-                'validity_start_orig': historial_original.validity_start if historial_original else None,
-                'validity_end_orig': historial_original.validity_end if historial_original else None,
-                'amount_orig': str(historial_original.amount) if historial_original and historial_original.amount else None,
-                'currency_type_id_orig': historial_original.currency_type_id if historial_original else None,
-                'symbol_orig': historial_original.currency_type.symbol if historial_original and historial_original.currency_type else None,
-                'financial_entity_id_orig': historial_original.financial_entity_id if historial_original else None,
-                'financial_entity_description_orig': historial_original.financial_entity.description if historial_original and historial_original.financial_entity else None,
-                
-                # Datos de la garantía (warranty)
-                'contractor_id': ejecucion.warranty.contractor_id,
-                'contractor_business_name': ejecucion.warranty.contractor.business_name,
-                'contractor_ruc': ejecucion.warranty.contractor.ruc,
-                'letter_type_id': ejecucion.warranty.letter_type_id,
-                'letter_type_description': ejecucion.warranty.letter_type.description,
-                'warranty_object_id': ejecucion.warranty.warranty_object_id,
-                'warranty_object_description': ejecucion.warranty.warranty_object.description,
-                'warranty_object_cui': ejecucion.warranty.warranty_object.cui,
-            }
+            result = fila_con_historial_original(ejecucion, ejecucion.previous_history)
             
             results.append(result)
         
@@ -1488,6 +1710,8 @@ class WarrantyViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'], url_path='certificacion')
+    @usar_replica
+    @cachear_reporte
     def certificacion(self, request):
         """
         Endpoint para obtener la certificación de cartas fianza por objeto de garantía y contratista.
@@ -1559,7 +1783,7 @@ class WarrantyViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            with connection.cursor() as cursor:
+            with connections[alias_lectura()].cursor() as cursor:
                 # Llamar al procedimiento almacenado
                 cursor.execute(
                     "SELECT * FROM get_warranty_certification(%s, %s)", 
@@ -1570,14 +1794,8 @@ class WarrantyViewSet(viewsets.ModelViewSet):
                 columns = [col[0] for col in cursor.description]
                 
                 # Convertir los resultados a diccionarios
-                results = []
-                for row in cursor.fetchall():
-                    row_dict = dict(zip(columns, row))
-                    # Convertir Decimal a float para serialización JSON
-                    for key, value in row_dict.items():
-                        if hasattr(value, '__float__'):
-                            row_dict[key] = float(value)
-                    results.append(row_dict)
+                # (ORJSONRenderer serializa Decimal y fechas directamente)
+                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
                 
             return Response({
                 'warranty_object_id': warranty_object_id,
@@ -1595,112 +1813,404 @@ class WarrantyViewSet(viewsets.ModelViewSet):
                 {'error': f'Error al ejecutar el procedimiento almacenado: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-
-class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
-    """
-    ViewSet para obtener el detalle de un historial de garantía
-    
-    Este ViewSet proporciona endpoints de solo lectura para consultar
-    el historial de garantías con toda su información relacionada.
-    
-    Operaciones disponibles:
-    - GET /api/warranty-histories/ - Listar todos los historiales
-    - GET /api/warranty-histories/{id}/ - Obtener un historial específico con toda su información
-    
-    La consulta optimizada incluye:
-    - Información del historial de garantía
-    - Datos de la garantía asociada
-    - Tipo de carta
-    - Entidad financiera
-    - Contratista
-    - Tipo de moneda
-    - Archivos adjuntos
-    
-    Equivalente a la consulta SQL:
-    SELECT * FROM warranty_histories
-    INNER JOIN warranties ON warranty_histories.warranty_id = warranties.id
-    LEFT JOIN letter_types ON warranties.letter_type_id = letter_types.id
-    LEFT JOIN financial_entities ON warranty_histories.financial_entity_id = financial_entities.id
-    LEFT JOIN contractors ON warranties.contractor_id = contractors.id
-    LEFT JOIN currency_types ON warranty_histories.currency_type_id = currency_types.id
-    LEFT JOIN warranty_files ON warranty_histories.id = warranty_files.warranty_history_id
-    WHERE warranty_histories.id = {id}
-    """
-    serializer_class = WarrantyHistoryDetailSerializer
-    permission_classes = [IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
     
-    def get_queryset(self):
+    @action(detail=False, methods=['get'], url_path='calendario')
+    @usar_replica
+    def calendario(self, request):
         """
-        Obtiene el queryset optimizado con select_related y prefetch_related
-        para minimizar las consultas a la base de datos.
+        Calendario de vencimientos de cartas fianza activas (mapa de calor).
         
-        Conversión de SQL a ORM de Django:
-        - INNER JOIN warranties: select_related('warranty')
-        - LEFT JOIN letter_types: select_related('warranty__letter_type')
-        - LEFT JOIN financial_entities: select_related('financial_entity')
-        - LEFT JOIN contractors: select_related('warranty__contractor')
-        - LEFT JOIN currency_types: select_related('currency_type')
-        - LEFT JOIN warranty_files: prefetch_related('files')
-        """
-        return WarrantyHistory.objects.select_related(
-            # INNER JOIN con warranty
-            'warranty',
-            # Relaciones de warranty
-            'warranty__warranty_object',
-            'warranty__letter_type',
-            'warranty__contractor',
-            # Relaciones directas de warranty_history
-            'financial_entity',
-            'currency_type',
-            'warranty_status',
-            # Información de auditoría
-            'created_by',
-            'updated_by'
-        ).prefetch_related(
-            # LEFT JOIN con warranty_files (relación inversa)
-            'files'
-        )
-    
-    @action(detail=True, methods=['get'], url_path='is-latest')
-    def is_latest(self, request, pk=None):
-        """
-        Verifica si un historial es el último de su garantía.
+        GET /api/warranties/calendario/
         
-        GET /api/warranty-histories/{id}/is-latest/
+        Agrupa las cartas cuyo último historial tiene estado activo por día,
+        semana o mes de vencimiento (validity_end), en una sola consulta con
+        DATE_TRUNC y GROUP BY.
         
-        Conversión de SQL a ORM:
-        SELECT warranty_id, MAX(id) AS max_history_id
-        FROM warranty_histories
-        WHERE warranty_histories.warranty_id = (SELECT warranty_id FROM warranty_histories WHERE id = {pk})
-        GROUP BY warranty_id
+        Parámetros:
+        - desde (opcional): Fecha inicial (formato YYYY-MM-DD). Por defecto, hoy.
+        - hasta (opcional): Fecha final (formato YYYY-MM-DD). Por defecto, 12 meses después de desde.
+        - granularity (opcional): day, week o month. Por defecto: day
+        - financial_entity_id (opcional): ID de la entidad financiera
+        - letter_type_id (opcional): ID del tipo de carta
+        - contractor_id (opcional): ID del contratista
+        - warranty_object_id (opcional): ID del objeto de garantía
+        - moneda_base (opcional): Código de moneda (ej. PEN) para agregar montos convertidos
+                                  al tipo de cambio de la fecha de emisión (total_amount_base)
         
-        ORM equivalente:
-        WarrantyHistory.objects.filter(
-            warranty_id=history.warranty_id
-        ).aggregate(max_history_id=Max('id'))
+        Ejemplo:
+        GET /api/warranties/calendario/?desde=2025-01-01&hasta=2025-12-31&granularity=week
+        GET /api/warranties/calendario/?granularity=month&moneda_base=USD
         
-        Retorna:
-        {
-            "is_latest": true/false,
-            "history_id": 7,
-            "warranty_id": 2,
-            "latest_history_id": 7
-        }
+        Equivalente SQL:
+        SELECT DATE_TRUNC('week', validity_end) AS periodo, currency_type_id,
+               COUNT(*), SUM(amount)
+        FROM warranty_histories
+        WHERE id IN (último historial de cada garantía)
+          AND warranty_status.is_active = true
+          AND validity_end BETWEEN desde AND hasta
+        GROUP BY periodo, currency_type_id
+        
+        Retorna por cada periodo:
+        - periodo: Fecha de inicio del día/semana/mes
+        - warranty_count: Cantidad total de cartas que vencen en el periodo
+        - montos: Lista de montos por moneda (currency_type_id, code, symbol, warranty_count, total_amount)
+        - total_amount_base, sin_tipo_cambio: Con moneda_base, total del periodo en la moneda
+          base y cantidad de cartas sin tipo de cambio a su fecha (no incluidas en el total)
         """
+        from datetime import datetime
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+        
+        GRANULARIDADES = {
+            'day': TruncDay,
+            'week': TruncWeek,
+            'month': TruncMonth,
+        }
+        
+        # Obtener parámetros
+        desde_str = request.query_params.get('desde', None)
+        hasta_str = request.query_params.get('hasta', None)
+        granularity = request.query_params.get('granularity', 'day')
+        financial_entity_id = request.query_params.get('financial_entity_id', None)
+        letter_type_id = request.query_params.get('letter_type_id', None)
+        contractor_id = request.query_params.get('contractor_id', None)
+        warranty_object_id = request.query_params.get('warranty_object_id', None)
+        
+        if granularity not in GRANULARIDADES:
+            return Response({
+                'error': 'Valor de granularity no válido. Valores permitidos: day, week, month'
+            }, status=400)
+        
+        # Parsear las fechas
         try:
-            history = self.get_object()
+            desde = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else date.today()
+            hasta = (
+                datetime.strptime(hasta_str, '%Y-%m-%d').date()
+                if hasta_str else desde + relativedelta(months=12)
+            )
+        except ValueError:
+            return Response({
+                'error': 'El formato de fecha debe ser YYYY-MM-DD'
+            }, status=400)
+        
+        if desde > hasta:
+            return Response({
+                'error': 'La fecha desde debe ser menor o igual a la fecha hasta'
+            }, status=400)
+        
+        try:
+            moneda_base = moneda_base_de_peticion(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        # Último historial de cada garantía con estado activo que vence en el rango
+        queryset = WarrantyHistory.objects.latest_per_warranty().active_status().filter(
+            validity_end__gte=desde,
+            validity_end__lte=hasta
+        )
+        
+        # Aplicar filtros opcionales
+        if financial_entity_id:
+            queryset = queryset.filter(financial_entity_id=financial_entity_id)
+        
+        if letter_type_id:
+            queryset = queryset.filter(warranty__letter_type_id=letter_type_id)
+        
+        if contractor_id:
+            queryset = queryset.filter(warranty__contractor_id=contractor_id)
+        
+        if warranty_object_id:
+            queryset = queryset.filter(warranty__warranty_object_id=warranty_object_id)
+        
+        # Monto convertido con el tipo de cambio vigente a la fecha de emisión
+        totales = {
+            'warranty_count': Count('id'),
+            'total_amount': Sum('amount')
+        }
+        if moneda_base:
+            queryset = anotar_monto_base(queryset, moneda_base)
+            totales['total_amount_base'] = Sum('amount_base')
+            totales['convertidas'] = Count('amount_base')
+        
+        # Una sola consulta: GROUP BY DATE_TRUNC(granularity, validity_end), moneda
+        rows = queryset.annotate(
+            periodo=GRANULARIDADES[granularity]('validity_end')
+        ).values(
+            'periodo',
+            'currency_type_id',
+            'currency_type__code',
+            'currency_type__symbol'
+        ).annotate(**totales).order_by('periodo', 'currency_type_id')
+        
+        # Agrupar las filas por periodo (ya vienen ordenadas)
+        results = []
+        for row in rows:
+            if not results or results[-1]['periodo'] != row['periodo']:
+                results.append({
+                    'periodo': row['periodo'],
+                    'warranty_count': 0,
+                    'montos': []
+                })
+                if moneda_base:
+                    results[-1].update(total_amount_base=Decimal('0'), sin_tipo_cambio=0)
+            bucket = results[-1]
+            bucket['warranty_count'] += row['warranty_count']
+            monto = {
+                'currency_type_id': row['currency_type_id'],
+                'currency_type_code': row['currency_type__code'],
+                'currency_type_symbol': row['currency_type__symbol'],
+                'warranty_count': row['warranty_count'],
+                'total_amount': row['total_amount']
+            }
+            if moneda_base:
+                monto['total_amount_base'] = row['total_amount_base']
+                bucket['total_amount_base'] += row['total_amount_base'] or Decimal('0')
+                bucket['sin_tipo_cambio'] += row['warranty_count'] - row['convertidas']
+            bucket['montos'].append(monto)
+        
+        return Response({
+            'count': len(results),
+            'desde': desde,
+            'hasta': hasta,
+            'granularity': granularity,
+            'moneda_base': moneda_base.code if moneda_base else None,
+            'filtros_aplicados': {
+                'financial_entity_id': financial_entity_id,
+                'letter_type_id': letter_type_id,
+                'contractor_id': contractor_id,
+                'warranty_object_id': warranty_object_id
+            },
+            'results': results
+        })
+    
+    @action(detail=False, methods=['get'], url_path='series')
+    @usar_replica
+    def series(self, request):
+        """
+        Serie temporal de la cartera de cartas fianza para gráficos de tendencia.
+        
+        GET /api/warranties/series/
+        
+        Lee la tabla compacta warranty_snapshots (generada cada noche con el
+        comando 'generar_snapshot_cartas'), por lo que no recalcula el estado
+        de la cartera para cada fecha.
+        
+        Parámetros:
+        - fecha_desde (obligatorio): Fecha inicial (formato YYYY-MM-DD)
+        - fecha_hasta (obligatorio): Fecha final (formato YYYY-MM-DD)
+        - agrupar_por (opcional): Dimensiones separadas por comas. Valores permitidos:
+          status_bucket, currency_type, financial_entity, letter_type.
+          Por defecto: status_bucket,currency_type
+        - status_bucket (opcional): vigente, por_vencer o vencida
+        - currency_type_id (opcional): ID del tipo de moneda
+        - financial_entity_id (opcional): ID de la entidad financiera
+        - letter_type_id (opcional): ID del tipo de carta
+        
+        Ejemplo:
+        GET /api/warranties/series/?fecha_desde=2025-01-01&fecha_hasta=2025-12-31&agrupar_por=financial_entity,currency_type
+        
+        Retorna una fila por fecha y combinación de dimensiones con:
+        - snapshot_date, las dimensiones solicitadas
+        - warranty_count: cantidad de cartas
+        - total_amount: monto total (no se suman montos de monedas distintas
+          salvo que no se agrupe por currency_type)
+        """
+        from datetime import datetime
+        from django.db.models import Sum
+        
+        DIMENSIONES = {
+            'status_bucket': ['status_bucket'],
+            'currency_type': ['currency_type_id', 'currency_type__code', 'currency_type__symbol'],
+            'financial_entity': ['financial_entity_id', 'financial_entity__description'],
+            'letter_type': ['letter_type_id', 'letter_type__description'],
+        }
+        
+        # Obtener parámetros
+        fecha_desde_str = request.query_params.get('fecha_desde', None)
+        fecha_hasta_str = request.query_params.get('fecha_hasta', None)
+        agrupar_por_str = request.query_params.get('agrupar_por', 'status_bucket,currency_type')
+        status_bucket = request.query_params.get('status_bucket', None)
+        currency_type_id = request.query_params.get('currency_type_id', None)
+        financial_entity_id = request.query_params.get('financial_entity_id', None)
+        letter_type_id = request.query_params.get('letter_type_id', None)
+        
+        # Validar fechas obligatorias
+        if not fecha_desde_str or not fecha_hasta_str:
+            return Response({
+                'error': 'Los parámetros "fecha_desde" y "fecha_hasta" son obligatorios (formato YYYY-MM-DD)'
+            }, status=400)
+        
+        # Parsear las fechas
+        try:
+            fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
+            fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
+        except ValueError:
+            return Response({
+                'error': 'El formato de fecha debe ser YYYY-MM-DD'
+            }, status=400)
+        
+        if fecha_desde > fecha_hasta:
+            return Response({
+                'error': 'La fecha_desde debe ser menor o igual a fecha_hasta'
+            }, status=400)
+        
+        # Validar dimensiones de agrupación
+        agrupar_por = [dim.strip() for dim in agrupar_por_str.split(',') if dim.strip()]
+        invalid = [dim for dim in agrupar_por if dim not in DIMENSIONES]
+        if invalid:
+            return Response({
+                'error': f'Dimensiones no válidas: {", ".join(invalid)}. '
+                         f'Valores permitidos: {", ".join(DIMENSIONES)}'
+            }, status=400)
+        
+        queryset = WarrantySnapshot.objects.filter(
+            snapshot_date__gte=fecha_desde,
+            snapshot_date__lte=fecha_hasta
+        )
+        
+        # Aplicar filtros opcionales
+        if status_bucket:
+            queryset = queryset.filter(status_bucket=status_bucket)
+        
+        if currency_type_id:
+            queryset = queryset.filter(currency_type_id=currency_type_id)
+        
+        if financial_entity_id:
+            queryset = queryset.filter(financial_entity_id=financial_entity_id)
+        
+        if letter_type_id:
+            queryset = queryset.filter(letter_type_id=letter_type_id)
+        
+        # GROUP BY snapshot_date + dimensiones solicitadas
+        group_fields = ['snapshot_date']
+        for dim in agrupar_por:
+            group_fields.extend(DIMENSIONES[dim])
+        
+        results = list(
+            queryset.values(*group_fields).annotate(
+                warranty_count=Sum('warranty_count'),
+                total_amount=Sum('total_amount')
+            ).order_by(*group_fields)
+        )
+        
+        return Response({
+            'count': len(results),
+            'periodo': {
+                'fecha_desde': fecha_desde_str,
+                'fecha_hasta': fecha_hasta_str
+            },
+            'agrupar_por': agrupar_por,
+            'filtros_aplicados': {
+                'status_bucket': status_bucket,
+                'currency_type_id': currency_type_id,
+                'financial_entity_id': financial_entity_id,
+                'letter_type_id': letter_type_id
+            },
+            'results': results
+        })
+
+
+class WarrantyHistoryViewSet(PerfiladoMixin, SparseFieldsetViewSetMixin, DeltaSyncMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet para obtener el detalle de un historial de garantía
+    
+    Este ViewSet proporciona endpoints de solo lectura para consultar
+    el historial de garantías con toda su información relacionada.
+    
+    Operaciones disponibles:
+    - GET /api/warranty-histories/ - Listar todos los historiales
+    - GET /api/warranty-histories/{id}/ - Obtener un historial específico con toda su información
+    - ?include_archived=1 - Incluir las cartas cerradas archivadas
+    
+    La consulta optimizada incluye:
+    - Información del historial de garantía
+    - Datos de la garantía asociada
+    - Tipo de carta
+    - Entidad financiera
+    - Contratista
+    - Tipo de moneda
+    - Archivos adjuntos
+    
+    Equivalente a la consulta SQL:
+    SELECT * FROM warranty_histories
+    INNER JOIN warranties ON warranty_histories.warranty_id = warranties.id
+    LEFT JOIN letter_types ON warranties.letter_type_id = letter_types.id
+    LEFT JOIN financial_entities ON warranty_histories.financial_entity_id = financial_entities.id
+    LEFT JOIN contractors ON warranties.contractor_id = contractors.id
+    LEFT JOIN currency_types ON warranty_histories.currency_type_id = currency_types.id
+    LEFT JOIN warranty_files ON warranty_histories.id = warranty_files.warranty_history_id
+    WHERE warranty_histories.id = {id}
+    """
+    serializer_class = WarrantyHistoryDetailSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser, ORJSONParser]
+    
+    def get_queryset(self):
+        """
+        Obtiene el queryset optimizado con select_related y prefetch_related
+        para minimizar las consultas a la base de datos.
+        
+        Conversión de SQL a ORM de Django:
+        - INNER JOIN warranties: select_related('warranty')
+        - LEFT JOIN letter_types: select_related('warranty__letter_type')
+        - LEFT JOIN financial_entities: select_related('financial_entity')
+        - LEFT JOIN contractors: select_related('warranty__contractor')
+        - LEFT JOIN currency_types: select_related('currency_type')
+        - LEFT JOIN warranty_files: prefetch_related('files')
+        
+        Por defecto solo consulta las particiones calientes (is_archived = false).
+        Con ?include_archived=1 incluye también las cartas archivadas y sus archivos.
+        """
+        if incluir_archivados(self.request):
+            historiales = WarrantyHistory.all_objects
+            archivos = Prefetch('files', queryset=WarrantyFile.all_objects.all())
+        else:
+            historiales = WarrantyHistory.objects
+            archivos = 'files'
+        
+        return historiales.select_related(
+            # INNER JOIN con warranty
+            'warranty',
+            # Relaciones de warranty
+            'warranty__warranty_object',
+            'warranty__letter_type',
+            'warranty__contractor',
+            # Relaciones directas de warranty_history
+            'financial_entity',
+            'currency_type',
+            'warranty_status',
+            # Información de auditoría
+            'created_by',
+            'updated_by'
+        ).prefetch_related(
+            # LEFT JOIN con warranty_files (relación inversa)
+            archivos
+        )
+    
+    @action(detail=True, methods=['get'], url_path='is-latest')
+    def is_latest(self, request, pk=None):
+        """
+        Verifica si un historial es el último de su garantía.
+        
+        GET /api/warranty-histories/{id}/is-latest/
+        
+        El último historial de cada garantía se marca con is_latest, que se
+        mantiene al crear y eliminar movimientos (ver WarrantyHistory).
+        
+        Retorna:
+        {
+            "is_latest": true/false,
+            "history_id": 7,
+            "warranty_id": 2,
+            "latest_history_id": 7
+        }
+        """
+        try:
+            history = self.get_object()
             warranty_id = history.warranty_id
             
-            # Obtener el ID del último historial para esta garantía
-            # Conversión de: SELECT MAX(id) FROM warranty_histories WHERE warranty_id = X
-            latest_history = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
-            ).aggregate(max_id=Max('id'))
-            
-            latest_history_id = latest_history['max_id']
-            is_latest = (history.id == latest_history_id)
+            is_latest = history.is_latest
+            latest_history_id = history.id if is_latest else ultimo_movimiento_id(warranty_id)
             
             return Response({
                 'is_latest': is_latest,
@@ -1723,29 +2233,19 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
         
         GET /api/warranty-histories/latest-by-warranty/{warranty_id}/
         
-        Conversión de SQL a ORM:
-        SELECT warranty_id, MAX(id) AS max_history_id
-        FROM warranty_histories
-        WHERE warranty_histories.warranty_id = {warranty_id}
-        GROUP BY warranty_id
-        
-        ORM equivalente (Opción 1 - Solo el ID):
-        WarrantyHistory.objects.filter(
-            warranty_id=warranty_id
-        ).aggregate(max_history_id=Max('id'))
+        SQL equivalente:
+        SELECT * FROM warranty_histories
+        WHERE warranty_id = {warranty_id} AND is_latest
         
-        ORM equivalente (Opción 2 - Objeto completo):
-        WarrantyHistory.objects.filter(
-            warranty_id=warranty_id
-        ).order_by('-id').first()
+        El último historial se marca con is_latest (índice parcial
+        wh_latest_idx), sin MAX(id) ni ORDER BY.
         
         Retorna el historial completo con toda su información.
         """
         try:
-            # Obtener el último historial usando order_by('-id').first()
-            # Esto es más eficiente que aggregate + get
             latest_history = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
+                warranty_id=warranty_id,
+                is_latest=True
             ).select_related(
                 'warranty',
                 'warranty__warranty_object',
@@ -1758,7 +2258,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related(
                 'files'
-            ).order_by('-id').first()
+            ).first()
             
             if not latest_history:
                 return Response(
@@ -1777,6 +2277,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=False, methods=['post'], url_path='renovar')
+    @bloquear_garantia(warranty_id_de_peticion)
     def renovar(self, request):
         """
         Renueva una carta fianza creando un nuevo historial.
@@ -1829,8 +2330,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             
             # Obtener el último historial de la garantía
             latest_history = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
-            ).select_related('warranty_status').order_by('-id').first()
+                warranty_id=warranty_id,
+                is_latest=True
+            ).select_related('warranty_status').first()
             
             if not latest_history:
                 return Response(
@@ -1941,6 +2443,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=new_history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('renovar', new_history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(new_history)
             
@@ -1953,6 +2458,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=False, methods=['post'], url_path='devolver')
+    @bloquear_garantia(warranty_id_de_peticion)
     def devolver(self, request):
         """
         Devuelve una carta fianza creando un nuevo historial con estado "Devolución".
@@ -2000,8 +2506,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             
             # Obtener el último historial de la garantía
             latest_history = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
-            ).select_related('warranty_status').order_by('-id').first()
+                warranty_id=warranty_id,
+                is_latest=True
+            ).select_related('warranty_status').first()
             
             if not latest_history:
                 return Response(
@@ -2101,6 +2608,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=new_history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('devolver', new_history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(new_history)
             
@@ -2113,6 +2623,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=True, methods=['delete'], url_path='eliminar')
+    @bloquear_garantia(warranty_id_de_historial)
     def eliminar(self, request, pk=None):
         """
         Elimina un historial de garantía y sus archivos asociados.
@@ -2149,26 +2660,18 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             warranty = history.warranty
             
             # Verificar que es el último historial de la garantía
-            latest_history = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
-            ).order_by('-id').first()
-            
-            if latest_history.id != history.id:
+            if not history.is_latest:
                 return Response(
                     {
                         'error': 'Solo se puede eliminar el último historial de la garantía',
                         'history_id': history.id,
-                        'latest_history_id': latest_history.id
+                        'latest_history_id': ultimo_movimiento_id(warranty_id)
                     },
                     status=400
                 )
             
-            # Contar historiales para saber si es el único
-            history_count = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
-            ).count()
-            
-            is_only_history = (history_count <= 1)
+            # Sin movimiento anterior es el único historial (la emisión)
+            is_only_history = history.previous_history_id is None
             
             # Eliminar archivos físicos del servidor
             for file_obj in history.files.all():
@@ -2198,6 +2701,18 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             # Si era el único historial, eliminar también la garantía
             if is_only_history:
                 warranty.delete()
+            
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento(
+                'eliminar',
+                warranty_id=warranty_id,
+                history_id=deleted_info['history_id'],
+                warranty_object_id=warranty.warranty_object_id,
+                contractor_id=warranty.contractor_id,
+                warranty_deleted=is_only_history
+            )
+            
+            if is_only_history:
                 return Response({
                     'message': 'Historial y garantía eliminados correctamente',
                     'deleted': deleted_info
@@ -2215,6 +2730,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=False, methods=['post'], url_path='ejecutar')
+    @bloquear_garantia(warranty_id_de_peticion)
     def ejecutar(self, request):
         """
         Ejecuta una carta fianza creando un nuevo historial con estado "Ejecución".
@@ -2262,8 +2778,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             
             # Obtener el último historial de la garantía
             latest_history = WarrantyHistory.objects.filter(
-                warranty_id=warranty_id
-            ).select_related('warranty_status').order_by('-id').first()
+                warranty_id=warranty_id,
+                is_latest=True
+            ).select_related('warranty_status').first()
             
             if not latest_history:
                 return Response(
@@ -2363,6 +2880,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=new_history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('ejecutar', new_history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(new_history)
             
@@ -2375,6 +2895,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=True, methods=['post'], url_path='modificar-emision')
+    @bloquear_garantia(warranty_id_de_historial)
     def modificar_emision(self, request, pk=None):
         """
         Modifica una emisión de carta fianza (warranty_status_id = 1).
@@ -2442,16 +2963,12 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 )
             
             # Verificar que es el último historial de la garantía
-            latest_history = WarrantyHistory.objects.filter(
-                warranty_id=history.warranty_id
-            ).aggregate(max_id=Max('id'))
-            
-            if history.id != latest_history['max_id']:
+            if not history.is_latest:
                 return Response(
                     {
                         'error': 'Solo se puede modificar el último historial de la garantía',
                         'history_id': history.id,
-                        'latest_history_id': latest_history['max_id']
+                        'latest_history_id': ultimo_movimiento_id(history.warranty_id)
                     },
                     status=400
                 )
@@ -2698,6 +3215,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('modificar_emision', history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(
                 history,
@@ -2716,6 +3236,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=True, methods=['post'], url_path='modificar-renovacion')
+    @bloquear_garantia(warranty_id_de_historial)
     def modificar_renovacion(self, request, pk=None):
         """
         Modifica una renovación de carta fianza (warranty_status_id = 2).
@@ -2780,16 +3301,12 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 )
             
             # Verificar que es el último historial de la garantía
-            latest_history = WarrantyHistory.objects.filter(
-                warranty_id=history.warranty_id
-            ).aggregate(max_id=Max('id'))
-            
-            if history.id != latest_history['max_id']:
+            if not history.is_latest:
                 return Response(
                     {
                         'error': 'Solo se puede modificar el último historial de la garantía',
                         'history_id': history.id,
-                        'latest_history_id': latest_history['max_id']
+                        'latest_history_id': ultimo_movimiento_id(history.warranty_id)
                     },
                     status=400
                 )
@@ -2982,6 +3499,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('modificar_renovacion', history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(
                 history,
@@ -3000,6 +3520,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
     
     @action(detail=True, methods=['post'], url_path='modificar-devolucion')
+    @bloquear_garantia(warranty_id_de_historial)
     def modificar_devolucion(self, request, pk=None):
         """
         Modifica una devolución de carta fianza (warranty_status_id = 3).
@@ -3054,16 +3575,12 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 )
             
             # Verificar que es el último historial de la garantía
-            latest_history = WarrantyHistory.objects.filter(
-                warranty_id=history.warranty_id
-            ).aggregate(max_id=Max('id'))
-            
-            if history.id != latest_history['max_id']:
+            if not history.is_latest:
                 return Response(
                     {
                         'error': 'Solo se puede modificar el último historial de la garantía',
                         'history_id': history.id,
-                        'latest_history_id': latest_history['max_id']
+                        'latest_history_id': ultimo_movimiento_id(history.warranty_id)
                     },
                     status=400
                 )
@@ -3164,6 +3681,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('modificar_devolucion', history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(
                 history,
@@ -3182,6 +3702,7 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
     @action(detail=True, methods=['post'], url_path='modificar-ejecucion')
+    @bloquear_garantia(warranty_id_de_historial)
     def modificar_ejecucion(self, request, pk=None):
         """
         Modifica una ejecución de carta fianza (warranty_status_id = 6).
@@ -3236,16 +3757,12 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 )
             
             # Verificar que es el último historial de la garantía
-            latest_history = WarrantyHistory.objects.filter(
-                warranty_id=history.warranty_id
-            ).aggregate(max_id=Max('id'))
-            
-            if history.id != latest_history['max_id']:
+            if not history.is_latest:
                 return Response(
                     {
                         'error': 'Solo se puede modificar el último historial de la garantía',
                         'history_id': history.id,
-                        'latest_history_id': latest_history['max_id']
+                        'latest_history_id': ultimo_movimiento_id(history.warranty_id)
                     },
                     status=400
                 )
@@ -3346,6 +3863,9 @@ class WarrantyHistoryViewSet(viewsets.ReadOnlyModelViewSet):
                 'updated_by'
             ).prefetch_related('files').get(id=history.id)
             
+            # Notificar a los clientes conectados al feed de eventos
+            publicar_evento_historial('modificar_ejecucion', history)
+
             # Serializar la respuesta
             serializer = WarrantyHistoryDetailSerializer(
                 history,
@@ -3384,9 +3904,117 @@ class CanManageUsers(BasePermission):
             return False
 
 
+# ==================== VERIFICACIÓN DE REGISTROS DE USUARIOS ====================
+
+# Modelos con campos de auditoría (created_by / updated_by) que referencian a User
+MODELOS_CON_AUDITORIA = [
+    ('Objetos de Garantía', WarrantyObject),
+    ('Tipos de Carta', LetterType),
+    ('Entidades Financieras', FinancialEntity),
+    ('Contratistas', Contractor),
+    ('Estados de Garantía', WarrantyStatus),
+    ('Tipos de Moneda', CurrencyType),
+    ('Garantías', Warranty),
+    ('Historiales de Garantía', WarrantyHistory),
+    ('Archivos de Garantía', WarrantyFile),
+]
+
+CAMPOS_DE_AUDITORIA = ['created_by', 'updated_by']
+
+
+def verificar_registros_relacionados(user_ids, conteo_exacto=False):
+    """
+    Verifica en una sola consulta si los usuarios tienen registros asociados
+    en los modelos con campos de auditoría.
+
+    Por defecto cada combinación modelo/campo se resuelve con un EXISTS
+    (se detiene en la primera fila encontrada usando el índice de la FK) y
+    todas las comprobaciones se unen con UNION ALL. Con conteo_exacto=True
+    se ejecuta un COUNT(*) agrupado por usuario, que es más costoso.
+
+    Args:
+        user_ids (list): IDs de los usuarios a verificar
+        conteo_exacto (bool): Si es True, retorna la cantidad exacta de registros
+
+    Returns:
+        dict: {user_id: [{'model': ..., 'field': ..., 'count': int|None}, ...]}
+              Solo incluye usuarios con al menos un registro relacionado.
+              'count' es None cuando no se solicitó el conteo exacto.
+
+    Ejemplo:
+        >>> verificar_registros_relacionados([5])
+        {5: [{'model': 'Garantías', 'field': 'created_by', 'count': None}]}
+    """
+    user_ids = [int(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+
+    qn = connection.ops.quote_name
+    user_table = qn(User._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(user_ids))
+
+    checks = []
+    parts = []
+    params = []
+    for model_name, model_class in MODELOS_CON_AUDITORIA:
+        table = qn(model_class._meta.db_table)
+        for field in CAMPOS_DE_AUDITORIA:
+            column = qn(model_class._meta.get_field(field).column)
+            idx = len(checks)
+            checks.append((model_name, field))
+
+            if conteo_exacto:
+                # SELECT idx, created_by_id, COUNT(*) FROM tabla WHERE created_by_id IN (...) GROUP BY created_by_id
+                parts.append(
+                    f'SELECT {idx} AS check_idx, t.{column} AS user_id, COUNT(*) AS total '
+                    f'FROM {table} t WHERE t.{column} IN ({placeholders}) '
+                    f'GROUP BY t.{column}'
+                )
+            else:
+                # SELECT idx, u.id FROM auth_user u WHERE u.id IN (...)
+                #   AND EXISTS (SELECT 1 FROM tabla t WHERE t.created_by_id = u.id)
+                parts.append(
+                    f'SELECT {idx} AS check_idx, u.id AS user_id, NULL AS total '
+                    f'FROM {user_table} u WHERE u.id IN ({placeholders}) '
+                    f'AND EXISTS (SELECT 1 FROM {table} t WHERE t.{column} = u.id)'
+                )
+            params.extend(user_ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(parts), params)
+        rows = cursor.fetchall()
+
+    related = {}
+    for check_idx, user_id, total in sorted(rows):
+        model_name, field = checks[check_idx]
+        related.setdefault(user_id, []).append({
+            'model': model_name,
+            'field': field,
+            'count': total
+        })
+    return related
+
+
+def describir_registros_relacionados(records):
+    """
+    Construye los mensajes legibles de los registros relacionados de un usuario.
+
+    Ejemplo:
+        >>> describir_registros_relacionados([{'model': 'Garantías', 'field': 'created_by', 'count': 3}])
+        ['Garantías (created by): 3']
+    """
+    details = []
+    for record in records:
+        detail = f'{record["model"]} ({record["field"].replace("_", " ")})'
+        if record['count'] is not None:
+            detail = f'{detail}: {record["count"]}'
+        details.append(detail)
+    return details
+
+
 # ==================== VIEWSET DE USUARIOS ====================
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet para administración de usuarios.
     
@@ -3400,6 +4028,7 @@ class UserViewSet(viewsets.ModelViewSet):
     - PUT /api/users/{id}/ - Actualizar usuario
     - PATCH /api/users/{id}/ - Actualizar parcialmente usuario
     - DELETE /api/users/{id}/ - Eliminar usuario
+    - POST /api/users/acciones-masivas/ - Desactivar o eliminar varios usuarios
     """
     permission_classes = [IsAuthenticated, CanManageUsers]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -3476,6 +4105,10 @@ class UserViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         """
         Eliminar usuario (no permite eliminar al usuario actual ni usuarios con datos registrados)
+        
+        Parámetros opcionales:
+        - conteo_exacto: Si es 'true', el detalle incluye la cantidad de registros
+          relacionados (más costoso que la verificación por existencia)
         """
         instance = self.get_object()
         
@@ -3487,27 +4120,11 @@ class UserViewSet(viewsets.ModelViewSet):
             )
         
         # Verificar si el usuario tiene información registrada en el sistema
-        related_records = []
-        
-        # Verificar relaciones con cada modelo
-        models_to_check = [
-            ('Objetos de Garantía', WarrantyObject, ['created_by', 'updated_by']),
-            ('Tipos de Carta', LetterType, ['created_by', 'updated_by']),
-            ('Entidades Financieras', FinancialEntity, ['created_by', 'updated_by']),
-            ('Contratistas', Contractor, ['created_by', 'updated_by']),
-            ('Estados de Garantía', WarrantyStatus, ['created_by', 'updated_by']),
-            ('Tipos de Moneda', CurrencyType, ['created_by', 'updated_by']),
-            ('Garantías', Warranty, ['created_by', 'updated_by']),
-            ('Historiales de Garantía', WarrantyHistory, ['created_by', 'updated_by']),
-            ('Archivos de Garantía', WarrantyFile, ['created_by', 'updated_by']),
-        ]
-        
-        for model_name, model_class, fields in models_to_check:
-            for field in fields:
-                count = model_class.objects.filter(**{field: instance}).count()
-                if count > 0:
-                    related_records.append(f'{model_name} ({field.replace("_", " ")}): {count}')
-        
+        # Una sola consulta (UNION ALL de EXISTS); el conteo exacto es opcional
+        conteo_exacto = request.query_params.get('conteo_exacto', '').lower() in ('1', 'true')
+        related = verificar_registros_relacionados([instance.id], conteo_exacto=conteo_exacto)
+        related_records = describir_registros_relacionados(related.get(instance.id, []))
+
         if related_records:
             return Response(
                 {
@@ -3524,7 +4141,94 @@ class UserViewSet(viewsets.ModelViewSet):
             {'message': f'Usuario {username} eliminado correctamente'},
             status=status.HTTP_200_OK
         )
-    
+
+    @action(detail=False, methods=['post'], url_path='acciones-masivas')
+    def acciones_masivas(self, request):
+        """
+        Desactiva o elimina varios usuarios en una sola operación.
+
+        POST /api/users/acciones-masivas/
+        Body: {"user_ids": [4, 5, 9], "accion": "desactivar" | "eliminar", "conteo_exacto": false}
+
+        - desactivar: marca is_active=False en todos los usuarios indicados
+        - eliminar: elimina solo los usuarios sin información registrada; el resto
+          se reporta en 'omitidos' con el detalle de sus registros relacionados
+
+        La verificación de registros relacionados se realiza con una sola consulta
+        para todos los usuarios (ver verificar_registros_relacionados).
+
+        Nunca se procesa al usuario actual ni al usuario protegido django_admin.
+        """
+        from django.db import transaction
+
+        user_ids = request.data.get('user_ids')
+        accion = request.data.get('accion')
+        conteo_exacto = str(request.data.get('conteo_exacto', '')).lower() in ('1', 'true')
+
+        if accion not in ('desactivar', 'eliminar'):
+            return Response(
+                {'error': 'El campo accion debe ser "desactivar" o "eliminar"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response(
+                {'error': 'El campo user_ids debe ser una lista con al menos un ID'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'El campo user_ids debe contener solo IDs numéricos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Usuarios válidos (excluye django_admin) distintos del usuario actual
+        users = list(
+            self.get_queryset().filter(id__in=user_ids).exclude(id=request.user.id)
+        )
+        found_ids = {user.id for user in users}
+
+        omitidos = [
+            {'id': user_id, 'error': 'No puedes modificar tu propio usuario.'}
+            for user_id in user_ids if user_id == request.user.id
+        ]
+        omitidos += [
+            {'id': user_id, 'error': 'Usuario no encontrado.'}
+            for user_id in user_ids
+            if user_id not in found_ids and user_id != request.user.id
+        ]
+
+        if accion == 'desactivar':
+            User.objects.filter(id__in=found_ids).update(is_active=False)
+            return Response({
+                'message': f'{len(found_ids)} usuario(s) desactivado(s) correctamente',
+                'procesados': sorted(found_ids),
+                'omitidos': omitidos
+            }, status=status.HTTP_200_OK)
+
+        # Eliminar: verificar registros relacionados de todos los usuarios a la vez
+        related = verificar_registros_relacionados(list(found_ids), conteo_exacto=conteo_exacto)
+        deletable_ids = [user_id for user_id in found_ids if user_id not in related]
+
+        for user_id, records in related.items():
+            omitidos.append({
+                'id': user_id,
+                'error': 'No se puede eliminar el usuario porque tiene información registrada en el sistema.',
+                'details': describir_registros_relacionados(records)
+            })
+
+        with transaction.atomic():
+            User.objects.filter(id__in=deletable_ids).delete()
+
+        return Response({
+            'message': f'{len(deletable_ids)} usuario(s) eliminado(s) correctamente',
+            'procesados': sorted(deletable_ids),
+            'omitidos': omitidos
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='me')
     def current_user(self, request):
         """
@@ -3547,4 +4251,662 @@ class UserViewSet(viewsets.ModelViewSet):
             'date_joined': user.date_joined,
             'last_login': user.last_login,
             'can_manage_users': profile.can_manage_users
-        })
\ No newline at end of file
+        })
+
+class DatabaseConnectionsView(APIView):
+    """
+    Métricas de las conexiones a la base de datos del worker que atiende la petición
+    
+    GET /api/sistema/conexiones/
+    
+    Cada worker de gunicorn tiene su propio pool o conexión persistente,
+    por lo que los valores corresponden solo al proceso indicado en 'pid'.
+    
+    Retorna por alias (default y, si existe, replica):
+    - modo: pool | persistente | por_peticion
+    - en_uso, inactivas, esperando, esperas, tiempo_espera_ms (solo pool)
+    - conexiones_abiertas, tiempo_conexion_promedio_ms
+    """
+    permission_classes = [IsAuthenticated, CanManageUsers]
+    
+    def get(self, request):
+        return Response({
+            'conexiones': [estadisticas_conexiones(alias) for alias in connections]
+        })
+
+
+class PerfilesView(APIView):
+    """
+    Capturas de perfilado bajo demanda (ver perfilado.py)
+    
+    GET /api/sistema/perfiles/
+    
+    Para capturar, repetir la petición a una acción de /api/warranties/ o
+    /api/warranty-histories/ con la cabecera 'X-Perfilar: 1' (o ?perfilar=1);
+    la respuesta trae el id de la captura en la cabecera X-Perfil-Id.
+    
+    Retorna las capturas guardadas (más recientes primero) con ruta,
+    usuario, status, duración total y cantidad/tiempo de consultas SQL.
+    """
+    permission_classes = [IsAuthenticated, CanManageUsers]
+    
+    def get(self, request):
+        capturas = perfilado.listar_capturas()
+        return Response({
+            'count': len(capturas),
+            'maximo': settings.PROFILING_MAX_CAPTURES,
+            'results': capturas
+        })
+
+
+class PerfilDetalleView(APIView):
+    """
+    Una captura de perfilado
+    
+    GET /api/sistema/perfiles/{id}/             metadatos, consultas SQL y tabla de pstats
+    GET /api/sistema/perfiles/{id}/pstats/      archivo .prof (snakeviz, pstats.Stats)
+    GET /api/sistema/perfiles/{id}/flamegraph/  pilas colapsadas en texto (flamegraph.pl, speedscope)
+    
+    Parámetros (solo el detalle):
+    - orden (opcional): cumulative (por defecto), tottime, calls
+    - lineas (opcional): Funciones en la tabla de pstats (por defecto 50, máximo 500)
+    """
+    permission_classes = [IsAuthenticated, CanManageUsers]
+    ORDENES = ('cumulative', 'tottime', 'calls')
+    
+    def get(self, request, perfil_id, formato=None):
+        from django.http import FileResponse, HttpResponse
+        
+        captura = perfilado.leer_captura(perfil_id) if perfil_id.isdigit() else None
+        if captura is None or formato not in (None, 'pstats', 'flamegraph'):
+            return Response(
+                {'error': f'No existe la captura de perfilado {perfil_id}'},
+                status=404
+            )
+        
+        if formato == 'pstats':
+            return FileResponse(
+                open(perfilado.ruta_captura(perfil_id, 'prof'), 'rb'),
+                as_attachment=True,
+                filename=f'perfil_{perfil_id}.prof',
+                content_type='application/octet-stream'
+            )
+        if formato == 'flamegraph':
+            return HttpResponse(
+                perfilado.pilas_colapsadas(perfil_id),
+                content_type='text/plain; charset=utf-8'
+            )
+        
+        orden = request.query_params.get('orden', 'cumulative')
+        if orden not in self.ORDENES:
+            return Response(
+                {'error': f'El parámetro orden debe ser uno de: {", ".join(self.ORDENES)}'},
+                status=400
+            )
+        lineas = request.query_params.get('lineas', '50')
+        if not lineas.isdigit():
+            return Response(
+                {'error': 'El parámetro lineas debe ser un número entero'},
+                status=400
+            )
+        
+        return Response({
+            **captura,
+            'pstats': perfilado.resumen_pstats(perfil_id, orden, min(int(lineas), 500))
+        })
+
+
+def concentracion(partes, total, top):
+    """
+    Resumen de concentración de una dimensión de la exposición.
+    
+    Args:
+        partes (list): Partes con total_amount (se ordenan por monto descendente)
+        total (Decimal): Monto total del grupo (moneda o consolidado)
+        top (int): Cantidad de partes del ranking
+    
+    Returns:
+        dict: count, participacion_top (%), hhi (0 a 10000) y top
+    """
+    partes.sort(key=lambda parte: (-parte['total_amount'], parte['id'] is None, parte['id'] or 0))
+    for parte in partes:
+        parte['participacion'] = (
+            (parte['total_amount'] * 100 / total).quantize(Decimal('0.01'))
+            if total else Decimal('0')
+        )
+    return {
+        'count': len(partes),
+        'participacion_top': sum((parte['participacion'] for parte in partes[:top]), Decimal('0')),
+        'hhi': (
+            sum((parte['total_amount'] / total) ** 2 for parte in partes) * 10000
+        ).quantize(Decimal('1')) if total else Decimal('0'),
+        'top': partes[:top],
+    }
+
+
+class ExposicionView(APIView):
+    """
+    Exposición y concentración de la cartera vigente por contratista,
+    entidad financiera y objeto de garantía, por moneda.
+    
+    GET /api/analytics/exposicion/
+    
+    Parámetros:
+    - fecha (opcional): Solo cartas vigentes a esta fecha (formato YYYY-MM-DD).
+                        Sin fecha se consideran todas las cartas con último estado activo.
+    - top (opcional): Cantidad de partes en cada ranking (por defecto 10, máximo 100)
+    - currency_type_id (opcional): ID del tipo de moneda
+    - letter_type_id (opcional): ID del tipo de carta
+    - moneda_base (opcional): Código de moneda (ej. PEN). Agrega 'consolidado' con
+                              todas las monedas convertidas al tipo de cambio de la
+                              fecha de emisión de cada carta (ver tipo_cambio.py)
+    
+    Ejemplo:
+    GET /api/analytics/exposicion/?top=5&letter_type_id=1
+    GET /api/analytics/exposicion/?moneda_base=PEN
+    
+    Una sola consulta agrupada sobre el último historial activo de cada
+    garantía; los subtotales salen de GROUPING SETS:
+    
+    SELECT currency_type_id, contractor_id, financial_entity_id, warranty_object_id, ...,
+           GROUPING(currency_type_id, contractor_id, financial_entity_id, warranty_object_id) AS nivel,
+           COUNT(*), SUM(amount), SUM(amount_base)
+    FROM (<último historial activo de cada garantía>) AS cartas
+    GROUP BY GROUPING SETS (
+        (currency_type_id),
+        (currency_type_id, contractor_id),
+        (currency_type_id, financial_entity_id),
+        (currency_type_id, warranty_object_id),
+        -- solo con moneda_base (montos convertidos, todas las monedas):
+        (), (contractor_id), (financial_entity_id), (warranty_object_id)
+    )
+    
+    Por cada moneda (y en 'consolidado') retorna el total y, por dimensión,
+    el top N con la participación (%) de cada parte, la participación
+    acumulada del top y el índice Herfindahl-Hirschman (HHI, 0 a 10000) de
+    todas las partes. Sin moneda_base los montos de monedas distintas no se suman.
+    
+    La respuesta se cachea y se invalida con cada escritura (cachear_reporte).
+    """
+    # Dimensiones: nombre en la respuesta -> (columna, clave en la respuesta), id primero
+    DIMENSIONES = {
+        'contratistas': (
+            ('contractor_id', 'id'),
+            ('contractor_ruc', 'ruc'),
+            ('contractor_business_name', 'business_name'),
+        ),
+        'entidades_financieras': (
+            ('financial_entity_id', 'id'),
+            ('financial_entity_description', 'description'),
+        ),
+        'objetos': (
+            ('warranty_object_id', 'id'),
+            ('warranty_object_description', 'description'),
+        ),
+    }
+    COLUMNAS_MONEDA = ('currency_type_id', 'currency_type_code', 'currency_type_symbol')
+    
+    @usar_replica
+    @cachear_reporte
+    def get(self, request):
+        from datetime import datetime
+        
+        # Obtener parámetros
+        fecha_str = request.query_params.get('fecha', None)
+        currency_type_id = request.query_params.get('currency_type_id', None)
+        letter_type_id = request.query_params.get('letter_type_id', None)
+        
+        try:
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            return Response({'error': 'El parámetro top debe ser un número entero'}, status=400)
+        top = max(1, min(top, 100))
+        
+        try:
+            moneda_base = moneda_base_de_peticion(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        # Último historial de cada garantía con estado activo
+        queryset = WarrantyHistory.objects.latest_per_warranty().active_status()
+        
+        if fecha_str:
+            try:
+                fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+            except ValueError:
+                return Response({
+                    'error': 'El formato de fecha debe ser YYYY-MM-DD'
+                }, status=400)
+            queryset = queryset.valid_on(fecha)
+        
+        # Aplicar filtros opcionales
+        if currency_type_id:
+            queryset = queryset.filter(currency_type_id=currency_type_id)
+        
+        if letter_type_id:
+            queryset = queryset.filter(warranty__letter_type_id=letter_type_id)
+        
+        # Monto convertido con el tipo de cambio vigente a la fecha de emisión
+        columnas_base = ['amount', 'currency_type_id', 'financial_entity_id']
+        if moneda_base:
+            queryset = anotar_monto_base(queryset, moneda_base)
+            columnas_base.append('amount_base')
+        
+        # Filas base (una por carta) con las columnas de agrupación
+        base = queryset.order_by().values(
+            *columnas_base,
+            currency_type_code=F('currency_type__code'),
+            currency_type_symbol=F('currency_type__symbol'),
+            contractor_id=F('warranty__contractor_id'),
+            contractor_ruc=F('warranty__contractor__ruc'),
+            contractor_business_name=F('warranty__contractor__business_name'),
+            financial_entity_description=F('financial_entity__description'),
+            warranty_object_id=F('warranty__warranty_object_id'),
+            warranty_object_description=F('warranty__warranty_object__description'),
+        )
+        alias = alias_lectura()
+        base_sql, params = base.query.get_compiler(using=alias).as_sql()
+        
+        moneda = ', '.join(self.COLUMNAS_MONEDA)
+        columnas_dimension = [
+            [columna for columna, _ in campos] for campos in self.DIMENSIONES.values()
+        ]
+        conjuntos = [f'({moneda})'] + [
+            f'({moneda}, {", ".join(columnas)})' for columnas in columnas_dimension
+        ]
+        montos = 'SUM(amount) AS total_amount'
+        if moneda_base:
+            # Consolidado: mismos agrupamientos sin la moneda, con montos convertidos
+            conjuntos += ['()'] + [f'({", ".join(columnas)})' for columnas in columnas_dimension]
+            montos += ', SUM(amount_base) AS total_amount_base, COUNT(amount_base) AS convertidas'
+        seleccion = ', '.join(
+            [*self.COLUMNAS_MONEDA, *(c for columnas in columnas_dimension for c in columnas)]
+        )
+        ids = ', '.join(['currency_type_id', *(columnas[0] for columnas in columnas_dimension)])
+        sql = f"""
+            SELECT {seleccion},
+                   GROUPING({ids}) AS nivel,
+                   COUNT(*) AS warranty_count,
+                   {montos}
+            FROM ({base_sql}) AS cartas
+            GROUP BY GROUPING SETS ({", ".join(conjuntos)})
+            ORDER BY currency_type_id NULLS LAST, nivel DESC
+        """
+        
+        with connections[alias].cursor() as cursor:
+            cursor.execute(sql, params)
+            nombres = [col[0] for col in cursor.description]
+            rows = [dict(zip(nombres, row)) for row in cursor.fetchall()]
+        
+        # GROUPING(...) tiene un bit en 1 por cada columna que no forma parte
+        # del conjunto: 0b0111 es el total por moneda, 0b1111 el consolidado,
+        # y apagando el bit de una dimensión se obtiene su agrupamiento
+        cantidad = len(self.DIMENSIONES)
+        todos = (1 << (cantidad + 1)) - 1
+        bit_moneda = 1 << cantidad
+        niveles = {todos ^ bit_moneda: (False, None), todos: (True, None)}
+        for posicion, nombre in enumerate(self.DIMENSIONES):
+            bit = 1 << (cantidad - 1 - posicion)
+            niveles[todos ^ bit_moneda ^ bit] = (False, nombre)
+            niveles[todos ^ bit] = (True, nombre)
+        
+        totales = {}
+        partes = {}
+        for row in rows:
+            consolidado, dimension = niveles[row['nivel']]
+            clave = 'consolidado' if consolidado else row['currency_type_id']
+            monto = (row['total_amount_base'] if consolidado else row['total_amount']) or Decimal('0')
+            if dimension is None:
+                if consolidado:
+                    totales[clave] = {
+                        'moneda_base': moneda_base.code,
+                        'currency_type_symbol': moneda_base.symbol,
+                        'warranty_count': row['warranty_count'],
+                        'total_amount': monto,
+                        'sin_tipo_cambio': row['warranty_count'] - row['convertidas'],
+                    }
+                else:
+                    totales[clave] = {
+                        'currency_type_id': clave,
+                        'currency_type_code': row['currency_type_code'],
+                        'currency_type_symbol': row['currency_type_symbol'],
+                        'warranty_count': row['warranty_count'],
+                        'total_amount': monto,
+                    }
+                    if moneda_base:
+                        totales[clave]['total_amount_base'] = row['total_amount_base']
+                continue
+            parte = {clave_parte: row[columna] for columna, clave_parte in self.DIMENSIONES[dimension]}
+            parte['warranty_count'] = row['warranty_count']
+            parte['total_amount'] = monto
+            partes.setdefault((clave, dimension), []).append(parte)
+        
+        for clave, resumen in totales.items():
+            for dimension in self.DIMENSIONES:
+                resumen[dimension] = concentracion(
+                    partes.get((clave, dimension), []), resumen['total_amount'], top
+                )
+        consolidado = totales.pop('consolidado', None)
+        
+        return Response({
+            'count': len(totales),
+            'fecha_consulta': fecha_str,
+            'top': top,
+            'filtros_aplicados': {
+                'currency_type_id': currency_type_id,
+                'letter_type_id': letter_type_id
+            },
+            'results': list(totales.values()),
+            'consolidado': consolidado
+        })
+
+
+class AuditoriaView(APIView):
+    """
+    Bitácora de auditoría de garantías, historiales y archivos (AuditLog).
+    
+    GET /api/audit/
+    
+    Parámetros (se requiere entity o desde):
+    - entity (opcional): warranty | warrantyhistory | warrantyfile
+    - id (opcional): ID del registro (requiere entity)
+    - action (opcional): crear | modificar | eliminar
+    - user_id (opcional): ID del usuario que hizo el cambio
+    - desde, hasta (opcional): Rango de fechas del cambio (formato YYYY-MM-DD, inclusivo)
+    - ordering, page_size, cursor (opcional): ver paginacion.py
+                                           (por defecto -id y 100 registros por página)
+    
+    Solo usuarios con can_manage_users. La respuesta no trae 'count': el
+    total obligaría a recorrer todo el rango filtrado; se sigue 'next'.
+    
+    Ejemplo:
+    GET /api/audit/?entity=warrantyhistory&id=55
+    GET /api/audit/?desde=2025-01-01&hasta=2025-01-31&action=eliminar
+    
+    Por registro se usa el índice (entity, object_id); por fechas, el índice
+    BRIN de created_at. Cada resultado trae 'changes' tal como se guardó:
+    valores del registro (crear/eliminar) o [antes, después] por campo (modificar).
+    """
+    permission_classes = [IsAuthenticated, CanManageUsers]
+    ENTIDADES = ('warranty', 'warrantyhistory', 'warrantyfile')
+    CAMPOS_ORDEN = ['id', 'created_at']
+    TAMANO_PAGINA = 100
+    
+    @usar_replica
+    def get(self, request):
+        from datetime import datetime, time
+        from django.utils import timezone
+        
+        # Obtener parámetros
+        entity = request.query_params.get('entity', None)
+        object_id = request.query_params.get('id', None)
+        accion = request.query_params.get('action', None)
+        user_id = request.query_params.get('user_id', None)
+        desde_str = request.query_params.get('desde', None)
+        hasta_str = request.query_params.get('hasta', None)
+        
+        if not entity and not desde_str:
+            return Response(
+                {'error': 'Se requiere el parámetro entity o desde'},
+                status=400
+            )
+        if entity and entity not in self.ENTIDADES:
+            return Response(
+                {'error': f'El parámetro entity debe ser uno de: {", ".join(self.ENTIDADES)}'},
+                status=400
+            )
+        if object_id and not entity:
+            return Response(
+                {'error': 'El parámetro id requiere entity'},
+                status=400
+            )
+        if accion and accion not in dict(AuditLog.ACCIONES):
+            return Response(
+                {'error': f'El parámetro action debe ser uno de: {", ".join(dict(AuditLog.ACCIONES))}'},
+                status=400
+            )
+        for nombre, valor in (('id', object_id), ('user_id', user_id)):
+            if valor and not valor.isdigit():
+                return Response(
+                    {'error': f'El parámetro {nombre} debe ser un número entero'},
+                    status=400
+                )
+        
+        try:
+            desde = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else None
+            hasta = datetime.strptime(hasta_str, '%Y-%m-%d').date() if hasta_str else None
+        except ValueError:
+            return Response(
+                {'error': 'El formato de fecha debe ser YYYY-MM-DD'},
+                status=400
+            )
+        
+        try:
+            paginacion = PaginacionKeyset(
+                request, self.CAMPOS_ORDEN, '-id',
+                tamano_defecto=self.TAMANO_PAGINA, contar=False
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        queryset = AuditLog.objects.all()
+        if entity:
+            queryset = queryset.filter(entity=entity)
+        if object_id:
+            queryset = queryset.filter(object_id=object_id)
+        if accion:
+            queryset = queryset.filter(action=accion)
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        # Límites como instantes (sin __date) para que se use el índice BRIN
+        if desde:
+            queryset = queryset.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(desde, time.min))
+            )
+        if hasta:
+            queryset = queryset.filter(
+                created_at__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+            )
+        
+        columnas = ['id', 'entity', 'object_id', 'action', 'changes', 'user_id', 'user__username', 'created_at']
+        filas = paginacion.paginar(list(
+            paginacion.aplicar(queryset).values(*dict.fromkeys(columnas + paginacion.columnas))
+        ))
+        
+        return Response({
+            **paginacion.resumen(),
+            'filtros_aplicados': {
+                'entity': entity,
+                'id': object_id,
+                'action': accion,
+                'user_id': user_id,
+                'desde': desde_str,
+                'hasta': hasta_str
+            },
+            'results': [
+                {
+                    'id': fila['id'],
+                    'entity': fila['entity'],
+                    'object_id': fila['object_id'],
+                    'action': fila['action'],
+                    'changes': fila['changes'],
+                    'user_id': fila['user_id'],
+                    'username': fila['user__username'],
+                    'created_at': fila['created_at'],
+                }
+                for fila in filas
+            ]
+        })
+
+
+# Marcas de ts_headline: caracteres de control que no se alteran al escapar
+# el texto como HTML y se reemplazan después por <mark> y </mark>
+INICIO_RESALTADO = '\x02'
+FIN_RESALTADO = '\x03'
+
+
+def resaltar_fragmento(fragmento):
+    """
+    Fragmento de ts_headline como HTML seguro: el texto (extraído de un PDF
+    subido por un usuario) se escapa y solo se agregan las etiquetas <mark>.
+    """
+    if not fragmento:
+        return fragmento
+    return html.escape(fragmento).replace(INICIO_RESALTADO, '<mark>').replace(FIN_RESALTADO, '</mark>')
+
+
+class BusquedaArchivosView(APIView):
+    """
+    Búsqueda de texto completo en los archivos adjuntos (nombre y texto del PDF).
+    
+    GET /api/warranty-files/buscar/
+    
+    Parámetros:
+    - q (requerido): Texto a buscar. Admite "frase exacta", OR y -palabra
+                     (sintaxis de websearch_to_tsquery, configuración spanish)
+    - warranty_id (opcional): Solo archivos de esta garantía
+    - warranty_history_id (opcional): Solo archivos de este historial
+    - limit (opcional): Resultados por página (por defecto 20, máximo 100)
+    - offset (opcional): Resultados a omitir (por defecto 0)
+    
+    Ejemplo:
+    GET /api/warranty-files/buscar/?q=adenda 3
+    GET /api/warranty-files/buscar/?q="carta fianza" -renovación&warranty_id=10
+    
+    La coincidencia usa el índice GIN de search_vector y se ordena por
+    ts_rank. Los fragmentos (ts_headline) se calculan en una segunda
+    consulta solo para los archivos de la página. 'snippet' es HTML seguro:
+    el texto del PDF se escapa y solo los términos encontrados van entre
+    <mark> y </mark>.
+    
+    Solo se encuentran archivos ya procesados por 'extraer_texto_archivos'.
+    """
+    LIMITE_DEFECTO = 20
+    LIMITE_MAXIMO = 100
+    
+    @usar_replica
+    def get(self, request):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+        
+        # Obtener parámetros
+        q = (request.query_params.get('q') or '').strip()
+        warranty_id = request.query_params.get('warranty_id', None)
+        warranty_history_id = request.query_params.get('warranty_history_id', None)
+        
+        if not q:
+            return Response(
+                {'error': 'El parámetro q es requerido'},
+                status=400
+            )
+        for nombre, valor in (
+            ('warranty_id', warranty_id),
+            ('warranty_history_id', warranty_history_id),
+            ('limit', request.query_params.get('limit')),
+            ('offset', request.query_params.get('offset')),
+        ):
+            if valor and not valor.isdigit():
+                return Response(
+                    {'error': f'El parámetro {nombre} debe ser un número entero'},
+                    status=400
+                )
+        limit = min(int(request.query_params.get('limit') or self.LIMITE_DEFECTO), self.LIMITE_MAXIMO)
+        offset = int(request.query_params.get('offset') or 0)
+        
+        query = SearchQuery(q, search_type='websearch', config=CONFIGURACION_BUSQUEDA)
+        
+        # Paso 1: coincidencias (índice GIN) ordenadas por relevancia
+        queryset = WarrantyFile.objects.filter(search_vector=query)
+        if warranty_id:
+            queryset = queryset.filter(warranty_history__warranty_id=warranty_id)
+        if warranty_history_id:
+            queryset = queryset.filter(warranty_history_id=warranty_history_id)
+        
+        count = queryset.count()
+        pagina = list(
+            queryset.annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', 'id')
+            .values_list('id', 'rank')[offset:offset + limit]
+        )
+        
+        # Paso 2: fragmentos y datos solo de la página
+        filas = {
+            fila['id']: fila
+            for fila in WarrantyFile.objects.filter(id__in=[file_id for file_id, _ in pagina]).annotate(
+                snippet=SearchHeadline(
+                    'text_content',
+                    query,
+                    config=CONFIGURACION_BUSQUEDA,
+                    start_sel=INICIO_RESALTADO,
+                    stop_sel=FIN_RESALTADO,
+                    max_fragments=3,
+                    min_words=8,
+                    max_words=25,
+                    fragment_delimiter=' … '
+                )
+            ).values(
+                'id',
+                'file_name',
+                'file',
+                'warranty_history_id',
+                'warranty_history__warranty_id',
+                'warranty_history__letter_number',
+                'snippet'
+            )
+        }
+        
+        storage = WarrantyFile._meta.get_field('file').storage
+        results = []
+        for file_id, rank in pagina:
+            fila = filas.get(file_id)
+            if fila is None:
+                # Eliminado entre las dos consultas
+                continue
+            results.append({
+                'id': file_id,
+                'file_name': fila['file_name'],
+                'file_url': request.build_absolute_uri(storage.url(fila['file'])) if fila['file'] else None,
+                'warranty_history_id': fila['warranty_history_id'],
+                'warranty_id': fila['warranty_history__warranty_id'],
+                'letter_number': fila['warranty_history__letter_number'],
+                'rank': round(rank, 4),
+                'snippet': resaltar_fragmento(fila['snippet']),
+            })
+        
+        return Response({
+            'count': count,
+            'q': q,
+            'limit': limit,
+            'offset': offset,
+            'filtros_aplicados': {
+                'warranty_id': warranty_id,
+                'warranty_history_id': warranty_history_id
+            },
+            'results': results
+        })
+
+
+class TicketEventosView(APIView):
+    """
+    Ticket para conectarse al feed de eventos desde el navegador
+    
+    GET /api/events/ticket/
+    
+    EventSource no puede enviar la cabecera Authorization, y el token de la
+    API no debe ir en la URL (queda en logs y en el historial). Este ticket
+    va en GET /api/events/?ticket=<ticket>: está firmado, solo sirve para el
+    feed y vence a los EVENTS_TICKET_MAX_AGE segundos. Se valida al
+    conectar; para reconectarse se pide uno nuevo.
+    
+    Retorna:
+    - ticket: Valor para ?ticket=
+    - expira_en: Segundos de validez
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        response = Response({
+            'ticket': emitir_ticket(request.user),
+            'expira_en': settings.EVENTS_TICKET_MAX_AGE
+        })
+        response['Cache-Control'] = 'no-store'
+        return response
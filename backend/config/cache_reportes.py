@@ -0,0 +1,145 @@
+"""
+Caché de respuestas de reportes, con cuerpos ya comprimidos.
+
+- @cachear_reporte guarda el JSON renderizado de una acción de reporte y,
+  por separado, su versión comprimida en cada codificación pedida (nivel
+  intermedio, una sola vez por versión). Las descargas repetidas no
+  consumen CPU.
+- La clave incluye la versión de escritura: cada petición que modifica
+  datos (VersionEscrituraMiddleware) o los comandos que mueven datos
+  (registrar_escritura) cambian la versión e invalidan todos los reportes.
+- La clave incluye también el alias de lectura: un reporte calculado en la
+  réplica (que puede estar atrasada) no se entrega a quien lee de 'default'.
+- Las peticiones que deben leer sus propias escrituras (leer_de_primaria,
+  ver config/db_router.py) no usan la caché: se ejecutan en 'default' y su
+  respuesta trae X-Cache-Reporte: BYPASS.
+- REPORT_CACHE_TIMEOUT limita además la antigüedad de una entrada (por
+  ejemplo, por el retraso de la réplica de lectura).
+
+La caché debe ser compartida entre los workers (CACHES en settings).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from config.compresion import comprimir, negociar_codificacion
+from config.db_router import METODOS_ESCRITURA, alias_lectura
+
+CLAVE_VERSION = 'reportes:version_escritura'
+
+
+def version_escritura():
+    """Versión actual de los datos (cambia con cada escritura)"""
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = registrar_escritura()
+    return version
+
+
+def registrar_escritura():
+    """
+    Cambia la versión de escritura. Se usa una marca de tiempo en lugar de un
+    contador para no depender de un incremento atómico en la caché.
+    """
+    version = str(time.time_ns())
+    cache.set(CLAVE_VERSION, version, None)
+    return version
+
+
+def clave_reporte(request):
+    """
+    Clave base del reporte: versión + alias de lectura + ruta completa +
+    tipo de medio aceptado
+    """
+    huella = hashlib.sha256(
+        f'{alias_lectura()}|{request.get_full_path()}|{request.accepted_media_type}'.encode()
+    ).hexdigest()
+    return f'reportes:{version_escritura()}:{huella}'
+
+
+def respuesta_cacheada(cuerpo, codificacion, media_type, estado_cache):
+    """HttpResponse con el cuerpo (comprimido o no) tal como está en caché"""
+    response = HttpResponse(cuerpo, content_type=media_type)
+    if codificacion:
+        response['Content-Encoding'] = codificacion
+    response['Content-Length'] = str(len(cuerpo))
+    response['X-Cache-Reporte'] = estado_cache
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def cachear_reporte(view_method):
+    """
+    Decorador para acciones GET de reportes (después de @action).
+
+    Solo cachea respuestas 200 renderizadas como JSON; con otros formatos
+    (API navegable) o con perfilado activo ejecuta la acción normalmente.
+    Va después de @usar_replica: el alias de lectura forma parte de la clave.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        # Peticiones perfiladas (perfilado.py): se mide la acción, no la caché
+        if request.accepted_renderer.format != 'json' or getattr(request, 'perfilando', False):
+            return view_method(self, request, *args, **kwargs)
+
+        # Escritura reciente del cliente: la caché puede tener un cuerpo
+        # calculado en la réplica antes de que la escritura llegara a ella
+        if getattr(request, 'leer_de_primaria', False):
+            response = view_method(self, request, *args, **kwargs)
+            response['X-Cache-Reporte'] = 'BYPASS'
+            return response
+
+        timeout = settings.REPORT_CACHE_TIMEOUT
+        codificacion = negociar_codificacion(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        base = clave_reporte(request)
+        clave = f'{base}:{codificacion or "identity"}'
+
+        cuerpo = cache.get(clave)
+        if cuerpo is not None:
+            return respuesta_cacheada(cuerpo, codificacion, request.accepted_media_type, 'HIT')
+
+        estado_cache = 'HIT'
+        identidad = cache.get(f'{base}:identity')
+        if identidad is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            identidad = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            cache.set(f'{base}:identity', identidad, timeout)
+            estado_cache = 'MISS'
+
+        cuerpo = identidad
+        if codificacion:
+            cuerpo = comprimir(identidad, codificacion, nivel='cacheado')
+            cache.set(clave, cuerpo, timeout)
+
+        return respuesta_cacheada(cuerpo, codificacion, request.accepted_media_type, estado_cache)
+    return wrapper
+
+
+class VersionEscrituraMiddleware:
+    """Invalida la caché de reportes tras cada petición que modifica datos"""
+    # Rutas que no modifican datos de negocio (login/logout)
+    RUTAS_EXCLUIDAS = ('/api/auth/',)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method in METODOS_ESCRITURA
+            and response.status_code < 400
+            and not request.path.startswith(self.RUTAS_EXCLUIDAS)
+        ):
+            registrar_escritura()
+        return response
@@ -0,0 +1,184 @@
+"""
+Compresión de respuestas de la API negociada por Accept-Encoding.
+
+Codificaciones soportadas, en orden de preferencia del servidor:
+- zstd  (requiere el paquete 'zstandard')
+- br    (requiere el paquete 'brotli')
+- gzip  (biblioteca estándar)
+
+CompresionMiddleware comprime al vuelo las respuestas JSON/texto de /api/,
+incluidas las StreamingHttpResponse (exportaciones), con niveles rápidos.
+Los reportes cacheados (config.cache_reportes) se comprimen una sola vez
+con un nivel intermedio y se sirven ya comprimidos.
+"""
+import gzip
+import re
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Niveles: 'rapido' para compresión al vuelo, 'cacheado' para los cuerpos de
+# la caché de reportes. Estos se comprimen en la petición tras cada escritura:
+# brotli 11 o zstd 19 tardarían segundos en un reporte de varios MB
+NIVELES = {
+    'gzip': {'rapido': 6, 'cacheado': 6},
+    'br': {'rapido': 5, 'cacheado': 6},
+    'zstd': {'rapido': 3, 'cacheado': 6},
+}
+
+# Tamaño mínimo (bytes) para comprimir una respuesta no streaming
+TAMANO_MINIMO = 1024
+
+TIPOS_COMPRIMIBLES = ('application/json', 'text/')
+
+
+def codificaciones_disponibles():
+    """Codificaciones soportadas por el servidor, en orden de preferencia"""
+    disponibles = []
+    if zstandard is not None:
+        disponibles.append('zstd')
+    if brotli is not None:
+        disponibles.append('br')
+    disponibles.append('gzip')
+    return disponibles
+
+
+def negociar_codificacion(accept_encoding):
+    """
+    Elige la codificación según la cabecera Accept-Encoding del cliente.
+
+    Respeta los valores q (q=0 excluye la codificación); a igual q se usa el
+    orden de preferencia del servidor.
+
+    Returns:
+        str | None: 'zstd', 'br', 'gzip' o None (sin compresión)
+    """
+    aceptadas = {}
+    for parte in (accept_encoding or '').split(','):
+        coincidencia = re.match(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?', parte)
+        if not coincidencia:
+            continue
+        try:
+            calidad = float(coincidencia.group(2)) if coincidencia.group(2) else 1.0
+        except ValueError:
+            continue
+        aceptadas[coincidencia.group(1).lower()] = calidad
+
+    mejor, mejor_calidad = None, 0
+    for codificacion in codificaciones_disponibles():
+        calidad = aceptadas.get(codificacion, aceptadas.get('*', 0))
+        if calidad > mejor_calidad:
+            mejor, mejor_calidad = codificacion, calidad
+    return mejor
+
+
+def comprimir(datos, codificacion, nivel='rapido'):
+    """Comprime un cuerpo completo (bytes)"""
+    calidad = NIVELES[codificacion][nivel]
+    if codificacion == 'zstd':
+        return zstandard.ZstdCompressor(level=calidad).compress(datos)
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=calidad)
+    return gzip.compress(datos, compresslevel=calidad, mtime=0)
+
+
+def _compresor_incremental(codificacion, nivel):
+    """
+    Returns:
+        tuple: (función que comprime un fragmento, función que vacía el final)
+    """
+    calidad = NIVELES[codificacion][nivel]
+    if codificacion == 'zstd':
+        compresor = zstandard.ZstdCompressor(level=calidad).compressobj()
+        return compresor.compress, compresor.flush
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=calidad)
+        return compresor.process, compresor.finish
+    compresor = zlib.compressobj(calidad, zlib.DEFLATED, 31)
+    return compresor.compress, compresor.flush
+
+
+def comprimir_stream(fragmentos, codificacion, nivel='rapido'):
+    """Comprime un iterable de bytes fragmento a fragmento (respuestas streaming)"""
+    comprimir_fragmento, vaciar = _compresor_incremental(codificacion, nivel)
+    for fragmento in fragmentos:
+        salida = comprimir_fragmento(fragmento)
+        if salida:
+            yield salida
+    yield vaciar()
+
+
+async def comprimir_stream_async(fragmentos, codificacion, nivel='rapido'):
+    """Versión para StreamingHttpResponse con iterador asíncrono (ASGI)"""
+    comprimir_fragmento, vaciar = _compresor_incremental(codificacion, nivel)
+    async for fragmento in fragmentos:
+        salida = comprimir_fragmento(fragmento)
+        if salida:
+            yield salida
+    yield vaciar()
+
+
+def es_comprimible(response):
+    """Solo JSON/texto sin codificación previa"""
+    if response.has_header('Content-Encoding'):
+        return False
+    tipo = response.get('Content-Type', '')
+    # Server-Sent Events: el compresor retendría los eventos en su búfer
+    if tipo.startswith('text/event-stream'):
+        return False
+    return tipo.startswith(TIPOS_COMPRIMIBLES)
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas de /api/ con la mejor codificación aceptada por
+    el cliente. Debe ir al principio de MIDDLEWARE (se aplica al final).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if not request.path.startswith('/api/') or not es_comprimible(response):
+            return response
+        if not response.streaming and len(response.content) < TAMANO_MINIMO:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codificacion = negociar_codificacion(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = comprimir_stream_async(response.streaming_content, codificacion)
+            else:
+                response.streaming_content = comprimir_stream(response.streaming_content, codificacion)
+            del response['Content-Length']
+        else:
+            comprimido = comprimir(response.content, codificacion)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response['Content-Length'] = str(len(comprimido))
+
+        # El cuerpo cambió: la ETag fuerte pasa a débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = codificacion
+        return response
@@ -0,0 +1,80 @@
+"""
+Métricas de las conexiones a PostgreSQL por proceso (worker de gunicorn).
+
+Modos según la configuración de DATABASES:
+- pool:         pool de psycopg3 (DB_POOL=True)
+- persistente:  una conexión reutilizada por hilo (DB_CONN_MAX_AGE > 0)
+- por_peticion: se abre y cierra una conexión en cada petición (CONN_MAX_AGE = 0)
+"""
+import os
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Conexiones abiertas por alias en este proceso (modos sin pool)
+_conexiones_abiertas = {}
+
+
+@receiver(connection_created)
+def contar_conexion(sender, connection, **kwargs):
+    _conexiones_abiertas[connection.alias] = _conexiones_abiertas.get(connection.alias, 0) + 1
+
+
+def estadisticas_conexiones(alias='default'):
+    """
+    Estadísticas de conexiones de un alias en el proceso actual.
+
+    Con pool: en uso, inactivas, esperas y tiempo de conexión (psycopg_pool).
+    Sin pool: conexiones abiertas desde el inicio del proceso.
+    """
+    conexion = connections[alias]
+    datos = {
+        'alias': alias,
+        'pid': os.getpid(),
+        'conn_max_age': conexion.settings_dict['CONN_MAX_AGE'],
+        'health_checks': conexion.settings_dict['CONN_HEALTH_CHECKS'],
+    }
+
+    pool = getattr(conexion, 'pool', None)
+    if pool is None:
+        datos['modo'] = 'persistente' if datos['conn_max_age'] else 'por_peticion'
+        datos['conexiones_abiertas'] = _conexiones_abiertas.get(alias, 0)
+        return datos
+
+    stats = pool.get_stats()
+    conexiones_num = stats.get('connections_num', 0)
+    datos.update({
+        'modo': 'pool',
+        'minimo': stats.get('pool_min'),
+        'maximo': stats.get('pool_max'),
+        'tamano': stats.get('pool_size', 0),
+        'en_uso': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+        'inactivas': stats.get('pool_available', 0),
+        'esperando': stats.get('requests_waiting', 0),
+        'esperas': stats.get('requests_queued', 0),
+        'tiempo_espera_ms': stats.get('requests_wait_ms', 0),
+        'errores_espera': stats.get('requests_errors', 0),
+        'conexiones_abiertas': conexiones_num,
+        'tiempo_conexion_ms': stats.get('connections_ms', 0),
+        'tiempo_conexion_promedio_ms': (
+            round(stats.get('connections_ms', 0) / conexiones_num, 2) if conexiones_num else None
+        ),
+        'conexiones_perdidas': stats.get('connections_lost', 0),
+    })
+    return datos
+
+
+def parametros_conexion(alias='default'):
+    """
+    Parámetros para abrir una conexión directa (fuera del ORM) con el driver,
+    por ejemplo una conexión asíncrona o una dedicada a LISTEN.
+    """
+    ajustes = connections[alias].settings_dict
+    return {
+        'dbname': ajustes['NAME'],
+        'user': ajustes['USER'],
+        'password': ajustes['PASSWORD'],
+        'host': ajustes['HOST'] or None,
+        'port': ajustes['PORT'] or None,
+    }
@@ -0,0 +1,147 @@
+"""
+Enrutamiento de lecturas a la réplica de PostgreSQL.
+
+Por defecto todo va a 'default'. Solo las vistas que lo solicitan
+explícitamente (decorador @usar_replica o ReplicaReadMixin) leen de
+'replica', y únicamente si el alias está configurado (DB_REPLICA_HOST).
+
+Lectura de las propias escrituras (read-your-writes):
+después de una petición que modifica datos, ReplicaStickinessMiddleware
+devuelve la marca de tiempo de la escritura en la cookie 'ultima_escritura'
+y en la cabecera 'X-Last-Write'. Mientras el cliente la reenvíe (cookie o
+cabecera) y no hayan pasado DB_REPLICA_STICKY_SECONDS, sus lecturas van a
+'default' aunque la vista haya optado por la réplica.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_ALIAS = 'replica'
+COOKIE_ULTIMA_ESCRITURA = 'ultima_escritura'
+HEADER_ULTIMA_ESCRITURA = 'X-Last-Write'
+
+# Métodos HTTP que modifican datos (stickiness, caché de reportes y auditoría)
+METODOS_ESCRITURA = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Alias desde el que se leen los datos en el contexto actual (petición/hilo)
+_alias_lectura = ContextVar('alias_lectura', default='default')
+
+
+def replica_configurada():
+    """Indica si existe el alias 'replica' en DATABASES"""
+    return REPLICA_ALIAS in connections.databases
+
+
+def alias_lectura():
+    """
+    Alias de base de datos para lecturas en el contexto actual.
+    Usar con SQL directo: connections[alias_lectura()].cursor()
+    """
+    return _alias_lectura.get()
+
+
+@contextmanager
+def leer_de_replica(request=None):
+    """
+    Envía a la réplica las lecturas del bloque, salvo que la réplica no esté
+    configurada o la petición deba leer de la primaria (escritura reciente).
+    """
+    usar = replica_configurada() and not getattr(request, 'leer_de_primaria', False)
+    token = _alias_lectura.set(REPLICA_ALIAS if usar else 'default')
+    try:
+        yield
+    finally:
+        _alias_lectura.reset(token)
+
+
+def usar_replica(view_method):
+    """
+    Decorador para acciones de solo lectura (@action) que pueden leer de la réplica.
+
+    Uso:
+        @action(detail=False, methods=['get'], url_path='vencidas')
+        @usar_replica
+        def cartas_vencidas(self, request):
+            ...
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        with leer_de_replica(request):
+            return view_method(self, request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """
+    Mixin para ViewSets: list y retrieve leen de la réplica.
+    La autenticación y los permisos siguen consultando 'default'.
+    """
+
+    def list(self, request, *args, **kwargs):
+        with leer_de_replica(request):
+            return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        with leer_de_replica(request):
+            return super().retrieve(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Router de base de datos: las escrituras siempre van a 'default';
+    las lecturas, al alias del contexto actual.
+    """
+
+    def db_for_read(self, model, **hints):
+        return alias_lectura()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica contiene los mismos datos que 'default'
+        return True
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Marca las peticiones que deben leer de 'default' por una escritura
+    reciente del mismo cliente y registra la marca de tiempo de cada escritura.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.leer_de_primaria = self.escritura_reciente(request)
+
+        response = self.get_response(request)
+
+        if request.method in METODOS_ESCRITURA and response.status_code < 400:
+            ahora = f'{time.time():.3f}'
+            response[HEADER_ULTIMA_ESCRITURA] = ahora
+            response.set_cookie(
+                COOKIE_ULTIMA_ESCRITURA,
+                ahora,
+                max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+                secure=not settings.DEBUG
+            )
+        return response
+
+    def escritura_reciente(self, request):
+        """True si la última escritura del cliente es más reciente que el margen de réplica"""
+        valor = (
+            request.headers.get(HEADER_ULTIMA_ESCRITURA)
+            or request.COOKIES.get(COOKIE_ULTIMA_ESCRITURA)
+        )
+        if not valor:
+            return False
+        try:
+            return time.time() - float(valor) < settings.DB_REPLICA_STICKY_SECONDS
+        except ValueError:
+            return False
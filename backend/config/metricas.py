@@ -0,0 +1,268 @@
+"""
+Métricas de la aplicación en formato Prometheus (GET /metrics).
+
+MetricasMiddleware registra por cada petición, con la etiqueta 'route' igual
+al nombre de la ruta resuelta (nombres del router de DRF, por ejemplo
+'warranty-list' o 'warranty-cartas-vencidas'):
+- peticiones por método y código de estado, y su duración
+- consultas SQL por petición y su tiempo total (execute_wrapper)
+- filas de los reportes y listados (len de 'results' en respuestas GET 200)
+- bytes y duración de las cargas multipart
+- aciertos, fallos y omisiones de la caché de reportes (cabecera X-Cache-Reporte)
+
+Las conexiones a la base de datos (config.db_pool) se publican como gauges
+al terminar cada petición, cuando la conexión ya volvió al pool.
+
+Varios workers de gunicorn: con la variable PROMETHEUS_MULTIPROC_DIR cada
+proceso escribe sus valores en ese directorio y /metrics los suma todos
+(MultiProcessCollector). El directorio se vacía al iniciar gunicorn y se
+limpian los gauges de los workers que terminan (gunicorn.conf.py).
+
+Sin el paquete prometheus-client el middleware se desactiva y /metrics
+responde 503.
+"""
+import hmac
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_finished
+from django.db import connections
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from config.db_pool import estadisticas_conexiones
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+RUTA_METRICAS = '/metrics'
+
+# Etiqueta de las peticiones que no coinciden con ninguna ruta (404, estáticos)
+SIN_RUTA = 'sin_ruta'
+
+METODOS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+BUCKETS_DURACION = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BUCKETS_FILAS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+BUCKETS_BYTES = (
+    10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2,
+    10 * 1024 ** 2, 25 * 1024 ** 2, 50 * 1024 ** 2, 100 * 1024 ** 2,
+)
+
+if prometheus_client is not None:
+    PETICIONES = prometheus_client.Counter(
+        'cartas_http_requests_total',
+        'Peticiones HTTP atendidas',
+        ['route', 'method', 'status']
+    )
+    DURACION = prometheus_client.Histogram(
+        'cartas_http_request_duration_seconds',
+        'Duración de las peticiones HTTP (hasta entregar la respuesta al servidor)',
+        ['route', 'method'],
+        buckets=BUCKETS_DURACION
+    )
+    CONSULTAS = prometheus_client.Histogram(
+        'cartas_db_queries_per_request',
+        'Consultas SQL ejecutadas por petición',
+        ['route'],
+        buckets=BUCKETS_CONSULTAS
+    )
+    TIEMPO_CONSULTAS = prometheus_client.Counter(
+        'cartas_db_query_seconds_total',
+        'Tiempo total de las consultas SQL',
+        ['route']
+    )
+    FILAS = prometheus_client.Histogram(
+        'cartas_report_rows',
+        'Filas (results) de las respuestas GET de reportes y listados',
+        ['route'],
+        buckets=BUCKETS_FILAS
+    )
+    CARGA_BYTES = prometheus_client.Histogram(
+        'cartas_upload_bytes',
+        'Tamaño de las peticiones multipart (carga de archivos)',
+        ['route'],
+        buckets=BUCKETS_BYTES
+    )
+    CARGA_DURACION = prometheus_client.Histogram(
+        'cartas_upload_duration_seconds',
+        'Duración de las peticiones multipart (carga de archivos)',
+        ['route'],
+        buckets=BUCKETS_DURACION
+    )
+    CACHE_REPORTES = prometheus_client.Counter(
+        'cartas_report_cache_total',
+        'Respuestas de reportes cacheables por resultado de la caché (hit/miss/bypass)',
+        ['route', 'result']
+    )
+    # Gauges por proceso; 'livesum' suma los workers vivos
+    CONEXIONES = prometheus_client.Gauge(
+        'cartas_db_connections',
+        'Conexiones del pool por estado (in_use, idle, waiting)',
+        ['alias', 'state'],
+        multiprocess_mode='livesum'
+    )
+    CONEXIONES_ABIERTAS = prometheus_client.Gauge(
+        'cartas_db_connections_opened',
+        'Conexiones abiertas desde el inicio de los workers vivos',
+        ['alias'],
+        multiprocess_mode='livesum'
+    )
+    ESPERA_CONEXIONES = prometheus_client.Gauge(
+        'cartas_db_connection_wait_seconds',
+        'Tiempo esperando una conexión libre del pool desde el inicio de los workers vivos',
+        ['alias'],
+        multiprocess_mode='livesum'
+    )
+    CONEXIONES_PERDIDAS = prometheus_client.Gauge(
+        'cartas_db_connections_lost',
+        'Conexiones del pool perdidas desde el inicio de los workers vivos',
+        ['alias'],
+        multiprocess_mode='livesum'
+    )
+
+
+def multiproceso():
+    """Indica si las métricas se comparten entre procesos (PROMETHEUS_MULTIPROC_DIR)"""
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def nombre_ruta(request):
+    """
+    Etiqueta 'route' de la petición: nombre de la ruta resuelta o, si no
+    tiene nombre, su patrón (nunca la ruta con ids, para acotar las series).
+    """
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return SIN_RUTA
+    return coincidencia.url_name or coincidencia.route or SIN_RUTA
+
+
+def contar_filas(response):
+    """Filas de una respuesta de DRF (lista o página con 'results'), o None"""
+    datos = getattr(response, 'data', None)
+    if isinstance(datos, dict):
+        datos = datos.get('results')
+    if isinstance(datos, list):
+        return len(datos)
+    return None
+
+
+class ContadorConsultas:
+    """execute_wrapper que cuenta las consultas SQL y suma su duración"""
+
+    def __init__(self):
+        self.total = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total += 1
+            self.segundos += time.perf_counter() - inicio
+
+
+class MetricasMiddleware:
+    """Registra las métricas de cada petición (excepto /metrics)"""
+
+    def __init__(self, get_response):
+        if prometheus_client is None:
+            raise MiddlewareNotUsed('prometheus-client no está instalado')
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == RUTA_METRICAS:
+            return self.get_response(request)
+
+        consultas = ContadorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(consultas))
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        ruta = nombre_ruta(request)
+        metodo = request.method if request.method in METODOS else 'otro'
+        PETICIONES.labels(ruta, metodo, str(response.status_code)).inc()
+        DURACION.labels(ruta, metodo).observe(duracion)
+        CONSULTAS.labels(ruta).observe(consultas.total)
+        if consultas.total:
+            TIEMPO_CONSULTAS.labels(ruta).inc(consultas.segundos)
+
+        if metodo == 'GET' and response.status_code == 200:
+            filas = contar_filas(response)
+            if filas is not None:
+                FILAS.labels(ruta).observe(filas)
+
+        estado_cache = response.get('X-Cache-Reporte')
+        if estado_cache:
+            CACHE_REPORTES.labels(ruta, estado_cache.lower()).inc()
+
+        if request.content_type == 'multipart/form-data':
+            try:
+                tamano = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                tamano = 0
+            CARGA_BYTES.labels(ruta).observe(tamano)
+            CARGA_DURACION.labels(ruta).observe(duracion)
+
+        return response
+
+
+@receiver(request_finished)
+def actualizar_conexiones(sender, **kwargs):
+    """
+    Instantánea de las conexiones del worker. Se conecta después de
+    close_old_connections de Django: la conexión de la petición ya volvió
+    al pool y no se cuenta como en uso.
+    """
+    if prometheus_client is None:
+        return
+    for alias in settings.DATABASES:
+        datos = estadisticas_conexiones(alias)
+        CONEXIONES_ABIERTAS.labels(alias).set(datos['conexiones_abiertas'])
+        if datos['modo'] != 'pool':
+            continue
+        CONEXIONES.labels(alias, 'in_use').set(datos['en_uso'])
+        CONEXIONES.labels(alias, 'idle').set(datos['inactivas'])
+        CONEXIONES.labels(alias, 'waiting').set(datos['esperando'])
+        ESPERA_CONEXIONES.labels(alias).set(datos['tiempo_espera_ms'] / 1000)
+        CONEXIONES_PERDIDAS.labels(alias).set(datos['conexiones_perdidas'])
+
+
+def metricas(request):
+    """
+    GET /metrics: métricas en el formato de texto de Prometheus.
+
+    Si DJANGO_METRICS_TOKEN está definido exige 'Authorization: Bearer <token>'.
+    nginx no publica esta ruta; Prometheus la consulta en la red interna.
+    """
+    if prometheus_client is None:
+        return HttpResponse('prometheus-client no está instalado\n', status=503, content_type='text/plain')
+
+    if settings.METRICS_TOKEN:
+        esperado = f'Bearer {settings.METRICS_TOKEN}'
+        recibido = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(recibido.encode(), esperado.encode()):
+            return HttpResponse('No autorizado\n', status=401, content_type='text/plain')
+
+    if multiproceso():
+        registro = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = prometheus_client.REGISTRY
+
+    return HttpResponse(
+        prometheus_client.generate_latest(registro),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST
+    )
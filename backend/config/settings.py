@@ -5,6 +5,7 @@ Django settings for config project.
 from pathlib import Path
 import os
 from decouple import config
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -38,12 +40,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.metricas.MetricasMiddleware',
+    'config.compresion.CompresionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.db_router.ReplicaStickinessMiddleware',
+    'config.cache_reportes.VersionEscrituraMiddleware',
+    'apps.cartas_fianzas.auditoria.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,6 +74,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Reportes asíncronos: activar solo al servir con ASGI (uvicorn),
+# ver docs/DESPLIEGUE_ASGI.md
+ASYNC_REPORTS = config('DJANGO_ASYNC_REPORTS', default=False, cast=bool)
 
 # Database
 DATABASES = {
@@ -77,9 +89,84 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='postgres123'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Conexiones persistentes por worker (segundos; 0 = una por petición)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        # Verifica la conexión reutilizada antes de usarla en cada petición
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+    }
+}
+
+# Pool de conexiones de psycopg3 (opcional, requiere psycopg[pool]).
+# Es incompatible con CONN_MAX_AGE: el pool ya reutiliza las conexiones.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=600, cast=int),
+        }
+    }
+
+# Réplica de solo lectura (opcional) para reportes y listados.
+# Se activa definiendo DB_REPLICA_HOST; el resto de valores toma por defecto
+# los de 'default'. Para pruebas locales puede apuntar a una segunda base de
+# datos en el mismo servidor (DB_REPLICA_HOST=localhost, DB_REPLICA_NAME=...).
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': config('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': DB_REPLICA_HOST,
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        # En los tests la réplica es un espejo de 'default'
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+
+# Segundos durante los que un cliente lee de 'default' tras una escritura
+# (debe superar el retraso habitual de replicación)
+DB_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Caché compartida entre los workers de gunicorn (reportes comprimidos)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('DJANGO_CACHE_DIR', default='/tmp/cartas_fianzas_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('DJANGO_CACHE_MAX_ENTRIES', default=2000, cast=int),
+        },
     }
 }
 
+# Segundos que se conserva un reporte cacheado (se invalida antes con cada escritura)
+REPORT_CACHE_TIMEOUT = config('DJANGO_REPORT_CACHE_TIMEOUT', default=300, cast=int)
+
+# Sincronización incremental (?updated_since=): los cambios más recientes que
+# este margen se entregan en la siguiente sincronización (transacciones en curso)
+DELTA_SYNC_MARGIN_SECONDS = config('DJANGO_DELTA_SYNC_MARGIN_SECONDS', default=5, cast=int)
+
+# Moneda de referencia de la tabla exchange_rates (tipo de cambio = 1)
+MONEDA_REFERENCIA = config('DJANGO_REFERENCE_CURRENCY', default='PEN')
+
+# Perfilado bajo demanda (cabecera X-Perfilar o ?perfilar=1, solo usuarios con
+# can_manage_users): directorio y cantidad de capturas que se conservan
+PROFILING_DIR = config('DJANGO_PROFILING_DIR', default='/tmp/cartas_fianzas_perfiles')
+PROFILING_MAX_CAPTURES = config('DJANGO_PROFILING_MAX_CAPTURES', default=50, cast=int)
+
+# Segundos de validez del ticket de GET /api/events/?ticket= (se emite en
+# /api/events/ticket/; solo se verifica al conectar)
+EVENTS_TICKET_MAX_AGE = config('DJANGO_EVENTS_TICKET_MAX_AGE', default=60, cast=int)
+
+# Token para GET /metrics (Prometheus, 'Authorization: Bearer <token>');
+# vacío: sin autenticación, solo accesible desde la red interna
+METRICS_TOKEN = config('DJANGO_METRICS_TOKEN', default='')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -131,6 +218,16 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # orjson: serializa Decimal y fechas sin conversiones previas en las vistas
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.cartas_fianzas.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'apps.cartas_fianzas.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DATETIME_FORMAT': '%d/%m/%Y %H:%M',
     'DATE_FORMAT': '%d/%m/%Y',
 }
@@ -143,6 +240,10 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Cabecera de lectura de las propias escrituras (ver config/db_router.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-last-write')
+CORS_EXPOSE_HEADERS = ['X-Last-Write']
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -7,6 +7,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import routers
 
+from config.metricas import metricas
+
 # Router principal
 router = routers.DefaultRouter()
 
@@ -15,6 +17,8 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/', include('apps.cartas_fianzas.urls')),
     path('api-auth/', include('rest_framework.urls')),
+    # Métricas para Prometheus (no publicada por nginx)
+    path('metrics', metricas, name='metrics'),
 ]
 
 # Servir archivos media en desarrollo
@@ -76,27 +76,16 @@ BEGIN
         warranty_objects.cui,
         warranty_statuses_last.description as warranty_statuses_last_description
     FROM (
+        -- Último historial (is_latest) y su anterior (previous_history_id)
         SELECT 
-            THistoriesLast.warranty_id, 
-            THistoriesLast.warranty_histories_id_last,
-            MAX(wh.id) as warranty_histories_id_penultimate
-        FROM (
-            SELECT 
-                wh2.warranty_id,
-                MAX(wh2.id) as warranty_histories_id_last
-            FROM (
-                SELECT w.id as warranty_id
-                FROM warranties w
-                WHERE w.contractor_id = p_contractor_id
-            ) as TWarranties
-            INNER JOIN warranty_histories wh2
-                ON TWarranties.warranty_id = wh2.warranty_id
-            GROUP BY wh2.warranty_id
-        ) as THistoriesLast
-        LEFT JOIN warranty_histories wh
-            ON THistoriesLast.warranty_id = wh.warranty_id
-            AND wh.id < THistoriesLast.warranty_histories_id_last
-        GROUP BY THistoriesLast.warranty_id, THistoriesLast.warranty_histories_id_last
+            wh.warranty_id,
+            wh.id as warranty_histories_id_last,
+            wh.previous_history_id as warranty_histories_id_penultimate
+        FROM warranties w
+        INNER JOIN warranty_histories wh
+            ON wh.warranty_id = w.id
+            AND wh.is_latest
+        WHERE w.contractor_id = p_contractor_id
     ) TReport
     LEFT JOIN warranty_histories as warranty_histories_last
         ON TReport.warranty_histories_id_last = warranty_histories_last.id
@@ -0,0 +1,28 @@
+"""
+Configuración de gunicorn (se lee automáticamente desde el directorio de
+trabajo; el comando de docker-compose define bind, workers y worker-class).
+
+Métricas de Prometheus con varios workers (config/metricas.py): cada worker
+escribe sus valores en PROMETHEUS_MULTIPROC_DIR. Al iniciar se vacía el
+directorio (los valores de una ejecución anterior no deben sumarse) y al
+terminar un worker se descartan sus gauges 'live*'.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    directorio = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directorio:
+        shutil.rmtree(directorio, ignore_errors=True)
+        os.makedirs(directorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)